@@ -1,18 +1,57 @@
-import jwt
+import hashlib
+import time
 from datetime import datetime, timedelta
 from fastapi import HTTPException, Security
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from passlib.context import CryptContext
-from typing import Union
+from typing import Any, Callable, Dict, Optional, Tuple, Union
 
-# Importing JWT_SECRET from the configuration module
-from app.api.config.env import JWT_SECRET
+# Importing JWT_SECRET and the authentication settings from the configuration module
+from app.api.config.env import JWT_SECRET, AUTH_TOKEN_CACHE_SIZE, AUTH_TOKEN_CACHE_TTL, AUTH_USER_CACHE_SIZE, AUTH_USER_CACHE_TTL, AUTH_COMPACT_TOKENS
+from app.api.config.env import BCRYPT_ROUNDS, BCRYPT_WORKERS, BCRYPT_QUEUE_SIZE
+from app.api.config.cache import TTLCache
+from app.api.config.executor import BoundedExecutor, ExecutorSaturated
+from app.api.config.metrics import AUTH_DECODE_DURATION, record_timing
 
 class AuthenticationHandler:
-    """Handles user authentication operations."""
+    """Handles user authentication operations.
+    
+    Verified tokens are cached by their digest until `AUTH_TOKEN_CACHE_TTL` seconds pass or the
+    token expires, whichever is sooner, so repeated requests with the same token skip the signature check.
+    Compact tokens only carry the user ID (`sub`); their users are resolved with `user_loader`,
+    whose results are cached for `AUTH_USER_CACHE_TTL` seconds.
+    
+    The async password methods run bcrypt in a dedicated pool of `BCRYPT_WORKERS` threads (bcrypt
+    releases the GIL) that accepts up to `BCRYPT_QUEUE_SIZE` pending jobs, and answer 503 with
+    `Retry-After` beyond that, so a login burst cannot starve the threadpool of the routes.
+    
+    PyJWT and passlib are imported on first use, so importing the app stays fast for cold starts.
+    """
     
     security = HTTPBearer()
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+    def __init__(self, secret: Optional[str] = JWT_SECRET, compact_tokens: bool = AUTH_COMPACT_TOKENS,
+                 token_cache_size: int = AUTH_TOKEN_CACHE_SIZE, token_cache_ttl: float = AUTH_TOKEN_CACHE_TTL,
+                 user_cache_size: int = AUTH_USER_CACHE_SIZE, user_cache_ttl: float = AUTH_USER_CACHE_TTL,
+                 bcrypt_rounds: int = BCRYPT_ROUNDS, bcrypt_workers: int = BCRYPT_WORKERS,
+                 bcrypt_queue_size: int = BCRYPT_QUEUE_SIZE):
+        self.bcrypt_rounds = bcrypt_rounds
+        self._pwd_context = None
+        self.password_executor = BoundedExecutor(bcrypt_workers, bcrypt_queue_size, thread_name_prefix="bcrypt")
+        self.secret = secret
+        self.compact_tokens = compact_tokens
+        self.token_cache = TTLCache(token_cache_size, token_cache_ttl)
+        self.user_cache = TTLCache(user_cache_size, user_cache_ttl)
+        # Resolves the user of a compact token from its ID; replace it to read users from your storage
+        self.user_loader: Callable[[str], Optional[Dict[str, Any]]] = lambda user_id: {"id": user_id}
+
+    @property
+    def pwd_context(self):
+        """Password hashing context, created on first use."""
+        if self._pwd_context is None:
+            from passlib.context import CryptContext
+            # Hashes made with other work factors are flagged by `deprecated="auto"` and rehashed on login
+            self._pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=self.bcrypt_rounds)
+        return self._pwd_context
 
     def hash_password(self, password: str) -> str:
         """Hashes the password using bcrypt.
@@ -37,11 +76,74 @@ class AuthenticationHandler:
         """
         return self.pwd_context.verify(plain_password, hashed_password)
 
-    def create_token(self, user: dict) -> str:
-        """Generates a JWT token for the given user_id.
+    async def _run_password_job(self, function: Callable[..., Any], *args: Any) -> Any:
+        try:
+            return await self.password_executor.run(function, *args)
+        except ExecutorSaturated as e:
+            raise HTTPException(status_code=503, detail='Too many password operations in progress. Try again later.',
+                                headers={'Retry-After': str(e.retry_after)})
+
+    async def hash_password_async(self, password: str) -> str:
+        """Hashes the password using bcrypt, in the password pool.
+        
+        Args:
+        - password (str): Plain text password.
+        
+        Returns:
+        - str: Hashed password.
+        
+        Raises:
+        - HTTPException: 503 with `Retry-After` if the password pool is saturated.
+        """
+        return await self._run_password_job(self.pwd_context.hash, password)
+
+    async def verify_password_async(self, plain_password: str, hashed_password: str,
+                                    on_rehash: Optional[Callable[[str], Any]] = None) -> bool:
+        """Verifies a password against its hashed version, in the password pool.
+        
+        When the hash uses an outdated scheme or work factor, the password is rehashed in the same
+        job and the new hash is passed to `on_rehash`, so it can be stored in place of the old one.
+        
+        Args:
+        - plain_password (str): Plain text password.
+        - hashed_password (str): Hashed version of the password.
+        - on_rehash (Callable): Called with the new hash when the stored one needs an update.
+        
+        Returns:
+        - bool: True if verification is successful, False otherwise.
+        
+        Raises:
+        - HTTPException: 503 with `Retry-After` if the password pool is saturated.
+        """
+        verified, new_hash = await self.verify_and_update_async(plain_password, hashed_password)
+        if verified and new_hash and on_rehash is not None:
+            result = on_rehash(new_hash)
+            if hasattr(result, '__await__'):
+                await result
+        return verified
+
+    async def verify_and_update_async(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verifies a password and returns a new hash for it when the stored one is outdated.
+        
+        Args:
+        - plain_password (str): Plain text password.
+        - hashed_password (str): Hashed version of the password.
+        
+        Returns:
+        - Tuple[bool, Optional[str]]: Whether the password matches, and the new hash if it needs one.
+        """
+        return await self._run_password_job(self.pwd_context.verify_and_update, plain_password, hashed_password)
+
+    def close(self) -> None:
+        """Stops the password pool."""
+        self.password_executor.shutdown()
+
+    def create_token(self, user: dict, compact: Optional[bool] = None) -> str:
+        """Generates a JWT token for the given user.
         
         Args:
-        - user_id (str): Unique identifier for the user.
+        - user (dict): User to authenticate. Compact tokens need its `id`.
+        - compact (bool): Whether to only store the user ID in the token. `AUTH_COMPACT_TOKENS` by default.
         
         Returns:
         - str: JWT token.
@@ -50,9 +152,37 @@ class AuthenticationHandler:
         payload = {
             'exp': expiration,
             'iat': datetime.utcnow(),
-            'user': user  # Storing entire user object in the token
         }
-        return jwt.encode(payload, JWT_SECRET, algorithm='HS256')
+        if self.compact_tokens if compact is None else compact:
+            payload['sub'] = str(user['id'])  # Storing only the user ID, resolved by user_loader
+        else:
+            payload['user'] = user  # Storing entire user object in the token
+        import jwt
+        return jwt.encode(payload, self.secret, algorithm='HS256')
+
+    def load_user(self, user_id: str) -> Dict[str, Any]:
+        """Resolves the user of a compact token, through the user cache.
+        
+        Args:
+        - user_id (str): ID stored in the token.
+        
+        Returns:
+        - dict: User dict.
+        
+        Raises:
+        - HTTPException: If the user does not exist.
+        """
+        user = self.user_cache.get(user_id)
+        if user is None:
+            user = self.user_loader(user_id)
+            if not user:
+                raise HTTPException(status_code=401, detail='Invalid token')
+            self.user_cache.put(user_id, user)
+        return user
+
+    def invalidate_user(self, user_id: str) -> None:
+        """Forgets the cached user, e.g. after it is updated or deleted."""
+        self.user_cache.invalidate(user_id)
 
     def decode_token(self, token: str) -> Union[dict, None]:
         """Decodes a JWT token and returns its payload.
@@ -66,13 +196,32 @@ class AuthenticationHandler:
         Raises:
         - HTTPException: If token is expired or invalid.
         """
+        start = time.perf_counter()
+        key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+        payload = self.token_cache.get(key)
+        result = 'cached'
         try:
-            payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+            if payload is None:
+                import jwt
+                result = 'rejected'
+                try:
+                    payload = jwt.decode(token, self.secret, algorithms=['HS256'])
+                except jwt.ExpiredSignatureError:
+                    raise HTTPException(status_code=401, detail='Token has expired')
+                except jwt.InvalidTokenError:
+                    raise HTTPException(status_code=401, detail='Invalid token')
+                result = 'decoded'
+                # Never trusted past its expiration, so expired tokens get verified (and rejected) again
+                self.token_cache.put(key, payload, payload.get('exp'))
+        finally:
+            elapsed = time.perf_counter() - start
+            AUTH_DECODE_DURATION.observe(elapsed, result)
+            record_timing('auth', elapsed)
+        if 'user' in payload:
             return payload['user']
-        except jwt.ExpiredSignatureError:
-            raise HTTPException(status_code=401, detail='Token has expired')
-        except jwt.InvalidTokenError:
-            raise HTTPException(status_code=401, detail='Invalid token')
+        if 'sub' in payload:
+            return self.load_user(payload['sub'])
+        raise HTTPException(status_code=401, detail='Invalid token')
 
     def authenticate(self, auth_credentials: HTTPAuthorizationCredentials = Security(security)) -> str:
         """Wrapper function for token authentication.
@@ -88,5 +237,22 @@ class AuthenticationHandler:
         """
         return self.decode_token(auth_credentials.credentials)
 
+    def authenticate_admin(self, auth_credentials: HTTPAuthorizationCredentials = Security(security)) -> dict:
+        """Token authentication for the admin routes: the user of the token must have the 'admin' role.
+        
+        Args:
+        - auth_credentials (HTTPAuthorizationCredentials): HTTP authorization credentials.
+        
+        Returns:
+        - dict: User of the token.
+        
+        Raises:
+        - HTTPException: 401 if the token is expired or invalid, 403 if its user is not an admin.
+        """
+        user = self.decode_token(auth_credentials.credentials)
+        if not isinstance(user, dict) or user.get('role') != 'admin':
+            raise HTTPException(status_code=403, detail='Admin role required')
+        return user
+
 # Instantiate the authentication handler for further use
 auth_handler = AuthenticationHandler()
\ No newline at end of file
@@ -0,0 +1,69 @@
+"""Benchmark of the standard and the fast JSON paths on large item lists.
+
+Run it from the repository root:
+
+    python -m app.api.benchmarks.bench_json --items 100000 [--json]
+
+For responses, the standard path is what FastAPI does with a `response_model`: validate every
+item, run `jsonable_encoder` and encode with the standard library. The fast path sends the
+stored dicts as they are through `dumps` (orjson when installed). For persistence, it compares
+writing and reading the data file indented with the standard library against compact `dumps`.
+"""
+import argparse
+import json
+import time
+from typing import Callable, List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.api.config import serialization
+from app.api.config.serialization import dumps, loads
+from app.api.models.models import Item
+
+def best_of(function: Callable[[], object], repeat: int) -> float:
+    """Returns the best time of `repeat` runs, in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=100000, help="Items in the list.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement; the best one is kept.")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    args = parser.parse_args()
+
+    items: List[dict] = [{"id": f"{index:024x}", "name": f"Item {index}", "description": f"Description of item número {index}."}
+                         for index in range(args.items)]
+    data = {"items": items, "seq": args.items, "last_id": args.items}
+    indented = json.dumps(data, indent=4).encode()
+    compact = dumps(data)
+
+    results = [
+        {"case": "response", "path": "standard",
+         "ms": best_of(lambda: JSONResponse(jsonable_encoder([Item(**item) for item in items])), args.repeat)},
+        {"case": "response", "path": "fast",
+         "ms": best_of(lambda: serialization.FastJSONResponse(items), args.repeat)},
+        {"case": "persist", "path": "standard", "ms": best_of(lambda: json.dumps(data, indent=4).encode(), args.repeat),
+         "bytes": len(indented)},
+        {"case": "persist", "path": "fast", "ms": best_of(lambda: dumps(data), args.repeat), "bytes": len(compact)},
+        {"case": "load", "path": "standard", "ms": best_of(lambda: json.loads(indented), args.repeat)},
+        {"case": "load", "path": "fast", "ms": best_of(lambda: loads(compact), args.repeat)},
+    ]
+    for result in results:
+        result["ms"] = round(result["ms"], 2)
+
+    if args.json:
+        print(json.dumps({"orjson": serialization.orjson is not None, "items": args.items, "results": results}, indent=2))
+        return
+    print(f"{args.items} items, orjson {'installed' if serialization.orjson is not None else 'not installed'}")
+    print(f"{'case':<9} {'path':<9} {'ms':>10} {'bytes':>12}")
+    for result in results:
+        print(f"{result['case']:<9} {result['path']:<9} {result['ms']:>10} {result.get('bytes', ''):>12}")
+
+if __name__ == "__main__":
+    main()
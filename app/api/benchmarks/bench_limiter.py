@@ -0,0 +1,62 @@
+"""Benchmark of the rate limiter cost per request for each backend.
+
+Run it from the repository root:
+
+    python -m app.api.benchmarks.bench_limiter --requests 50000 [--clients 1000] [--redis-url redis://localhost:6379/0] [--json]
+
+Every request is counted against a generous limit (so none is rejected) for one of `--clients`
+client keys, round-robin, which is what the `limit` decorator does before running a route.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from app.api.config.limiter import FileBackend, MemoryBackend, RedisBackend
+
+async def measure(backend, requests: int, clients: int) -> float:
+    """Returns the mean time of one limiter check, in microseconds."""
+    keys = [f"list_items:ip:10.0.{index // 256}.{index % 256}" for index in range(clients)]
+    await backend.acquire(keys[0], 10 ** 9, 60)  # Warm up
+    start = time.perf_counter()
+    for index in range(requests):
+        await backend.acquire(keys[index % clients], 10 ** 9, 60)
+    return (time.perf_counter() - start) / requests * 1e6
+
+async def run(args: argparse.Namespace) -> list:
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        backends = {
+            "memory": MemoryBackend(),
+            "file": FileBackend(os.path.join(directory, "ratelimit"), slots=max(64, args.clients * 4)),
+        }
+        if args.redis_url:
+            backends["redis"] = RedisBackend(args.redis_url)
+        for name, backend in backends.items():
+            results.append({"backend": name, "us_per_request": round(await measure(backend, args.requests, args.clients), 2)})
+            await backend.close()
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50000, help="Limiter checks per backend.")
+    parser.add_argument("--clients", type=int, default=1000, help="Distinct client keys.")
+    parser.add_argument("--redis-url", help="Also measure the Redis backend against this server.")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    results = loop.run_until_complete(run(args))
+    loop.close()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'backend':<8} {'us/request':>11}")
+    for result in results:
+        print(f"{result['backend']:<8} {result['us_per_request']:>11}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Benchmark of the JSON file, the sharded JSON and the SQLite item stores at several collection sizes.
+
+Run it from the repository root:
+
+    python -m app.api.benchmarks.bench_storage --sizes 1000,100000,1000000 [--json]
+
+For each size, every store is filled in bulk in a temporary directory, then timed on a cold
+load (what a worker does at startup), single item lookups, a page of the listing, a filtered
+page, a full-text search, and single item writes (each one a durable commit). The JSON stores
+are measured with both persistence modes: 'snapshot' rewrites the whole file (or shard) on
+every write, 'wal' appends to the write-ahead log.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+from app.api.config.db import ItemStore
+from app.api.config.shards import ShardedStore
+from app.api.config.sqlite import SQLiteStore
+
+STORES = ("json-snapshot", "json-wal", "sharded-snapshot", "sharded-wal", "sqlite")
+
+def create_store(name: str, directory: str) -> Any:
+    if name == "sqlite":
+        return SQLiteStore(os.path.join(directory, "data.db"), reload_interval=float("inf"))
+    if name.startswith("sharded"):
+        return ShardedStore(os.path.join(directory, "shards"), reload_interval=float("inf"), persistence=name[8:],
+                            compact_threshold=10 ** 9)
+    return ItemStore(os.path.join(directory, "data.json"), reload_interval=float("inf"), persistence=name[5:],
+                     compact_threshold=10 ** 9)
+
+def timings(function: Callable[[], object], repeat: int) -> List[float]:
+    """Runs `function` `repeat` times and returns each duration, in milliseconds."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+def run(name: str, size: int, lookups: int, writes: int, batch_size: int = 10000) -> Dict[str, Any]:
+    items = [{"name": f"Item {index}", "description": f"Description of item {index}, group {index % 100}."}
+             for index in range(size)]
+    result: Dict[str, Any] = {"store": name, "items": size}
+    with tempfile.TemporaryDirectory() as directory:
+        store = create_store(name, directory)
+        store.load()
+        start = time.perf_counter()
+        for offset in range(0, size, batch_size):
+            store.add_items(items[offset:offset + batch_size])
+        result["fill_s"] = round(time.perf_counter() - start, 2)
+        store.close()
+
+        store = create_store(name, directory)
+        result["load_ms"] = round(timings(store.load, 1)[0], 1)
+        ids = [format(random.randint(1, size), "024x") for _ in range(lookups)]
+        lookup = iter(ids)
+        result["find_us"] = round(statistics.median(timings(lambda: store.find_item(next(lookup)), lookups)) * 1000, 1)
+        result["page_ms"] = round(statistics.median(timings(lambda: store.list_items(100), 20)), 2)
+        result["filtered_page_ms"] = round(statistics.median(
+            timings(lambda: store.list_items(100, filters={"name": ("prefix", "Item 1")}), 20)), 2)
+        result["search_ms"] = round(statistics.median(timings(lambda: store.search_items(100, text="group 42"), 20)), 2)
+        updates = iter(ids)
+        result["update_ms"] = round(statistics.median(
+            timings(lambda: store.update_item(next(updates), {"description": "Updated."}), min(writes, lookups))), 2)
+        result["add_ms"] = round(statistics.median(
+            timings(lambda: store.add_item({"name": "New item", "description": "Added."}), writes)), 2)
+        store.close()
+    return result
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,100000,1000000", help="Comma-separated collection sizes.")
+    parser.add_argument("--stores", default=",".join(STORES), help=f"Comma-separated stores among {', '.join(STORES)}.")
+    parser.add_argument("--lookups", type=int, default=1000, help="Single item lookups per measurement.")
+    parser.add_argument("--writes", type=int, default=20, help="Single item writes per measurement.")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    args = parser.parse_args()
+
+    results = [run(name, int(size), args.lookups, args.writes)
+               for size in args.sizes.split(",") for name in args.stores.split(",")]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    columns = ["store", "items", "fill_s", "load_ms", "find_us", "page_ms", "filtered_page_ms", "search_ms", "update_ms", "add_ms"]
+    print(" ".join(f"{column:>16}" for column in columns))
+    for result in results:
+        print(" ".join(f"{result[column]:>16}" for column in columns))
+
+if __name__ == "__main__":
+    main()
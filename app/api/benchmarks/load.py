@@ -0,0 +1,339 @@
+"""Load test and benchmark of the items API, with no network besides localhost.
+
+Run it from the repository root:
+
+    python -m app.api.benchmarks.load --items 10000 --requests 2000 --concurrency 32 --mode both --output results.json
+    python -m app.api.benchmarks.load --compare baseline.json --output results.json     # Exit code 1 on regressions
+    python -m app.api.benchmarks.load --replay traffic.jsonl --mode asgi
+
+It seeds `--items` items through the bulk endpoint of a fresh data file in a temporary directory,
+then drives each endpoint with `--concurrency` concurrent clients, either in-process through the
+ASGI app (`asgi`), over a local uvicorn socket (`socket`) or both. It reports the p50/p95/p99
+latency and the requests per second of each endpoint, and writes them to `--output` as JSON.
+
+A replay file has one JSON request per line: {"method": "GET", "path": "/items/?limit=10",
+"body": {...}, "headers": {...}}. Paths without the API prefix get it added, IDs in paths are
+grouped as {item_id} in the report, and lines that are not requests are skipped.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+ID_IN_PATH = re.compile(r"/[0-9a-fA-F]{24}(?=/|$)")
+
+Request = Tuple[str, str, Optional[bytes], Dict[str, str]]
+Response = Tuple[int, bytes]
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * fraction // 1))
+    return sorted_values[int(rank) - 1]
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    latencies = sorted(latencies)
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed > 0 else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """Lists the endpoints whose p95 latency grew, or whose throughput dropped, by more than `threshold` percent."""
+    regressions = []
+    for mode, endpoints in current.get("results", {}).items():
+        for endpoint, stats in endpoints.items():
+            before = baseline.get("results", {}).get(mode, {}).get(endpoint)
+            if not before:
+                continue
+            if before["p95_ms"] and stats["p95_ms"] > before["p95_ms"] * (1 + threshold / 100):
+                regressions.append(f"{mode} {endpoint}: p95 {before['p95_ms']} ms -> {stats['p95_ms']} ms")
+            if before["rps"] and stats["rps"] < before["rps"] * (1 - threshold / 100):
+                regressions.append(f"{mode} {endpoint}: {before['rps']} -> {stats['rps']} requests/s")
+    return regressions
+
+class ASGIClient:
+    """Sends requests straight to the ASGI app, in the same process and event loop."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method: str, path: str, body: Optional[bytes] = None,
+                      headers: Optional[Dict[str, str]] = None) -> Response:
+        raw_path, _, query = path.partition("?")
+        request_headers = [(b"host", b"benchmark")] + [(key.lower().encode(), value.encode()) for key, value in (headers or {}).items()]
+        if body is not None:
+            request_headers.append((b"content-length", str(len(body)).encode()))
+        scope = {
+            "type": "http", "http_version": "1.1", "method": method, "scheme": "http", "root_path": "",
+            "path": raw_path, "raw_path": raw_path.encode(), "query_string": query.encode(),
+            "headers": request_headers, "client": ("127.0.0.1", 50000), "server": ("benchmark", 80),
+        }
+        sent = False
+        status = 500
+        chunks = []
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body or b"", "more_body": False}
+            await asyncio.sleep(3600)  # No disconnect while the response is sent
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        return status, b"".join(chunks)
+
+    async def close(self) -> None:
+        pass
+
+class SocketClient:
+    """Minimal HTTP/1.1 client over keep-alive connections to a local server, one per concurrent worker."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    async def request(self, method: str, path: str, body: Optional[bytes] = None,
+                      headers: Optional[Dict[str, str]] = None) -> Response:
+        if self._idle:
+            reader, writer = self._idle.pop()
+        else:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", f"Content-Length: {len(body or b'')}"]
+        lines += [f"{key}: {value}" for key, value in (headers or {}).items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + (body or b""))
+        await writer.drain()
+
+        status = int((await reader.readline()).split()[1])
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            response_headers[key.strip().lower()] = value.strip()
+        if response_headers.get("transfer-encoding") == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                chunks.append(await reader.readexactly(size + 2))
+                if size == 0:
+                    break
+            content = b"".join(chunk[:-2] for chunk in chunks)
+        else:
+            content = await reader.readexactly(int(response_headers.get("content-length", 0)))
+        if response_headers.get("connection", "").lower() == "close":
+            writer.close()
+        else:
+            self._idle.append((reader, writer))
+        return status, content
+
+    async def close(self) -> None:
+        for _, writer in self._idle:
+            writer.close()
+        self._idle = []
+
+async def drive(client, requests: List[Request], concurrency: int, prefix: str = "") -> Dict[str, Dict[str, Any]]:
+    """Sends the requests with `concurrency` workers and summarizes them per endpoint ("METHOD /items/{item_id}/")."""
+    latencies: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    queue = iter(requests)
+
+    async def worker():
+        for method, path, body, headers in queue:
+            endpoint = f"{method} {ID_IN_PATH.sub('/{item_id}', path.partition('?')[0][len(prefix):])}"
+            start = time.perf_counter()
+            try:
+                status, _ = await client.request(method, path, body, headers)
+            except (OSError, ValueError, asyncio.IncompleteReadError):
+                status = 599
+            latencies.setdefault(endpoint, []).append(time.perf_counter() - start)
+            errors[endpoint] = errors.get(endpoint, 0) + (status >= 400 and status != 404)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    # Every endpoint shares the same wall clock here, so its throughput is measured on its share of the requests
+    total = sum(len(values) for values in latencies.values())
+    return {endpoint: summarize(values, errors[endpoint], elapsed * len(values) / total)
+            for endpoint, values in sorted(latencies.items())}
+
+async def seed(client, prefix: str, items: int) -> List[str]:
+    """Creates the items through the bulk endpoint and returns their IDs."""
+    ids = []
+    for offset in range(0, items, 10000):
+        body = json.dumps([{"name": f"item {index}", "description": f"seeded item number {index} colour {('red', 'green', 'blue')[index % 3]}"}
+                           for index in range(offset, min(items, offset + 10000))]).encode()
+        status, content = await client.request("POST", f"{prefix}/items/bulk/", body, {"Content-Type": "application/json"})
+        if status != 200:
+            raise RuntimeError(f"Seeding failed with status {status}: {content[:200]!r}")
+        ids += [result["item"]["id"] for result in json.loads(content)]
+    return ids
+
+def crud_scenarios(prefix: str, ids: List[str], requests: int) -> List[List[Request]]:
+    """One list of requests per endpoint; reads and updates hit random seeded items."""
+    json_headers = {"Content-Type": "application/json"}
+    rng = random.Random(42)
+    return [
+        [("POST", f"{prefix}/items/", json.dumps({"name": f"new {index}", "description": "created"}).encode(), json_headers)
+         for index in range(requests)],
+        [("GET", f"{prefix}/items/{rng.choice(ids)}/", None, {}) for _ in range(requests)],
+        [("GET", f"{prefix}/items/?limit=100&name_prefix=item%20{rng.randrange(10)}", None, {}) for _ in range(requests)],
+        [("GET", f"{prefix}/items/search/?q={rng.choice(('red', 'green', 'blue'))}&limit=50", None, {})
+         for _ in range(requests)],
+        [("PATCH", f"{prefix}/items/{rng.choice(ids)}/", json.dumps({"description": f"patched {index}"}).encode(), json_headers)
+         for index in range(requests)],
+        [("DELETE", f"{prefix}/items/{item_id}/", None, {}) for item_id in ids[-requests:]],
+    ]
+
+def load_replay(path: str, prefix: str) -> Tuple[List[Request], int]:
+    """Reads a replay file, returning its requests and the number of skipped lines."""
+    requests, skipped = [], 0
+    with open(path) as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                skipped += 1
+                continue
+            if not isinstance(entry, dict) or not isinstance(entry.get("method"), str) or not isinstance(entry.get("path"), str):
+                skipped += 1
+                continue
+            request_path = entry["path"] if entry["path"].startswith(prefix) else prefix + "/" + entry["path"].lstrip("/")
+            body = entry.get("body")
+            headers = dict(entry.get("headers") or {})
+            if body is not None and not isinstance(body, str):
+                body = json.dumps(body)
+                headers.setdefault("Content-Type", "application/json")
+            requests.append((entry["method"].upper(), request_path, body.encode() if body is not None else None, headers))
+    return requests, skipped
+
+async def run_asgi(args: argparse.Namespace, prefix: str, replay: Optional[List[Request]]) -> Dict[str, Any]:
+    from app.app import app
+    await app.router.startup()
+    client = ASGIClient(app)
+    try:
+        return await run_client(client, args, prefix, replay)
+    finally:
+        await app.router.shutdown()
+
+async def run_socket(args: argparse.Namespace, prefix: str, replay: Optional[List[Request]], environment: Dict[str, str]) -> Dict[str, Any]:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.app:app", "--host", "127.0.0.1", "--port", str(port),
+                               "--log-level", "warning", "--no-access-log"], env=environment)
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                with socket.create_connection(("127.0.0.1", port), timeout=1):
+                    break
+            except OSError:
+                if server.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("The uvicorn server did not start.")
+                await asyncio.sleep(0.1)
+        client = SocketClient("127.0.0.1", port)
+        try:
+            return await run_client(client, args, prefix, replay)
+        finally:
+            await client.close()
+    finally:
+        server.terminate()
+        server.wait(10)
+
+async def run_client(client, args: argparse.Namespace, prefix: str, replay: Optional[List[Request]]) -> Dict[str, Any]:
+    ids = await seed(client, prefix, args.items)
+    if replay is not None:
+        return await drive(client, replay, args.concurrency, prefix)
+    results = {}
+    for requests in crud_scenarios(prefix, ids, min(args.requests, len(ids))):
+        results.update(await drive(client, requests, args.concurrency, prefix))
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=10000, help="Items seeded before the run.")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per endpoint (at most --items).")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent clients.")
+    parser.add_argument("--mode", choices=("asgi", "socket", "both"), default="asgi", help="How requests reach the app.")
+    parser.add_argument("--persistence", choices=("snapshot", "wal"), default="wal", help="DATA_PERSISTENCE of the seeded store.")
+    parser.add_argument("--replay", help="Replay the requests of this JSON lines file instead of the CRUD scenarios.")
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--compare", help="Compare with the results in this JSON file and exit with 1 on regressions.")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Percentage of change reported as a regression.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Must be set before the app is imported: a fresh store, no rate limits and quiet logs
+        environment = dict(os.environ, DATA_FILE=os.path.join(directory, "data.json"), DATA_PERSISTENCE=args.persistence,
+                           DB_BACKEND="json", RATE_LIMIT_ENABLED="0", LOG_FILE="", LOG_LEVEL="ERROR")
+        environment.pop("WAL_FILE", None)
+        os.environ.update(environment)
+        from app.api.config.env import API_NAME
+        prefix = f"/api/v1/{API_NAME}"
+
+        replay = None
+        if args.replay:
+            replay, skipped = load_replay(args.replay, prefix)
+            print(f"Replaying {len(replay)} requests ({skipped} lines skipped)")
+
+        report = {
+            "meta": {"time": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "python": platform.python_version(),
+                     "items": args.items, "requests": args.requests, "concurrency": args.concurrency,
+                     "persistence": args.persistence, "replay": args.replay},
+            "results": {},
+        }
+        loop = asyncio.new_event_loop()
+        try:
+            if args.mode in ("asgi", "both"):
+                report["results"]["asgi"] = loop.run_until_complete(run_asgi(args, prefix, replay))
+            if args.mode in ("socket", "both"):
+                # The server gets its own data file, seeded again
+                environment["DATA_FILE"] = os.path.join(directory, "socket.json")
+                report["results"]["socket"] = loop.run_until_complete(run_socket(args, prefix, replay, environment))
+        finally:
+            loop.close()
+
+    print(f"{'mode':<7} {'endpoint':<34} {'count':>6} {'errors':>6} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for mode, endpoints in report["results"].items():
+        for endpoint, stats in endpoints.items():
+            print(f"{mode:<7} {endpoint[:34]:<34} {stats['count']:>6} {stats['errors']:>6} {stats['rps']:>9} "
+                  f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8}")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(json.load(file), report, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
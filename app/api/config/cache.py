@@ -0,0 +1,192 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+from fastapi import Request, Response
+from app.api.config.env import CACHE_MAX_BYTES
+from app.api.config.serialization import dumps
+
+class CachedResponse:
+    """Serialized response body with its strong ETag and extra headers."""
+
+    __slots__ = ("body", "etag", "headers")
+
+    def __init__(self, body: bytes, headers: Optional[Dict[str, str]] = None):
+        self.body = body
+        self.etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        self.headers = headers or {}
+
+class ResponseCache:
+    """LRU cache of serialized read responses, bounded by the total size of the bodies.
+
+    Item responses are keyed by ("item", id) and dropped when that item changes; list
+    responses are keyed by ("list", query) and dropped on any change of the collection.
+    `invalidate` is subscribed to the storage backend, and every change bumps `version`:
+    a response rendered from data read at an older version is not stored, so a write that
+    lands between a read and its `put` can never leave a stale entry behind.
+    """
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.version = 0
+        self.size = 0
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Hashable, response: CachedResponse, version: int) -> None:
+        """Stores a response rendered from data read while the cache was at `version`."""
+        if len(response.body) > self.max_bytes:
+            return
+        with self._lock:
+            if version != self.version:
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous.body)
+            self._entries[key] = response
+            self.size += len(response.body)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted.body)
+
+    def invalidate(self, item_ids: Optional[Iterable[str]] = None) -> None:
+        """Drops the responses of the given items and every list response, or everything when `item_ids` is None."""
+        with self._lock:
+            self.version += 1
+            if item_ids is None:
+                self._entries.clear()
+                self.size = 0
+                return
+            stale = [("item", item_id) for item_id in item_ids]
+            stale += [key for key in self._entries if key[0] == "list"]
+            for key in stale:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self.size -= len(entry.body)
+
+    def clear(self) -> None:
+        self.invalidate(None)
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after `ttl` seconds, or earlier when given an expiry time."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if entry[1] <= time.time():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, expires_at: Optional[float] = None) -> None:
+        """Stores a value until `ttl` seconds from now, or until `expires_at` (a UNIX time) if that is sooner."""
+        if self.max_size <= 0:
+            return
+        expiry = time.time() + self.ttl
+        if expires_at is not None:
+            expiry = min(expiry, expires_at)
+        with self._lock:
+            self._entries[key] = (value, expiry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one.
+
+    The first caller of `do` for a key runs `function`; callers that arrive while it is still
+    running wait for it and share its result (or its exception) instead of running their own.
+    The key is forgotten as soon as the call completes, so nothing is cached. A caller that is
+    cancelled does not cancel the call the others are waiting for.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, "asyncio.Future[Any]"] = {}
+
+    async def do(self, key: Hashable, function: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = asyncio.ensure_future(function())
+            call.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(call)
+
+    def _forget(self, key: Hashable, call: "asyncio.Future[Any]") -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.cancelled():
+            call.exception()  # Retrieved here too, in case every caller was cancelled
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+def render_json(content: Any, headers: Optional[Dict[str, str]] = None) -> CachedResponse:
+    """Serializes JSON-native content (dicts, lists, strings, numbers) like the app's default response class."""
+    return CachedResponse(dumps(content), headers)
+
+# Suffixes added to the ETags of compressed representations, see CompressionMiddleware
+ENCODING_SUFFIXES = ("-gzip", "-br")
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """Returns the ETag of a response compressed with `encoding`, e.g. "abc" -> "abc-gzip"."""
+    return f'{etag[:-1]}-{encoding}"' if etag.endswith('"') else etag
+
+def identity_etag(tag: str) -> str:
+    """Returns the ETag of the uncompressed response from any ETag sent for it."""
+    tag = tag.strip().replace("W/", "", 1)
+    for suffix in ENCODING_SUFFIXES:
+        if tag.endswith(f'{suffix}"'):
+            return f'{tag[:-len(suffix) - 1]}"'
+    return tag
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(identity_etag(tag) == etag for tag in if_none_match.split(","))
+
+def conditional_response(request: Request, cached: CachedResponse) -> Response:
+    """Returns 304 Not Modified when the client already has this response, the response itself otherwise.
+
+    A 304 has no body, so the type and size of the response it stands for are left in the
+    scope as "representation", for `CompressionMiddleware` to send the same ETag it would.
+    """
+    headers = {**cached.headers, "ETag": cached.etag}
+    if etag_matches(request.headers.get("if-none-match"), cached.etag):
+        request.scope["representation"] = ("application/json", len(cached.body))
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+# Instantiate the response cache and the read coalescing for further use
+response_cache = ResponseCache()
+single_flight = SingleFlight()
@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import secrets
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+
+from app.api.config.db import get_backend
+from app.api.config.env import CHANGES_BUFFER_SIZE, CHANGES_QUEUE_SIZE, CHANGES_KEEPALIVE, CHANGES_POLL_INTERVAL
+from app.api.config.metrics import CHANGE_DROPPED, CHANGE_EVENTS, CHANGE_SUBSCRIBERS
+from app.api.config.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+class Subscription:
+    """Events waiting to be sent to one client of the change feed."""
+
+    __slots__ = ("events", "closed", "_ready")
+
+    def __init__(self):
+        self.events: Deque[bytes] = deque()
+        self.closed = False
+        self._ready = asyncio.Event()
+
+    def push(self, event: bytes) -> None:
+        self.events.append(event)
+        self._ready.set()
+
+    def close(self) -> None:
+        """Ends the stream once the events already queued are sent."""
+        self.closed = True
+        self._ready.set()
+
+    async def get(self, timeout: float) -> List[bytes]:
+        """Waits up to `timeout` seconds for events and returns the queued ones (none on timeout)."""
+        if not self.events and not self.closed:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        self._ready.clear()
+        events = list(self.events)
+        self.events.clear()
+        return events
+
+class ChangeBroadcaster:
+    """Fans the changes committed by the storage backend out to the clients of `GET /items/changes/`.
+
+    `publish` is the change listener of the backend (see `StorageBackend.subscribe_changes`),
+    called from whatever thread made the write. The changes are handed to the event loop,
+    numbered and encoded once as server-sent events, then appended to the queue of every
+    subscription, so an idle client only costs its queue and its waiting request.
+
+    The last `buffer_size` events are kept in a ring buffer: a client that reconnects with the
+    id of the last event it got receives what it missed. Ids are `<epoch>-<seq>`, where the
+    epoch is random per worker; an id of another worker, of a previous run or older than the
+    buffer gets a `reset` event instead, telling the client to read the items again. A client
+    whose queue goes over `queue_size` events is disconnected, so a slow reader cannot make
+    memory grow; it can reconnect and resume from the buffer.
+
+    While there are subscribers, the backend is checked every `poll_interval` seconds so the
+    writes of other workers are published too.
+    """
+
+    def __init__(self, buffer_size: int = CHANGES_BUFFER_SIZE, queue_size: int = CHANGES_QUEUE_SIZE,
+                 keepalive: float = CHANGES_KEEPALIVE, poll_interval: float = CHANGES_POLL_INTERVAL):
+        self.buffer_size = buffer_size
+        self.queue_size = queue_size
+        self.keepalive = keepalive
+        self.poll_interval = poll_interval
+        self.epoch = secrets.token_hex(4)
+        self.seq = 0
+        self.dropped = 0
+        self._buffer: Deque[Tuple[int, bytes]] = deque(maxlen=buffer_size)
+        self._subscriptions: Set[Subscription] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._poller: Optional[asyncio.Future] = None
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """Starts publishing the changes on `loop` (the current event loop by default)."""
+        self._loop = loop or asyncio.get_event_loop()
+
+    def stop(self) -> None:
+        """Stops publishing and ends every stream."""
+        self._loop = None
+        for subscription in self._subscriptions:
+            subscription.close()
+        CHANGE_SUBSCRIBERS.dec(amount=len(self._subscriptions))
+        self._subscriptions.clear()
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+
+    def publish(self, changes: List[Dict[str, Any]]) -> None:
+        """Queues changes for the subscribers. Safe to call from any thread; ignored until `start`."""
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._publish, changes)
+        except RuntimeError:
+            pass  # The loop is closed: the app is shutting down
+
+    def _encode(self, seq: int, change: Dict[str, Any]) -> bytes:
+        return b"id: %s-%d\nevent: %s\ndata: %s\n\n" % (self.epoch.encode(), seq, change["op"].encode(), dumps(change))
+
+    def _publish(self, changes: List[Dict[str, Any]]) -> None:
+        # Runs on the event loop, so events are numbered in the order the writes were committed
+        if len(changes) > min(self.buffer_size, self.queue_size):
+            changes = [{"op": "reset"}]  # Cheaper for the clients to read the items again than to replay them
+        events = []
+        for change in changes:
+            self.seq += 1
+            events.append((self.seq, self._encode(self.seq, change)))
+            CHANGE_EVENTS.inc(change["op"])
+        self._buffer.extend(events)
+        for subscription in list(self._subscriptions):
+            if len(subscription.events) + len(events) > self.queue_size:
+                logger.warning("Disconnecting a change feed client that is %d events behind.", len(subscription.events))
+                self.unsubscribe(subscription)
+                subscription.close()
+                self.dropped += 1
+                CHANGE_DROPPED.inc()
+                continue
+            for _, event in events:
+                subscription.push(event)
+
+    def _replay(self, last_event_id: str) -> List[bytes]:
+        epoch, _, seq = last_event_id.strip().partition("-")
+        if epoch == self.epoch and seq.isdigit():
+            seq = int(seq)
+            oldest = self._buffer[0][0] if self._buffer else self.seq + 1
+            if oldest - 1 <= seq <= self.seq and self.seq - seq <= self.queue_size:
+                return [event for event_seq, event in self._buffer if event_seq > seq]
+        # Unknown to this worker, or too far behind: the client has to read the items again
+        return [self._encode(self.seq, {"op": "reset"})]
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Subscription:
+        """Returns a new subscription, with the events missed since `last_event_id` already queued."""
+        subscription = Subscription()
+        for event in self._replay(last_event_id) if last_event_id else []:
+            subscription.push(event)
+        self._subscriptions.add(subscription)
+        CHANGE_SUBSCRIBERS.inc()
+        if self._poller is None and self._loop is not None:
+            self._poller = asyncio.ensure_future(self._poll())
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        if subscription in self._subscriptions:
+            self._subscriptions.remove(subscription)
+            CHANGE_SUBSCRIBERS.dec()
+
+    async def stream(self, subscription: Subscription) -> AsyncIterator[bytes]:
+        """Yields the events of a subscription as server-sent events, with keep-alive comments while idle."""
+        try:
+            # Sent right away, so the headers go out before the first change
+            yield b": connected\n\n"
+            while True:
+                events = await subscription.get(self.keepalive)
+                if events:
+                    yield b"".join(events)
+                elif subscription.closed:
+                    return
+                else:
+                    yield b": keepalive\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+    async def _poll(self) -> None:
+        # The writes of other workers are only noticed when the backend checks its files or database
+        try:
+            while self._subscriptions:
+                await asyncio.sleep(self.poll_interval)
+                try:
+                    await get_backend().get_version()
+                except Exception as e:
+                    logger.error("Error checking the storage backend for changes: %s", e)
+        finally:
+            self._poller = None
+
+# Instantiate the change feed for further use
+change_feed = ChangeBroadcaster()
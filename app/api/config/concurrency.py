@@ -0,0 +1,268 @@
+import asyncio
+import math
+import time
+from bisect import insort
+from itertools import count
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.api.config.env import (CONCURRENCY_LIMIT_ENABLED, CONCURRENCY_INITIAL_LIMIT, CONCURRENCY_MIN_LIMIT, CONCURRENCY_MAX_LIMIT,
+                                CONCURRENCY_TOTAL_LIMIT, CONCURRENCY_TOTAL_MAX_LIMIT, CONCURRENCY_TOLERANCE, CONCURRENCY_QUEUE_SIZE,
+                                CONCURRENCY_QUEUE_TIMEOUT, CONCURRENCY_CHEAP_READ_MS)
+from app.api.config.metrics import CONCURRENCY_LIMIT, CONCURRENCY_QUEUED, CONCURRENCY_SHED
+
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Priorities of the queued requests, served lowest first
+CHEAP_READ, READ, WRITE = 0, 1, 2
+
+# Factor applied to a limit when a request fails or times out
+BACKOFF = 0.9
+
+class ConcurrencyLimitExceeded(Exception):
+    """Raised when a request is shed instead of being admitted."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Request shed ({reason}), retry after {retry_after} seconds.")
+        self.reason = reason
+        self.retry_after = retry_after
+
+class GradientLimit:
+    """Concurrency limit that follows the latency gradient (the Gradient2 algorithm of Netflix's concurrency-limits).
+
+    A long-term average of the latency is the baseline of what the limited resource delivers,
+    and a short-term average what it delivers now. While the limit is in use, it is multiplied
+    by `tolerance * long / short`, clamped to [0.5, 1], and grown by its square root: it keeps
+    growing while the latency holds, and shrinks once queueing makes requests slower than
+    `tolerance` times the baseline. Failed requests cut it by `BACKOFF`. Changes are smoothed.
+    The average time between completions, `interval`, is the pace at which queued requests get in.
+    """
+
+    def __init__(self, initial: float, min_limit: float, max_limit: float, tolerance: float = CONCURRENCY_TOLERANCE,
+                 smoothing: float = 0.2, long_window: int = 600):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.long_window = long_window
+        self.in_flight = 0
+        self.short_latency = 0.0
+        self.long_latency = 0.0
+        self.interval = 0.0
+        self._last_completion = 0.0
+
+    @property
+    def available(self) -> bool:
+        return self.in_flight < max(1, int(self.limit))
+
+    def update(self, latency: float, dropped: bool = False) -> None:
+        """Adjusts the limit to the latency of a request that just finished (called before `in_flight` is decremented)."""
+        now = time.monotonic()
+        # Never slower than the pace of the requests in flight, so an idle gap does not make the next burst look hopeless
+        pace = latency / max(self.in_flight, 1)
+        gap = min(now - self._last_completion, pace) if self._last_completion else pace
+        self.interval += (gap - self.interval) * 0.1
+        self._last_completion = now
+        if dropped:
+            self.limit = max(self.min_limit, self.limit * BACKOFF)
+            return
+        if not self.long_latency:
+            self.short_latency = self.long_latency = latency
+        self.short_latency += (latency - self.short_latency) * 0.25
+        self.long_latency += (latency - self.long_latency) / self.long_window
+        if self.long_latency > 2 * self.short_latency:
+            self.long_latency *= 0.95  # The latency dropped for good: let the baseline follow it faster
+        if self.in_flight * 2 < self.limit:
+            return  # The limit is not in use, so the latency says nothing about it
+        gradient = max(0.5, min(1.0, self.tolerance * self.long_latency / max(self.short_latency, 1e-9)))
+        new_limit = self.limit * gradient + math.sqrt(self.limit)
+        self.limit = max(self.min_limit, min(self.max_limit, self.limit * (1 - self.smoothing) + new_limit * self.smoothing))
+
+    def status(self) -> Dict[str, Any]:
+        return {"limit": round(self.limit, 1), "in_flight": self.in_flight,
+                "latency_ms": round(self.short_latency * 1000, 3), "baseline_ms": round(self.long_latency * 1000, 3),
+                "interval_ms": round(self.interval * 1000, 3)}
+
+class Waiter:
+    """A request queued for admission."""
+
+    __slots__ = ("route", "limit", "future")
+
+    def __init__(self, route: str, limit: GradientLimit, future: asyncio.Future):
+        self.route = route
+        self.limit = limit
+        self.future = future
+
+class ConcurrencyLimiter:
+    """Adaptive concurrency limits of the routes, with a bounded priority queue and load shedding.
+
+    Every route ("GET /api/v1/x/items/") gets its own `GradientLimit`, and all of them share a
+    limit of the whole worker, which adapts to how much slower than their own baseline requests
+    are, so a slow route does not count as an overload. A request over either limit waits in a
+    single queue, served in priority order: reads of routes whose baseline latency is under
+    `cheap_read_ms`, then other reads, then writes, oldest first.
+
+    Requests are shed, to be answered with a 503 and `Retry-After`, rather than left to make
+    everyone slower: right away when the queue is full (a queued request of lower priority,
+    the newest one, loses its place to it instead when there is one) or when the expected wait
+    exceeds `queue_timeout`, and after waiting `queue_timeout` seconds otherwise.
+    """
+
+    def __init__(self, enabled: bool = CONCURRENCY_LIMIT_ENABLED, initial_limit: float = CONCURRENCY_INITIAL_LIMIT,
+                 min_limit: float = CONCURRENCY_MIN_LIMIT, max_limit: float = CONCURRENCY_MAX_LIMIT,
+                 total_limit: float = CONCURRENCY_TOTAL_LIMIT, total_max_limit: float = CONCURRENCY_TOTAL_MAX_LIMIT,
+                 tolerance: float = CONCURRENCY_TOLERANCE, queue_size: int = CONCURRENCY_QUEUE_SIZE,
+                 queue_timeout: float = CONCURRENCY_QUEUE_TIMEOUT, cheap_read_ms: float = CONCURRENCY_CHEAP_READ_MS):
+        self.enabled = enabled
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.cheap_read_ms = cheap_read_ms
+        self.total = GradientLimit(total_limit, min_limit, total_max_limit, tolerance)
+        self.routes: Dict[str, GradientLimit] = {}
+        self.shed: Dict[Tuple[str, str], int] = {}  # (route, reason) -> requests shed
+        self._queue: List[Tuple[int, int, Waiter]] = []  # Sorted by (priority, arrival)
+        self._arrivals = count()
+        self._set_gauge("*", self.total.limit)
+
+    def _set_gauge(self, route: str, limit: float, previous: float = 0.0) -> None:
+        if limit != previous:
+            CONCURRENCY_LIMIT.inc(route, amount=limit - previous)
+
+    def _route(self, route: str) -> GradientLimit:
+        limit = self.routes.get(route)
+        if limit is None:
+            limit = self.routes[route] = GradientLimit(self.initial_limit, self.min_limit, self.max_limit, self.tolerance)
+            self._set_gauge(route, limit.limit)
+        return limit
+
+    def priority(self, method: str, limit: GradientLimit) -> int:
+        if method not in READ_METHODS:
+            return WRITE
+        return CHEAP_READ if limit.long_latency * 1000 <= self.cheap_read_ms else READ
+
+    def _retry_after(self, limit: GradientLimit) -> int:
+        # Time for the queue to drain at the current pace, at least a second
+        return max(1, math.ceil((len(self._queue) + 1) * max(limit.interval, 0.001)))
+
+    def _shed(self, route: str, reason: str, limit: GradientLimit) -> ConcurrencyLimitExceeded:
+        self.shed[(route, reason)] = self.shed.get((route, reason), 0) + 1
+        CONCURRENCY_SHED.inc(route, reason)
+        return ConcurrencyLimitExceeded(reason, self._retry_after(limit))
+
+    def _admit(self, limit: GradientLimit) -> None:
+        limit.in_flight += 1
+        self.total.in_flight += 1
+
+    def _dequeue(self, index: int) -> Waiter:
+        _, _, waiter = self._queue.pop(index)
+        CONCURRENCY_QUEUED.dec()
+        return waiter
+
+    def _remove(self, waiter: Waiter) -> None:
+        for index, (_, _, queued) in enumerate(self._queue):
+            if queued is waiter:
+                self._dequeue(index)
+                return
+
+    def _discard_cancelled(self) -> None:
+        # Drops the waiters cancelled while queued whose tasks have not resumed to remove them yet
+        for index in reversed(range(len(self._queue))):
+            if self._queue[index][2].future.done():
+                self._dequeue(index)
+
+    def _drain(self) -> None:
+        # Admits the queued requests that fit, in priority order; those whose route is full stay queued
+        index = 0
+        while index < len(self._queue) and self.total.available:
+            waiter = self._queue[index][2]
+            if waiter.future.done():
+                self._dequeue(index)  # Cancelled: there is nobody left to admit
+            elif waiter.limit.available:
+                self._dequeue(index)
+                self._admit(waiter.limit)
+                waiter.future.set_result(None)
+            else:
+                index += 1
+
+    def _expire(self, waiter: Waiter) -> None:
+        if not waiter.future.done():
+            self._remove(waiter)
+            waiter.future.set_exception(self._shed(waiter.route, "timeout", waiter.limit))
+
+    async def acquire(self, route: str, method: str) -> None:
+        """Waits until a request to `route` may run. Each admitted request must be `release`d once done.
+
+        Raises:
+        - ConcurrencyLimitExceeded: If the request is shed.
+        """
+        limit = self._route(route)
+        if limit.available and self.total.available:
+            self._admit(limit)
+            return
+
+        priority = self.priority(method, limit)
+        if len(self._queue) >= self.queue_size:
+            self._discard_cancelled()
+        if len(self._queue) >= self.queue_size:
+            if not self._queue or self._queue[-1][0] <= priority:
+                raise self._shed(route, "queue_full", limit)
+            evicted = self._dequeue(len(self._queue) - 1)
+            evicted.future.set_exception(self._shed(evicted.route, "evicted", evicted.limit))
+        # Shed early when the requests of the route already queued would outlast the deadline
+        ahead = sum(1 for _, _, waiter in self._queue if waiter.limit is limit)
+        if (ahead + 1) * limit.interval > self.queue_timeout:
+            raise self._shed(route, "deadline", limit)
+
+        loop = asyncio.get_event_loop()
+        waiter = Waiter(route, limit, loop.create_future())
+        insort(self._queue, (priority, next(self._arrivals), waiter))
+        CONCURRENCY_QUEUED.inc()
+        timer = loop.call_later(self.queue_timeout, self._expire, waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            # The client went away while queued, or right after being admitted (or shed, which needs nothing undone)
+            future = waiter.future
+            if not future.done() or future.cancelled():
+                self._remove(waiter)
+            elif future.exception() is None:
+                self.release(route)
+            raise
+        finally:
+            timer.cancel()
+
+    def release(self, route: str, latency: Optional[float] = None, dropped: bool = False) -> None:
+        """Ends a request admitted by `acquire`, adapting the limits to its latency (if it ran), and admits queued ones."""
+        limit = self.routes[route]
+        if latency is not None:
+            previous = limit.limit
+            limit.update(latency, dropped)
+            self._set_gauge(route, limit.limit, previous)
+            if limit.long_latency:
+                previous = self.total.limit
+                # Relative to the baseline of the route, so the total limit only reacts to a general slowdown
+                self.total.update(latency / limit.long_latency, dropped)
+                self._set_gauge("*", self.total.limit, previous)
+        limit.in_flight -= 1
+        self.total.in_flight -= 1
+        self._drain()
+
+    def status(self) -> Dict[str, Any]:
+        """Returns the limits, requests in flight and queued, and requests shed, of the worker and of each route."""
+        queued: Dict[str, int] = {}
+        for _, _, waiter in self._queue:
+            queued[waiter.route] = queued.get(waiter.route, 0) + 1
+        routes = {}
+        for route, limit in sorted(self.routes.items()):
+            shed = {reason: total for (shed_route, reason), total in self.shed.items() if shed_route == route}
+            routes[route] = {**limit.status(), "queued": queued.get(route, 0), "shed": shed}
+        return {"enabled": self.enabled, "limit": round(self.total.limit, 1), "in_flight": self.total.in_flight,
+                "queued": len(self._queue), "queue_size": self.queue_size, "queue_timeout": self.queue_timeout,
+                "shed": sum(self.shed.values()), "routes": routes}
+
+# Instantiate the concurrency limiter for further use
+concurrency_limiter = ConcurrencyLimiter()
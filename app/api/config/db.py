@@ -1,65 +1,1248 @@
+import base64
+from bisect import bisect_right
+from collections import deque
+import errno
 import json
-from typing import List, Dict, Any
-from bson import ObjectId
+import logging
+import os
+import re
+import threading
+import time
+from typing import List, Dict, Any, AsyncIterator, Callable, Deque, Iterable, Optional, Tuple
 
-DATA_FILE = "data.json"
+from starlette.concurrency import run_in_threadpool
 
-def read_data() -> Dict[str, Any]:
+from app.api.config import serialization
+from app.api.config.serialization import dumps, loads
+from app.api.config.cache import single_flight
+from app.api.config.metrics import observe_storage
+from app.api.config.indexes import PREFIX_END, HashIndex, SortedIndex, TextIndex, declared_indexes, index_value, tokenize
+from app.api.models.models import Item
+from app.api.config.env import DB_BACKEND, DATA_FILE, DATA_RELOAD_INTERVAL, DATA_PERSISTENCE, WAL_FILE, WAL_COMPACT_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+def read_data(path: str = DATA_FILE) -> Dict[str, Any]:
+    start = time.perf_counter()
     try:
-        with open(DATA_FILE, "r") as file:
-            data = json.load(file)
-            print(f"Read data from {DATA_FILE}: {data}")  # Debugging
-            return data
+        with open(path, "rb") as file:
+            return loads(file.read())
     except FileNotFoundError:
         return {"items": []}
-    except json.JSONDecodeError:
+    except ValueError:
         return {"items": []}
+    finally:
+        observe_storage("read", start)
 
-def write_data(data: Dict[str, Any]) -> None:
+def write_data(data: Dict[str, Any], path: str = DATA_FILE) -> None:
+    # Write to a temporary file and rename it over the old one, so a crash never leaves a truncated file behind
+    tmp_path = f"{path}.tmp"
+    start = time.perf_counter()
     try:
-        with open(DATA_FILE, "w") as file:
-            print(f"Writing data to {DATA_FILE}: {data}")  # Debugging
-            json.dump(data, file, indent=4)
+        # Compact UTF-8 in fast mode, indented (easier to edit by hand) otherwise
+        encoded = dumps(data) if serialization.FAST_JSON else json.dumps(data, indent=4).encode()
+        with open(tmp_path, "wb") as file:
+            file.write(encoded)
+            file.flush()
+            fsync_start = time.perf_counter()
+            os.fsync(file.fileno())
+            observe_storage("fsync", fsync_start, request=False)
+        os.replace(tmp_path, path)
     except Exception as e:
-        print(f"Error writing data to file: {e}")
+        logger.error("Error writing data to %s: %s", path, e)
+        raise
+    finally:
+        observe_storage("write", start)
+
+def read_log(path: str, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+    """Reads the complete records of a write-ahead log starting at `offset`.
+
+    Args:
+    - path (str): Path of the log.
+    - offset (int): Byte offset to start reading from.
+
+    Returns:
+    - Tuple[List[dict], int]: Records read, and the offset right after the last complete line.
+    """
+    records = []
+    start = time.perf_counter()
+    try:
+        with open(path, "rb") as file:
+            file.seek(offset)
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break  # Torn last line left by a crash
+                offset += len(line)
+                try:
+                    records.append(loads(line))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    observe_storage("read", start)
+    return records, offset
+
+class FileLock:
+    """Exclusive lock shared by every process that opens the same lock file.
+
+    The lock is re-entrant, but it is not thread-safe on its own: it must only be used while
+    holding a thread lock, as `ItemStore` does.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._depth = 0
+
+    def acquire(self, blocking: bool = True) -> bool:
+        if self._depth == 0:
+            if self._file is None:
+                self._file = open(self.path, "a+b")
+            try:
+                if fcntl is not None:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    self._file.seek(0)
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+            except OSError:
+                if blocking:
+                    raise
+                return False
+        self._depth += 1
+        return True
+
+    def release(self) -> None:
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def close(self) -> None:
+        """Closes the lock file, which is reopened on the next `acquire`. The lock must not be held."""
+        if self._file is not None and self._depth == 0:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+class WriteAheadLog:
+    """Append-only JSON lines log with group commit.
+
+    `append` writes the record to the file right away (the caller holds the file lock, so
+    records of every process are ordered), but only a background thread fsyncs it, so
+    concurrent writers share a single fsync. `wait` blocks until a record is durable.
+
+    When a write or an fsync fails, every record not yet durable may be lost: their `wait`
+    raises the error, and so does `append` until `rollback` truncates the log back to its last
+    durable record.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "ab", buffering=0)
+        self._cond = threading.Condition()
+        self._appended = 0
+        self._durable = 0
+        self._pending: Deque[Tuple[int, int]] = deque()  # (ticket, offset of the record) not yet durable
+        self._lost: List[Tuple[int, int, Exception]] = []  # Tickets in (first, last] that failed, and why
+        self._error: Optional[Exception] = None
+        self._truncate_at = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="wal-commit", daemon=True)
+        self._thread.start()
+
+    def _fail(self, error: Exception, offset: int) -> None:
+        # Called holding the condition: fails every record that is not durable yet
+        logger.error("Error writing to the write-ahead log: %s", error)
+        self._error = error
+        self._truncate_at = self._pending[0][1] if self._pending else offset
+        self._pending.clear()
+        self._lost.append((self._durable, self._appended, error))
+        self._durable = self._appended
+        self._cond.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while self._durable == self._appended and not self._closed:
+                    self._cond.wait()
+                if self._durable == self._appended:
+                    return
+                last = self._appended
+                fileno = self._file.fileno()
+            start = time.perf_counter()
+            try:
+                os.fsync(fileno)
+                observe_storage("fsync", start, request=False)
+            except Exception as e:
+                with self._cond:
+                    if self._error is None:
+                        self._fail(e, self._pending[0][1])
+                continue
+            with self._cond:
+                if self._error is None and self._durable < last:
+                    while self._pending and self._pending[0][0] <= last:
+                        self._pending.popleft()
+                    self._durable = last
+                    self._cond.notify_all()
+
+    @property
+    def inode(self) -> int:
+        return os.fstat(self._file.fileno()).st_ino
+
+    def append(self, record: Dict[str, Any]) -> Tuple[int, int]:
+        """Writes a record and returns the ticket to `wait` on, along with the log offset after it."""
+        line = dumps(record) + b"\n"
+        start = time.perf_counter()
+        with self._cond:
+            if self._error is not None:
+                raise self._error
+            # Other processes append to the same file, so its size is where this record starts
+            offset = os.fstat(self._file.fileno()).st_size
+            try:
+                if self._file.write(line) != len(line):
+                    raise OSError(errno.EIO, "Short write to the write-ahead log")
+            except Exception as e:
+                self._fail(e, offset)
+                raise
+            self._appended += 1
+            self._pending.append((self._appended, offset))
+            self._cond.notify_all()
+            result = self._appended, offset + len(line)
+        observe_storage("append", start)
+        return result
+
+    def wait(self, ticket: int) -> None:
+        start = time.perf_counter()
+        with self._cond:
+            while self._durable < ticket:
+                self._cond.wait()
+            errors = [error for first, last, error in self._lost if first < ticket <= last]
+        observe_storage("commit", start)
+        if errors:
+            raise errors[0]
+
+    def rollback(self) -> bool:
+        """Truncates the log back to its last durable record after a failed write or fsync, so it can be written again.
+
+        Records that other processes appended after the failed ones are dropped as well: they
+        share the failed pages of the file, and their own fsync reports the same error.
+
+        Returns:
+        - bool: True if the log had failed and was rolled back, False if there was nothing to roll back.
+        """
+        with self._cond:
+            if self._error is None:
+                return False
+            fileno = self._file.fileno()
+            if os.fstat(fileno).st_size > self._truncate_at:
+                os.ftruncate(fileno, self._truncate_at)
+            os.fsync(fileno)
+            self._error = None
+            return True
+
+    def reopen(self, rotated_path: Optional[str] = None) -> None:
+        """Reopens the log once every record is durable.
+
+        With `rotated_path`, the current records are moved there first, so the log starts empty.
+        """
+        with self._cond:
+            while self._durable < self._appended:
+                self._cond.wait()
+            if self._error is not None:
+                raise self._error  # The log must be rolled back first
+            self._file.close()
+            if rotated_path is None:
+                pass
+            elif os.path.exists(rotated_path):
+                # A previous compaction did not finish: keep its records in front of ours
+                with open(rotated_path, "ab") as rotated, open(self.path, "rb") as current:
+                    rotated.write(current.read())
+                    rotated.flush()
+                    os.fsync(rotated.fileno())
+                os.remove(self.path)
+            elif os.path.exists(self.path):
+                os.replace(self.path, rotated_path)
+            self._file = open(self.path, "ab", buffering=0)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._file.close()
+
+# Ids are allocated as 24 hex digits, the same shape as a MongoDB ObjectId, so that they pass
+# `is_valid_objectid` and sort in allocation order
+ID_PATTERN = re.compile(r'^[a-fA-F0-9]{1,24}$')
+
+def parse_id(item_id: Any) -> int:
+    """Returns the counter value of an allocated id, or 0 for ids that were not allocated by the store."""
+    if isinstance(item_id, str) and ID_PATTERN.match(item_id):
+        return int(item_id, 16)
+    return 0
+
+def format_id(counter: int) -> str:
+    return f"{counter:024x}"
+
+# Indexes declared on the fields of Item: sorted fields can be filtered on, text fields searched
+INDEXES = declared_indexes(Item)
+FILTER_FIELDS = tuple(field for field, kinds in INDEXES.items() if "sorted" in kinds)
+HASH_FIELDS = tuple(field for field, kinds in INDEXES.items() if "hash" in kinds)
+TEXT_FIELDS = tuple(field for field, kinds in INDEXES.items() if "text" in kinds)
+
+# Operators of the search criteria
+SEARCH_OPERATORS = ("eq", "prefix", "gte", "lte")
+
+def encode_cursor(key: Tuple[str, ...]) -> str:
+    """Encodes the last key of a page as an opaque, URL-safe pagination cursor."""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, ...]:
+    """Decodes a cursor made by `encode_cursor`.
+
+    Raises:
+    - ValueError: If the cursor is malformed.
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Invalid cursor.")
+    if not isinstance(key, list) or not key or not all(isinstance(part, str) for part in key):
+        raise ValueError("Invalid cursor.")
+    return tuple(key)
+
+def matches_filters(item: Dict[str, Any], filters: Dict[str, Tuple[str, str]]) -> bool:
+    for field, (operator, value) in filters.items():
+        item_value = index_value(item.get(field))
+        if not (item_value == value if operator == "eq" else item_value.startswith(value)):
+            return False
+    return True
+
+def matches_criteria(item: Dict[str, Any], criteria: List[Tuple[str, str, str]], tokens: Iterable[str] = ()) -> bool:
+    """Checks an item against (field, operator, value) search criteria and full-text search words."""
+    for field, operator, value in criteria:
+        item_value = index_value(item.get(field))
+        if operator == "eq" and item_value != value:
+            return False
+        if operator == "prefix" and not item_value.startswith(value):
+            return False
+        if operator == "gte" and item_value < value:
+            return False
+        if operator == "lte" and item_value > value:
+            return False
+    if tokens:
+        words = set().union(*(tokenize(item.get(field)) for field in TEXT_FIELDS))
+        if not words.issuperset(tokens):
+            return False
+    return True
+
+def project(item: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    """Keeps only the requested fields of an item, plus its id."""
+    if fields is None:
+        return item
+    return {key: item[key] for key in ["id", *fields] if key in item}
+
+# Types of the fields of Item, for the check of the items loaded from the files
+ITEM_TYPES = tuple((name, field.type_) for name, field in Item.__fields__.items())
+
+def validate_item(item: Any) -> Dict[str, Any]:
+    """Checks an item read from the files (which can be edited by hand) against the `Item` model.
+
+    Returns:
+    - dict: The item itself when its fields already have the right types, which is checked without
+      pydantic, or else a copy with the fields coerced by the model. Extra fields are kept.
+
+    Raises:
+    - ValueError: If the item does not validate.
+    """
+    if not isinstance(item, dict):
+        raise ValueError(f"Not an object: {item!r}")
+    for name, field_type in ITEM_TYPES:
+        if type(item.get(name)) is not field_type:
+            return {**item, **Item(**item).dict()}
+    return item
+
+def diff_items(before: Dict[str, Dict[str, Any]], after: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Returns the changes (see `StorageBackend.subscribe_changes`) that turn one set of items, keyed on id, into another."""
+    changes = []
+    for item_id, item in after.items():
+        previous = before.get(item_id)
+        if previous is None:
+            changes.append({"op": "create", "id": item_id, "item": item})
+        elif previous is not item and previous != item:
+            changes.append({"op": "update", "id": item_id, "item": item})
+    changes.extend({"op": "delete", "id": item_id} for item_id in before if item_id not in after)
+    return changes
+
+class ItemStore:
+    """Resident item store backed by a JSON file.
+
+    The file is parsed once and the items are kept in memory in a dict keyed on `id`, so reads
+    and lookups never touch the disk. Every write is persisted back to the file, which stays
+    the durable (and hand-editable) source of truth: its mtime and size are checked at most
+    every `reload_interval` seconds, and before every write, and the store reloads itself
+    when the file was changed by someone else.
+
+    With the 'wal' persistence mode writes are appended to a write-ahead log instead of
+    rewriting the whole file, and the log is compacted into a new snapshot of the file in the
+    background once it holds `compact_threshold` records. Loading replays the snapshot and
+    then the log.
+
+    Writes hold a thread lock and a lock file next to the data file, and catch up with changes
+    made by other processes before applying their own, so several workers can share the same
+    files. Ids are allocated from a monotonic counter that is persisted with the data and
+    never hands out the id of a deleted item again.
+
+    Items are checked against the `Item` model as they are loaded from the files, so the
+    responses can skip the check (see `serialization.revalidate`). Those that do not validate
+    are logged and set aside: they are not served, but stay in the files to be fixed by hand.
+
+    Stored dicts are replaced, never mutated, so the dicts handed out to callers are stable
+    snapshots. Callers must treat them as read-only.
+    """
+
+    def __init__(self, path: str = DATA_FILE, reload_interval: float = DATA_RELOAD_INTERVAL,
+                 persistence: str = DATA_PERSISTENCE, wal_path: Optional[str] = None,
+                 compact_threshold: int = WAL_COMPACT_THRESHOLD):
+        if persistence not in ("snapshot", "wal"):
+            raise ValueError(f"Unknown persistence mode: {persistence}")
+        self.path = path
+        self.reload_interval = reload_interval
+        self.persistence = persistence
+        self.wal_path = wal_path or (WAL_FILE if path == DATA_FILE else f"{path}.log")
+        self.compact_threshold = compact_threshold
+        self._items: Dict[str, Dict[str, Any]] = {}
+        self._invalid: List[Any] = []  # Items of the files that do not validate, written back as they are
+        # Built from the indexes declared on Item; all of them are updated on every write
+        self._indexes = {"id": SortedIndex(lambda item: (index_value(item.get("id")),))}
+        for field in FILTER_FIELDS:
+            self._indexes[field] = SortedIndex(
+                lambda item, field=field: (index_value(item.get(field)), index_value(item.get("id"))))
+        for field in HASH_FIELDS:
+            self._indexes[f"{field}:hash"] = HashIndex(field)
+        for field in TEXT_FIELDS:
+            self._indexes[f"{field}:text"] = TextIndex(field)
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(f"{path}.lock")
+        self._compaction_lock = FileLock(f"{path}.compact.lock")
+        self._loaded = False
+        self._file_stat: Optional[Tuple[int, int, int]] = None
+        self._last_check = 0.0
+        self._seq = 0
+        self._last_id = 0
+        self._wal: Optional[WriteAheadLog] = None
+        self._log_inode: Optional[int] = None
+        self._log_offset = 0
+        self._log_records = 0
+        self._compaction: Optional[threading.Thread] = None
+        self._compacting = False
+        self._preloaded = False
+        self._listeners: List[Callable[[Optional[List[str]]], None]] = []
+        self._change_listeners: List[Callable[[List[Dict[str, Any]]], None]] = []
+        self._changes: Optional[List[Dict[str, Any]]] = None  # Recorded by _put and _remove while there are change listeners
+        self.version = 0
+
+    def _stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        # The inode changes on every atomic rewrite, which catches writes that mtime granularity would hide
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _log_stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.wal_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size
+
+    def _put(self, item: Dict[str, Any], indexed: bool = True) -> None:
+        previous = self._items.get(item.get("id"))
+        if self._changes is not None:
+            self._changes.append({"op": "create" if previous is None else "update", "id": item.get("id"), "item": item})
+        if indexed:
+            for index in self._indexes.values():
+                if previous is not None:
+                    index.remove(previous)
+                index.add(item)
+        self._items[item.get("id")] = item
+        self._last_id = max(self._last_id, parse_id(item.get("id")))
+
+    def _remove(self, item_id: str, indexed: bool = True) -> Optional[Dict[str, Any]]:
+        item = self._items.pop(item_id, None)
+        if item is not None and self._changes is not None:
+            self._changes.append({"op": "delete", "id": item_id})
+        if item is not None and indexed:
+            for index in self._indexes.values():
+                index.remove(item)
+        return item
+
+    def subscribe(self, listener: Callable[[Optional[List[str]]], None]) -> None:
+        """Registers a callback run after every change, with the ids of the changed items (None when everything may have changed)."""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def subscribe_changes(self, listener: Callable[[List[Dict[str, Any]]], None]) -> None:
+        """Registers a callback run after every change with what changed, see `StorageBackend.subscribe_changes`."""
+        if listener not in self._change_listeners:
+            self._change_listeners.append(listener)
+            self._changes = []
+
+    def _notify(self, item_ids: Optional[List[str]]) -> None:
+        self.version += 1
+        for listener in self._listeners:
+            try:
+                listener(item_ids)
+            except Exception as e:
+                logger.exception("Error notifying a change listener: %s", e)
+        changes, self._changes = self._changes, [] if self._change_listeners else None
+        if item_ids is None and changes is None:
+            changes = [{"op": "reset"}]
+        if not changes:
+            return
+        for listener in self._change_listeners:
+            try:
+                listener(changes)
+            except Exception as e:
+                logger.exception("Error notifying a change listener: %s", e)
+
+    def _apply_ops(self, operations: List[Dict[str, Any]], indexed: Optional[bool] = None) -> None:
+        # Large batches skip the incremental index updates, which cost O(n) each, and rebuild the indexes once
+        if indexed is None:
+            indexed = len(operations) <= max(64, len(self._items) // 16)
+        for operation in operations:
+            if operation["op"] == "put":
+                self._put(operation["item"], indexed)
+            elif operation["op"] == "delete":
+                self._remove(operation["id"], indexed)
+        if not indexed:
+            for index in self._indexes.values():
+                index.rebuild(self._items.values())
+        if operations:
+            self._notify([operation["item"]["id"] if operation["op"] == "put" else operation["id"] for operation in operations])
+
+    def _validate(self, item: Any) -> Optional[Dict[str, Any]]:
+        # Returns the item to store, or None when it does not validate and was set aside
+        try:
+            return validate_item(item)
+        except ValueError as e:
+            item_id = item.get("id") if isinstance(item, dict) else None
+            logger.warning("Item %r of %s is not served, it does not validate: %s", item_id, self.path, e)
+            self._invalid.append(item)
+            return None
+
+    def _replay(self, records: List[Dict[str, Any]], indexed: Optional[bool] = None) -> None:
+        operations = []
+        for record in records:
+            if record["seq"] <= self._seq:
+                continue
+            self._seq = record["seq"]
+            for operation in record["ops"] if record["op"] == "batch" else [record]:
+                if operation["op"] == "put":
+                    item = self._validate(operation["item"])
+                    # The latest version of an item that does not validate replaces the previous one all the same
+                    if item is None:
+                        operation = {"op": "delete", "id": operation["item"].get("id") if isinstance(operation["item"], dict) else None}
+                    else:
+                        operation = {"op": "put", "item": item}
+                operations.append(operation)
+        self._apply_ops(operations, indexed)
+
+    def _load(self) -> None:
+        # Called with both locks held. The items it loads are not recorded one by one: see the end.
+        previous = self._items if self._loaded and self._change_listeners else None
+        self._changes = None
+        file_stat = self._stat()
+        data = read_data(self.path)
+        self._items, self._invalid = {}, []
+        for item in data.get("items", []):
+            item = self._validate(item)
+            if item is not None:
+                self._items[item.get("id")] = item
+        self._seq = data.get("seq", 0)
+        self._last_id = max([data.get("last_id", 0)] + [parse_id(item_id) for item_id in self._items] +
+                            [parse_id(item.get("id")) for item in self._invalid if isinstance(item, dict)])
+        if self.persistence == "wal":
+            log_stat = self._log_stat()
+            if self._wal is None:
+                self._wal = WriteAheadLog(self.wal_path)
+            elif log_stat is None or self._wal.inode != log_stat[0]:
+                self._wal.reopen()  # Another process rotated the log
+            records, _ = read_log(f"{self.wal_path}.1")
+            log_records, self._log_offset = read_log(self.wal_path)
+            self._replay(records + log_records, indexed=False)
+            self._log_inode = self._wal.inode
+            self._log_records = len(records) + len(log_records)
+        for index in self._indexes.values():
+            index.rebuild(self._items.values())
+        self._file_stat = file_stat
+        self._last_check = time.monotonic()
+        self._loaded = True
+        # A reload is compared with the items it replaces; the change listeners get a reset after the first load
+        self._changes = None if previous is None else diff_items(previous, self._items)
+        self._notify(None)
+
+    def _changed(self) -> bool:
+        if not self._loaded or self._stat() != self._file_stat:
+            return True
+        return self.persistence == "wal" and self._log_stat() != (self._log_inode, self._log_offset)
+
+    def _sync(self) -> None:
+        # Called with both locks held: catches up with writes made by other processes
+        if not self._loaded or self._stat() != self._file_stat:
+            self._load()
+        elif self.persistence == "wal":
+            if self._wal is None:
+                self._wal = WriteAheadLog(self.wal_path)  # Closed by `preload`
+            log_stat = self._log_stat()
+            if log_stat is None or log_stat[0] != self._log_inode or log_stat[1] < self._log_offset:
+                self._load()  # Rotated, or rolled back by a process whose fsync failed
+            elif log_stat[1] != self._log_offset:
+                records, self._log_offset = read_log(self.wal_path, self._log_offset)
+                self._replay(records)
+                self._log_records += len(records)
+        self._last_check = time.monotonic()
+
+    def load(self) -> None:
+        """(Re)loads every item from the backing file, replaying the write-ahead log in 'wal' mode."""
+        with self._lock, self._file_lock:
+            self._load()
+            self._preloaded = False
+
+    def preload(self) -> None:
+        """Loads the items in a server process that is about to fork its workers.
+
+        The items stay in memory, so the workers share them copy-on-write instead of each one
+        parsing the file, but the log and lock files and the log commit thread are closed, as
+        they cannot be shared across a fork. Each worker reopens them with `resume`.
+        """
+        self.load()
+        if self._compaction is not None:
+            self._compaction.join()
+        with self._lock:
+            if self._wal is not None:
+                self._wal.close()
+                self._wal = None
+            self._file_lock.close()
+            self._compaction_lock.close()
+            self._preloaded = True
+
+    @property
+    def preloaded(self) -> bool:
+        """True from `preload` until the store is resumed, loaded again or closed."""
+        return self._preloaded
+
+    def resume(self) -> None:
+        """Reopens, in a forked worker, the files closed by `preload`, catching up with the writes made since."""
+        with self._lock, self._file_lock:
+            self._sync()
+            self._preloaded = False
+
+    def reload_if_changed(self) -> bool:
+        """Reloads the store if the backing files were modified outside of it.
+
+        Returns:
+        - bool: True if the files had changed and were reloaded, False otherwise.
+        """
+        if not self._changed():
+            self._last_check = time.monotonic()
+            return False
+        with self._lock, self._file_lock:
+            self._sync()
+        return True
+
+    @property
+    def stale(self) -> bool:
+        """True when the next read will check the backing files for changes."""
+        return not self._loaded or time.monotonic() - self._last_check >= self.reload_interval
+
+    def _ensure_fresh(self) -> None:
+        if self.stale:
+            self.reload_if_changed()
+
+    def _persist(self, record: Dict[str, Any]) -> int:
+        # Called with both locks held, before `record` is applied in memory. Returns the WAL ticket to wait on.
+        if self.persistence == "snapshot":
+            items, last_id = dict(self._items), self._last_id
+            for operation in record["ops"] if record["op"] == "batch" else [record]:
+                if operation["op"] == "put":
+                    items[operation["item"]["id"]] = operation["item"]
+                    last_id = max(last_id, parse_id(operation["item"]["id"]))
+                else:
+                    items.pop(operation["id"], None)
+            write_data({"items": list(items.values()) + self._invalid, "last_id": last_id}, self.path)
+            self._seq += 1
+            self._file_stat = self._stat()
+            return 0
+        record["seq"] = self._seq + 1
+        try:
+            ticket, self._log_offset = self._wal.append(record)
+        except Exception:
+            self._recover()
+            raise
+        self._seq += 1
+        self._log_records += len(record["ops"]) if record["op"] == "batch" else 1
+        if self._log_records >= self.compact_threshold and self._compaction is None:
+            self._compaction = threading.Thread(target=self.compact, name="wal-compaction", daemon=True)
+            self._compaction.start()
+        return ticket
+
+    def _write(self, record: Dict[str, Any]) -> int:
+        # Called with both locks held: persists the record first, so a failed write leaves the items and
+        # the listeners untouched, then applies it in memory
+        ticket = self._persist(record)
+        self._apply_ops(record["ops"] if record["op"] == "batch" else [record])
+        return ticket
+
+    def _commit(self, ticket: int) -> None:
+        # Waits for the group commit outside the locks, so concurrent writers share one fsync
+        if ticket:
+            try:
+                self._wal.wait(ticket)
+            except Exception:
+                self._recover()
+                raise
+
+    def _recover(self) -> None:
+        # After a failed log write or fsync: truncates the records that may be lost, and reloads the items from
+        # the files, which undoes in memory (and tells the listeners) every change of the failed group
+        with self._lock, self._file_lock:
+            if self._wal is not None and self._wal.rollback():
+                self._load()
+
+    def compact(self) -> None:
+        """Folds the write-ahead log into a new snapshot of the backing file.
+
+        Only one process compacts at a time; the others skip their turn.
+        """
+        with self._lock:
+            if self._compacting:
+                return
+            if self._wal is None or not self._compaction_lock.acquire(blocking=False):
+                self._log_records = 0
+                self._compaction = None
+                return
+            self._compacting = True
+        try:
+            with self._lock, self._file_lock:
+                self._sync()
+                self._wal.reopen(f"{self.wal_path}.1")
+                self._log_inode, self._log_offset = self._log_stat()
+                self._log_records = 0
+                data = {"items": list(self._items.values()) + self._invalid, "seq": self._seq, "last_id": self._last_id}
+            write_data(data, f"{self.path}.compact")
+            with self._lock, self._file_lock:
+                os.replace(f"{self.path}.compact", self.path)
+                os.remove(f"{self.wal_path}.1")
+                self._file_stat = self._stat()
+        finally:
+            with self._lock:
+                self._compaction_lock.release()
+                self._compacting = False
+                self._compaction = None
+
+    def close(self) -> None:
+        """Flushes and closes the write-ahead log."""
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.join()
+        with self._lock:
+            if self._wal is not None:
+                self._wal.close()
+                self._wal = None
+            self._loaded = False
+            self._preloaded = False
+
+    def get_items(self) -> List[Dict[str, Any]]:
+        self._ensure_fresh()
+        return list(self._items.values())
+
+    @property
+    def invalid_items(self) -> List[Any]:
+        """Items of the files that do not validate against `Item`: kept in the files, but not served."""
+        return list(self._invalid)
+
+    def find_item(self, item_id: str) -> Dict[str, Any]:
+        self._ensure_fresh()
+        return self._items.get(item_id, {})
+
+    def list_items(self, limit: int, cursor: Optional[str] = None, filters: Optional[Dict[str, Tuple[str, str]]] = None,
+                   fields: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Returns one page of items in index order.
+
+        The first filtered field picks the index that drives the scan (the `id` index when there
+        are no filters), so a page costs O(log n + page size). Further filters are checked on each
+        scanned item.
+
+        Args:
+        - limit (int): Maximum number of items in the page.
+        - cursor (str): Cursor returned with the previous page, if any.
+        - filters (Dict[str, Tuple[str, str]]): Field to ("eq" or "prefix", value) filters, fields among FILTER_FIELDS.
+        - fields (List[str]): Fields to return besides `id`, or None for every field.
+
+        Returns:
+        - Tuple[List[dict], Optional[str]]: The page, and the cursor of the next page (None on the last page).
+
+        Raises:
+        - ValueError: If the cursor is invalid or does not belong to these filters.
+        """
+        self._ensure_fresh()
+        filters = filters or {}
+        index_name = next(iter(filters), "id")
+        if index_name == "id":
+            low, high = ("",), (PREFIX_END,)
+        else:
+            operator, value = filters[index_name]
+            low, high = (value,), ((value, PREFIX_END) if operator == "eq" else (value + PREFIX_END,))
+        return self._scan_page(index_name, low, high, limit, cursor, lambda item: matches_filters(item, filters), fields)
+
+    def _scan_page(self, index_name: str, low: Tuple[str, ...], high: Tuple[str, ...], limit: int, cursor: Optional[str],
+                   predicate: Callable[[Dict[str, Any]], bool], fields: Optional[List[str]]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        after = None
+        if cursor:
+            cursor_index, *after = decode_cursor(cursor)
+            if cursor_index != index_name:
+                raise ValueError("Cursor does not match the filters.")
+            after = tuple(after)
+
+        page = []
+        last_key = None
+        for key in self._indexes[index_name].scan(low, high, after):
+            item = self._items.get(key[-1])
+            if item is None or not predicate(item):
+                continue
+            if len(page) == limit:
+                return page, encode_cursor((index_name, *last_key))
+            page.append(project(item, fields))
+            last_key = key
+        return page, None
+
+    def search_items(self, limit: int, cursor: Optional[str] = None, text: Optional[str] = None,
+                     criteria: Optional[List[Tuple[str, str, str]]] = None,
+                     fields: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Returns one page of the items that match every search criterion.
+
+        Full-text words (looked up in the text indexes) and equality criteria on hash-indexed
+        fields each give a set of candidate ids; the sets are intersected, smallest first, and
+        the result is returned in id order. Without any of those, the sorted index of the first
+        criterion drives a range scan (prefix, `gte` and `lte` criteria of that field bound it)
+        and the result is returned in the order of that field. Either way, the other criteria
+        are checked on each candidate, and no index is rebuilt.
+
+        Args:
+        - limit (int): Maximum number of items in the page.
+        - cursor (str): Cursor returned with the previous page, if any.
+        - text (str): Words that must all appear in the text-indexed fields.
+        - criteria (List[Tuple[str, str, str]]): (field, operator, value) criteria, with operators among SEARCH_OPERATORS.
+        - fields (List[str]): Fields to return besides `id`, or None for every field.
+
+        Returns:
+        - Tuple[List[dict], Optional[str]]: The page, and the cursor of the next page (None on the last page).
+
+        Raises:
+        - ValueError: If a criterion or the cursor is invalid.
+        """
+        self._ensure_fresh()
+        criteria = criteria or []
+        for field, operator, _ in criteria:
+            if operator not in SEARCH_OPERATORS or field not in FILTER_FIELDS + HASH_FIELDS:
+                raise ValueError(f"Cannot search {field} with {operator}.")
+        tokens = tokenize(text) if text else set()
+        predicate = lambda item: matches_criteria(item, criteria, tokens)
+
+        candidates = []
+        for token in tokens:
+            candidates.append(frozenset().union(*(self._indexes[f"{field}:text"].lookup(token) for field in TEXT_FIELDS)))
+        for field, operator, value in criteria:
+            if operator == "eq" and field in HASH_FIELDS:
+                candidates.append(self._indexes[f"{field}:hash"].lookup(value))
+
+        if not candidates:
+            index_name = next((field for field, _, _ in criteria if field in FILTER_FIELDS), "id")
+            low, high = ("",), (PREFIX_END,)
+            for field, operator, value in criteria:
+                if field != index_name:
+                    continue
+                if operator in ("eq", "prefix", "gte"):
+                    low = max(low, (value,))
+                if operator == "eq":
+                    high = min(high, (value, PREFIX_END))
+                elif operator == "prefix":
+                    high = min(high, (value + PREFIX_END,))
+                elif operator == "lte":
+                    high = min(high, (value, PREFIX_END))
+            return self._scan_page(index_name, low, high, limit, cursor, predicate, fields)
+
+        after = ""
+        if cursor:
+            cursor_index, *after_key = decode_cursor(cursor)
+            if cursor_index != "search" or len(after_key) != 1:
+                raise ValueError("Cursor does not match the search.")
+            after = after_key[0]
+        candidates.sort(key=len)
+        ids = sorted(candidates[0].intersection(*candidates[1:]))
+        page = []
+        for item_id in ids[bisect_right(ids, after):]:
+            item = self._items.get(item_id)
+            if item is None or not predicate(item):
+                continue
+            if len(page) == limit:
+                return page, encode_cursor(("search", page[-1]["id"]))
+            page.append(project(item, fields))
+        return page, None
+
+    def add_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Adds an item, allocating its id unless it already has one, and returns it."""
+        with self._lock, self._file_lock:
+            self._sync()
+            item = dict(item)
+            if not item.get("id"):
+                item["id"] = format_id(self._last_id + 1)
+            ticket = self._write({"op": "put", "item": item})
+        self._commit(ticket)
+        return item
+
+    def update_item(self, item_id: str, item_update: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock, self._file_lock:
+            self._sync()
+            item = self._items.get(item_id)
+            if item is None:
+                return {}
+            updated_item = {**item, **item_update, "id": item_id}
+            ticket = self._write({"op": "put", "item": updated_item})
+        self._commit(ticket)
+        return updated_item
+
+    def delete_item(self, item_id: str) -> Dict[str, Any]:
+        with self._lock, self._file_lock:
+            self._sync()
+            deleted_item = self._items.get(item_id)
+            if deleted_item is None:
+                return {}
+            ticket = self._write({"op": "delete", "id": item_id})
+        self._commit(ticket)
+        return deleted_item
+
+    def _write_batch(self, operations: List[Dict[str, Any]]) -> int:
+        # Called with both locks held: persists the operations as a single commit, then applies them
+        return self._write({"op": "batch", "ops": operations}) if operations else 0
+
+    def add_items(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Adds several items with a single commit, allocating their ids, and returns them."""
+        with self._lock, self._file_lock:
+            self._sync()
+            added_items = []
+            last_id = self._last_id  # Advanced by _put once the items are persisted
+            for item in items:
+                item = dict(item)
+                if not item.get("id"):
+                    last_id += 1
+                    item["id"] = format_id(last_id)
+                added_items.append(item)
+            ticket = self._write_batch([{"op": "put", "item": item} for item in added_items])
+        self._commit(ticket)
+        return added_items
+
+    def update_items(self, updates: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Updates several items with a single commit.
+
+        Returns:
+        - List[dict]: The updated items, with an empty dict for each item that was not found.
+        """
+        with self._lock, self._file_lock:
+            self._sync()
+            updated_items = []
+            pending: Dict[str, Dict[str, Any]] = {}
+            for item_id, item_update in updates:
+                item = pending.get(item_id) or self._items.get(item_id)
+                if item is None:
+                    updated_items.append({})
+                    continue
+                pending[item_id] = {**item, **item_update, "id": item_id}
+                updated_items.append(pending[item_id])
+            ticket = self._write_batch([{"op": "put", "item": item} for item in pending.values()])
+        self._commit(ticket)
+        return updated_items
+
+    def delete_items(self, item_ids: List[str]) -> List[Dict[str, Any]]:
+        """Deletes several items with a single commit.
+
+        Returns:
+        - List[dict]: The deleted items, with an empty dict for each item that was not found.
+        """
+        with self._lock, self._file_lock:
+            self._sync()
+            deleted_items = []
+            deleted_ids: Dict[str, None] = {}
+            for item_id in item_ids:
+                item = self._items.get(item_id) if item_id not in deleted_ids else None
+                deleted_items.append(item or {})
+                if item is not None:
+                    deleted_ids[item_id] = None
+            ticket = self._write_batch([{"op": "delete", "id": item_id} for item_id in deleted_ids])
+        self._commit(ticket)
+        return deleted_items
+
+# Instantiate the item store for further use
+store = ItemStore()
 
 def get_items() -> List[Dict[str, Any]]:
-    data = read_data()
-    return data.get("items", [])
+    return store.get_items()
 
-def add_item(item: Dict[str, Any]) -> None:
-    data = read_data()
-    items = data.get("items", [])
-    items.append(item)
-    data["items"] = items
-    write_data(data)
+def add_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    return store.add_item(item)
 
 def find_item(item_id: str) -> Dict[str, Any]:
-    data = read_data()
-    items = data.get("items", [])
-    for item in items:
-        if item.get("id") == item_id:
-            return item
-    return {}
+    return store.find_item(item_id)
 
 def update_item(item_id: str, item_update: Dict[str, Any]) -> Dict[str, Any]:
-    data = read_data()
-    items = data.get("items", [])
-    for index, item in enumerate(items):
-        if item.get("id") == item_id:
-            items[index].update(item_update)
-            data["items"] = items
-            write_data(data)
-            return items[index]
-    return {}
+    return store.update_item(item_id, item_update)
 
 def delete_item(item_id: str) -> Dict[str, Any]:
-    data = read_data()
-    items = data.get("items", [])
-    for index, item in enumerate(items):
-        if item.get("id") == item_id:
-            deleted_item = items.pop(index)
-            data["items"] = items
-            write_data(data)
-            return deleted_item
-    return {}
+    return store.delete_item(item_id)
+
+class StorageBackend:
+    """Asynchronous storage contract used by the routes.
+
+    Every backend implements the same operations as the functions above: missing items are
+    reported with an empty dict, and items are plain dicts with a string `id`.
+
+    Backends report their changes to the listeners registered with `subscribe`, and describe
+    them to the ones registered with `subscribe_changes`. A backend is `cacheable` when those
+    notifications also cover the writes of other workers, so that responses built from it can
+    be served from a cache.
+    """
+
+    cacheable = False
+
+    def __init__(self):
+        self._listeners: List[Callable[[Optional[List[str]]], None]] = []
+        self._change_listeners: List[Callable[[List[Dict[str, Any]]], None]] = []
+        self._version = 0
+
+    def subscribe(self, listener: Callable[[Optional[List[str]]], None]) -> None:
+        """Registers a callback run after every change, with the ids of the changed items (None when everything may have changed)."""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def subscribe_changes(self, listener: Callable[[List[Dict[str, Any]]], None]) -> None:
+        """Registers a callback run after every change with the list of changes, in commit order.
+
+        Each change is `{"op": "create" | "update", "id": ..., "item": {...}}` or
+        `{"op": "delete", "id": ...}`; `[{"op": "reset"}]` means that everything may have changed
+        (e.g. the data file was replaced) and the items have to be read again. The callback may
+        run on any thread.
+        """
+        if listener not in self._change_listeners:
+            self._change_listeners.append(listener)
+
+    def _notify(self, item_ids: Optional[List[str]], changes: Optional[List[Dict[str, Any]]] = None) -> None:
+        self._version += 1
+        for listener in self._listeners:
+            listener(item_ids)
+        if item_ids is None:
+            changes = [{"op": "reset"}]
+        if changes:
+            for listener in self._change_listeners:
+                listener(changes)
+
+    async def get_version(self) -> int:
+        """Returns a counter that changes whenever the stored items change."""
+        return self._version
+
+    def preload(self) -> None:
+        """Loads, in the server process before it forks its workers, what they can share (see app/server.py).
+
+        Runs without an event loop. Nothing that cannot cross a fork (connections, threads) may
+        be left open: backends that cannot share anything keep this default, which does nothing.
+        """
+
+    async def connect(self) -> None:
+        """Opens the connections or files used by the backend."""
+
+    async def close(self) -> None:
+        """Releases everything opened by `connect`."""
+
+    async def get_items(self) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def find_item(self, item_id: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def list_items(self, limit: int, cursor: Optional[str] = None, filters: Optional[Dict[str, Tuple[str, str]]] = None,
+                         fields: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Returns one page of items and the cursor of the next one, see `ItemStore.list_items`."""
+        raise NotImplementedError
+
+    async def search_items(self, limit: int, cursor: Optional[str] = None, text: Optional[str] = None,
+                           criteria: Optional[List[Tuple[str, str, str]]] = None,
+                           fields: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Returns one page of the items that match a search, see `ItemStore.search_items`.
+
+        This default checks every item in turn; backends override it to use their indexes.
+        """
+        criteria = criteria or []
+        tokens = tokenize(text) if text else set()
+        after = decode_cursor(cursor)[-1] if cursor else None
+        page = []
+        async for item in self.iter_items():
+            if (after is not None and item["id"] <= after) or not matches_criteria(item, criteria, tokens):
+                continue
+            if len(page) == limit:
+                return page, encode_cursor(("search", page[-1]["id"]))
+            page.append(project(item, fields))
+        return page, None
+
+    async def iter_items(self, batch_size: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+        """Yields every item, fetching `batch_size` items at a time so memory use stays constant."""
+        cursor = None
+        while True:
+            page, cursor = await self.list_items(batch_size, cursor)
+            for item in page:
+                yield item
+            if cursor is None:
+                return
+
+    async def add_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def update_item(self, item_id: str, item_update: Dict[str, Any]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def delete_item(self, item_id: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def add_items(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Adds several items and returns them. Backends override this to write them in one batch."""
+        return [await self.add_item(item) for item in items]
+
+    async def update_items(self, updates: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Updates several items, returning an empty dict for each one that was not found."""
+        return [await self.update_item(item_id, item_update) for item_id, item_update in updates]
+
+    async def delete_items(self, item_ids: List[str]) -> List[Dict[str, Any]]:
+        """Deletes several items, returning an empty dict for each one that was not found."""
+        return [await self.delete_item(item_id) for item_id in item_ids]
+
+class JSONBackend(StorageBackend):
+    """Storage backend over an `ItemStore`.
+
+    Reads are served straight from memory on the event loop. Writes, and reads that have to
+    check the backing files first, run in the threadpool since they do file I/O and may wait
+    on the lock of another worker.
+    """
+
+    cacheable = True
+
+    def __init__(self, item_store: ItemStore = store):
+        super().__init__()
+        self.store = item_store
+
+    def subscribe(self, listener: Callable[[Optional[List[str]]], None]) -> None:
+        self.store.subscribe(listener)
+
+    def subscribe_changes(self, listener: Callable[[List[Dict[str, Any]]], None]) -> None:
+        self.store.subscribe_changes(listener)
+
+    async def get_version(self) -> int:
+        # Checking the backing files here keeps cached responses in sync with the other workers
+        if self.store.stale:
+            # Concurrent requests share one check instead of each reading the files
+            await single_flight.do(("reload", id(self.store)), lambda: run_in_threadpool(self.store.reload_if_changed))
+        return self.store.version
+
+    def preload(self) -> None:
+        self.store.preload()
+
+    async def connect(self) -> None:
+        if self.store.preloaded:
+            # Loaded before the fork: only catching up keeps the memory shared with the other workers
+            await run_in_threadpool(self.store.resume)
+        else:
+            await run_in_threadpool(self.store.load)
+
+    async def close(self) -> None:
+        await run_in_threadpool(self.store.close)
+
+    async def get_items(self) -> List[Dict[str, Any]]:
+        if self.store.stale:
+            return await run_in_threadpool(self.store.get_items)
+        return self.store.get_items()
+
+    async def find_item(self, item_id: str) -> Dict[str, Any]:
+        if self.store.stale:
+            return await run_in_threadpool(self.store.find_item, item_id)
+        return self.store.find_item(item_id)
+
+    async def list_items(self, limit: int, cursor: Optional[str] = None, filters: Optional[Dict[str, Tuple[str, str]]] = None,
+                         fields: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        if self.store.stale:
+            return await run_in_threadpool(self.store.list_items, limit, cursor, filters, fields)
+        return self.store.list_items(limit, cursor, filters, fields)
+
+    async def search_items(self, limit: int, cursor: Optional[str] = None, text: Optional[str] = None,
+                           criteria: Optional[List[Tuple[str, str, str]]] = None,
+                           fields: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        if self.store.stale:
+            return await run_in_threadpool(self.store.search_items, limit, cursor, text, criteria, fields)
+        return self.store.search_items(limit, cursor, text, criteria, fields)
+
+    async def add_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        return await run_in_threadpool(self.store.add_item, item)
+
+    async def update_item(self, item_id: str, item_update: Dict[str, Any]) -> Dict[str, Any]:
+        return await run_in_threadpool(self.store.update_item, item_id, item_update)
+
+    async def delete_item(self, item_id: str) -> Dict[str, Any]:
+        return await run_in_threadpool(self.store.delete_item, item_id)
+
+    async def add_items(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return await run_in_threadpool(self.store.add_items, items)
+
+    async def update_items(self, updates: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        return await run_in_threadpool(self.store.update_items, updates)
+
+    async def delete_items(self, item_ids: List[str]) -> List[Dict[str, Any]]:
+        return await run_in_threadpool(self.store.delete_items, item_ids)
+
+_backend: Optional[StorageBackend] = None
+
+def get_backend() -> StorageBackend:
+    """Returns the storage backend selected by `DB_BACKEND`, creating it on first use."""
+    global _backend
+    if _backend is None:
+        if DB_BACKEND == "json":
+            _backend = JSONBackend()
+        elif DB_BACKEND == "sharded":
+            from app.api.config.shards import ShardedBackend
+            _backend = ShardedBackend()
+        elif DB_BACKEND == "sqlite":
+            from app.api.config.sqlite import SQLiteBackend
+            _backend = SQLiteBackend()
+        elif DB_BACKEND == "mongo":
+            from app.api.config.mongo import MongoBackend
+            _backend = MongoBackend()
+        else:
+            raise ValueError(f"Unknown storage backend: {DB_BACKEND}")
+    return _backend
+
+def set_backend(backend: StorageBackend) -> None:
+    """Replaces the storage backend, e.g. with a fake in tests."""
+    global _backend
+    _backend = backend
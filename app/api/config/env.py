@@ -8,4 +8,121 @@ JWT_SECRET = os.getenv('JWT_SECRET') # The JWT secret string
 PRODUCTION_SERVER_URL = os.getenv('PRODUCTION_SERVER_URL')
 DEVELOPMENT_SERVER_URL = os.getenv('DEVELOPMENT_SERVER_URL')
 LOCALHOST_SERVER_URL = os.getenv('LOCALHOST_SERVER_URL')
-IS_PRODUCTION = os.getenv('IS_PRODUCTION') # Boolean to determine if is prod environment or nah
\ No newline at end of file
+IS_PRODUCTION = os.getenv('IS_PRODUCTION') # Boolean to determine if is prod environment or nah
+STARTUP_BACKGROUND_LOAD = os.getenv('STARTUP_BACKGROUND_LOAD', '0') == '1' # Start serving before the storage is loaded (cold starts); /health/ready answers 503 until it is
+
+# Server configuration (python -m app.server)
+SERVER_HOST = os.getenv('SERVER_HOST', '0.0.0.0') # Address the server listens on
+SERVER_PORT = int(os.getenv('SERVER_PORT', '8000')) # Port the server listens on
+SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', '0')) # Worker processes (0: one per CPU available to the process)
+SERVER_BACKLOG = int(os.getenv('SERVER_BACKLOG', '2048')) # Connections waiting to be accepted before new ones are refused
+SERVER_KEEPALIVE = float(os.getenv('SERVER_KEEPALIVE', '75')) # Seconds an idle keep-alive connection stays open; keep it above the idle timeout of the load balancer
+SERVER_GRACEFUL_TIMEOUT = float(os.getenv('SERVER_GRACEFUL_TIMEOUT', '30')) # Seconds the workers have to finish their requests after a SIGTERM
+SERVER_PRELOAD = os.getenv('SERVER_PRELOAD', '1') == '1' # Load the items before forking the workers, so they share that memory
+
+# Authentication configuration
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', '10000')) # Verified tokens kept in memory (0 verifies every token on every request)
+AUTH_TOKEN_CACHE_TTL = float(os.getenv('AUTH_TOKEN_CACHE_TTL', '300')) # Seconds a verified token is trusted before it is verified again (never past its exp)
+AUTH_USER_CACHE_SIZE = int(os.getenv('AUTH_USER_CACHE_SIZE', '10000')) # Users of compact tokens kept in memory
+AUTH_USER_CACHE_TTL = float(os.getenv('AUTH_USER_CACHE_TTL', '60')) # Seconds a looked up user is kept before it is looked up again
+AUTH_COMPACT_TOKENS = os.getenv('AUTH_COMPACT_TOKENS', '0') == '1' # Issue tokens that only carry the user ID ('sub') instead of the whole user
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12')) # bcrypt work factor; hashes with another one are rehashed on login
+BCRYPT_WORKERS = int(os.getenv('BCRYPT_WORKERS', str(min(4, os.cpu_count() or 1)))) # Threads of the dedicated password hashing pool
+BCRYPT_QUEUE_SIZE = int(os.getenv('BCRYPT_QUEUE_SIZE', '32')) # Pending password operations before new ones get a 503
+
+# Rate limit configuration
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', '1') == '1' # Whether the route limits are enforced
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'file') # Limiter state: 'file' (shared by the workers of a host), 'memory' (per worker) or 'redis' (shared by every host)
+RATE_LIMIT_FILE = os.getenv('RATE_LIMIT_FILE', f"{os.getenv('DATA_FILE', 'data.json')}.ratelimit") # Memory-mapped state file of the 'file' backend
+RATE_LIMIT_FILE_SLOTS = int(os.getenv('RATE_LIMIT_FILE_SLOTS', '65536')) # Clients tracked by the 'file' backend (16 bytes each)
+RATE_LIMIT_REDIS_URL = os.getenv('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/0') # Server of the 'redis' backend
+RATE_LIMIT_DEFAULT = os.getenv('RATE_LIMIT_DEFAULT', '5/minute') # Limit of every route not listed in RATE_LIMITS
+RATE_LIMITS = os.getenv('RATE_LIMITS', '') # Per-route overrides of the default limits, e.g. "list_items=100/minute;create_item=10/minute"
+
+# Concurrency limit configuration
+CONCURRENCY_LIMIT_ENABLED = os.getenv('CONCURRENCY_LIMIT_ENABLED', '1') == '1' # Limit the requests each worker runs at once, adapting to their latency, and shed the excess with 503
+CONCURRENCY_INITIAL_LIMIT = float(os.getenv('CONCURRENCY_INITIAL_LIMIT', '50')) # Requests of one route that may run at once, before the limit adapts
+CONCURRENCY_MIN_LIMIT = float(os.getenv('CONCURRENCY_MIN_LIMIT', '20')) # Lowest limit of a route (and of the worker) under overload
+CONCURRENCY_MAX_LIMIT = float(os.getenv('CONCURRENCY_MAX_LIMIT', '500')) # Highest limit of a route
+CONCURRENCY_TOTAL_LIMIT = float(os.getenv('CONCURRENCY_TOTAL_LIMIT', '200')) # Requests of every route that may run at once in a worker, before the limit adapts
+CONCURRENCY_TOTAL_MAX_LIMIT = float(os.getenv('CONCURRENCY_TOTAL_MAX_LIMIT', '2000')) # Highest limit of a worker
+CONCURRENCY_TOLERANCE = float(os.getenv('CONCURRENCY_TOLERANCE', '2')) # Latency, as a multiple of its usual value, above which the limits shrink
+CONCURRENCY_QUEUE_SIZE = int(os.getenv('CONCURRENCY_QUEUE_SIZE', '1000')) # Requests that may wait for the limits; more are shed right away, writes first
+CONCURRENCY_QUEUE_TIMEOUT = float(os.getenv('CONCURRENCY_QUEUE_TIMEOUT', '1')) # Seconds a request may wait for the limits before it is shed
+CONCURRENCY_CHEAP_READ_MS = float(os.getenv('CONCURRENCY_CHEAP_READ_MS', '50')) # Reads of routes usually faster than this go first in the queue, then other reads, then writes
+
+# Serialization configuration
+JSON_FAST = os.getenv('JSON_FAST', '1') == '1' # Encode with orjson when installed, skip revalidating stored items in responses and persist compact JSON
+
+# Storage configuration
+DB_BACKEND = os.getenv('DB_BACKEND', 'json') # Storage backend: 'json' (DATA_FILE), 'sharded' (DATA_SHARD_DIR), 'sqlite' (SQLITE_PATH) or 'mongo'
+DATA_FILE = os.getenv('DATA_FILE', 'data.json') # JSON file that backs the item store
+DATA_RELOAD_INTERVAL = float(os.getenv('DATA_RELOAD_INTERVAL', '1')) # Seconds between checks for external edits of DATA_FILE (0 checks on every access)
+DATA_PERSISTENCE = os.getenv('DATA_PERSISTENCE', 'snapshot') # 'snapshot' rewrites DATA_FILE on every write, 'wal' appends to a write-ahead log
+WAL_FILE = os.getenv('WAL_FILE', f'{DATA_FILE}.log') # Write-ahead log used when DATA_PERSISTENCE is 'wal'
+WAL_COMPACT_THRESHOLD = int(os.getenv('WAL_COMPACT_THRESHOLD', '10000')) # Log records that trigger a background compaction into DATA_FILE
+PAGE_SIZE_DEFAULT = int(os.getenv('PAGE_SIZE_DEFAULT', '100')) # Items per page of GET /items/ when no limit is given
+PAGE_SIZE_MAX = int(os.getenv('PAGE_SIZE_MAX', '1000')) # Largest limit accepted by GET /items/
+DATA_SHARDS = int(os.getenv('DATA_SHARDS', '8')) # Shard files of the 'sharded' backend; change it with `python -m app.api.config.shards --shards N`
+DATA_SHARD_DIR = os.getenv('DATA_SHARD_DIR', f'{DATA_FILE}.shards') # Directory of the shard files, their write-ahead logs and the shared id counter
+DATA_ID_BLOCK_SIZE = int(os.getenv('DATA_ID_BLOCK_SIZE', '1000')) # Ids each worker of the 'sharded' backend reserves at a time from the shared counter
+BULK_MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', '100000')) # Largest number of entries accepted by the /items/bulk/ endpoints
+
+# SQLite configuration
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'data.db') # Database file of the 'sqlite' backend; import DATA_FILE with `python -m app.api.config.sqlite`
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL') # 'NORMAL' syncs the WAL at checkpoints (a crash may lose the last commits, never corrupts), 'FULL' on every commit
+SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', '30')) # Seconds a write waits for the write lock held by another worker
+
+# Logging configuration
+LOG_FILE = os.getenv('LOG_FILE', f'api_{API_NAME}.log') # JSON lines log file (empty to log to stderr only)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO') # Lowest level that is logged
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024))) # Size at which LOG_FILE is rotated
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5')) # Rotated log files that are kept
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000')) # Records waiting for the log writer thread; more are dropped
+LOG_INFO_SAMPLE_RATE = float(os.getenv('LOG_INFO_SAMPLE_RATE', '1')) # Fraction of requests whose INFO lines are logged (warnings and errors always are)
+
+# Response cache configuration
+CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES', str(64 * 1024 * 1024))) # Memory cap of the read response cache, in bytes (0 disables it)
+
+# Change feed configuration
+CHANGES_BUFFER_SIZE = int(os.getenv('CHANGES_BUFFER_SIZE', '10000')) # Latest change events kept by each worker, replayed to clients that reconnect with a Last-Event-ID
+CHANGES_QUEUE_SIZE = int(os.getenv('CHANGES_QUEUE_SIZE', '1000')) # Events waiting to be sent to a client before it is disconnected as too slow
+CHANGES_KEEPALIVE = float(os.getenv('CHANGES_KEEPALIVE', '15')) # Seconds between keep-alive comments on idle change streams
+CHANGES_POLL_INTERVAL = float(os.getenv('CHANGES_POLL_INTERVAL', '1')) # Seconds between checks for the writes of other workers while clients are listening
+
+# Idempotency configuration
+IDEMPOTENCY_ENABLED = os.getenv('IDEMPOTENCY_ENABLED', '1') == '1' # Replay the stored response of writes sent again with the same Idempotency-Key header
+IDEMPOTENCY_BACKEND = os.getenv('IDEMPOTENCY_BACKEND', 'file') # Response store: 'file' (shared by the workers of a host) or 'memory' (per worker)
+IDEMPOTENCY_DIR = os.getenv('IDEMPOTENCY_DIR', f"{os.getenv('DATA_FILE', 'data.json')}.idempotency") # Directory of the 'file' backend
+IDEMPOTENCY_TTL = float(os.getenv('IDEMPOTENCY_TTL', '86400')) # Seconds a stored response is replayed for
+IDEMPOTENCY_MAX_BYTES = int(os.getenv('IDEMPOTENCY_MAX_BYTES', str(64 * 1024 * 1024))) # Size cap of the stored responses; the oldest are evicted first
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv('IDEMPOTENCY_WAIT_TIMEOUT', '10')) # Seconds a retry waits for the original request to finish before getting a 409
+
+# Compression configuration
+COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', '1') == '1' # Compress JSON and text responses for clients that accept br (with the brotli package) or gzip
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024')) # Smallest response body, in bytes, that is compressed
+COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', '6')) # gzip level, from 1 (fastest) to 9 (smallest)
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', '5')) # Brotli quality, from 0 (fastest) to 11 (smallest)
+COMPRESSION_THREAD_MIN_SIZE = int(os.getenv('COMPRESSION_THREAD_MIN_SIZE', '65536')) # Bodies and chunks at least this big are compressed in the threadpool, off the event loop
+COMPRESSION_CACHE_MAX_BYTES = int(os.getenv('COMPRESSION_CACHE_MAX_BYTES', str(32 * 1024 * 1024))) # Memory cap of the compressed bodies of cached responses (0 disables it)
+
+# Metrics configuration
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1' # Record request, storage, rate limit and auth metrics, exposed at /metrics
+METRICS_DIR = os.getenv('METRICS_DIR', '') # Directory where every worker writes its metrics, so /metrics reports the whole host (empty: per worker)
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5')) # Seconds between writes of the metrics of a worker to METRICS_DIR
+SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', '1') == '1' # Add a Server-Timing header with the storage, auth and rate limit times of each request
+
+# Profiling configuration
+PROFILE_ENABLED = os.getenv('PROFILE_ENABLED', '0') == '1' # Start the request profiler with the app (it can also be switched on at runtime)
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0.01')) # Fraction of requests profiled while the profiler runs
+PROFILE_LATENCY_THRESHOLD_MS = float(os.getenv('PROFILE_LATENCY_THRESHOLD_MS', '0')) # Also profile every request slower than this (0 disables it)
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', '5')) # Milliseconds between two stack samples
+PROFILE_MAX_DEPTH = int(os.getenv('PROFILE_MAX_DEPTH', '64')) # Innermost frames kept per sampled stack
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles') # Directory of the collapsed stack files, one per route and worker
+PROFILE_SIGNAL = os.getenv('PROFILE_SIGNAL', 'SIGUSR2') # Signal that switches the profiler of a worker on and off (empty disables it)
+
+# MongoDB configuration
+MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017') # MongoDB connection string used when DB_BACKEND is 'mongo'
+MONGO_DB = os.getenv('MONGO_DB', API_NAME or 'api') # MongoDB database name
+MONGO_COLLECTION = os.getenv('MONGO_COLLECTION', 'items') # MongoDB collection holding the items
+MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', '100')) # Maximum connections in the MongoDB client pool
@@ -0,0 +1,71 @@
+import asyncio
+import contextvars
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+class ExecutorSaturated(Exception):
+    """Raised when a BoundedExecutor already has as many pending jobs as it accepts."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Executor saturated, retry after {retry_after} seconds.")
+        self.retry_after = retry_after
+
+class BoundedExecutor:
+    """Dedicated thread pool for CPU-heavy jobs, with a cap on running plus queued jobs.
+
+    Jobs do not compete with the shared threadpool that serves the sync parts of the routes.
+    Once `max_pending` jobs are waiting or running, new ones are rejected right away with
+    ExecutorSaturated, whose `retry_after` estimates when the queue will have drained.
+    The pool is created on first use.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, thread_name_prefix: str = "bounded"):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.thread_name_prefix = thread_name_prefix
+        self.pending = 0
+        self.rejected = 0
+        self._average_duration = 0.0  # Moving average of the job durations, in seconds
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.pending * self._average_duration / self.max_workers))
+
+    def _timed(self, function: Callable[..., Any], *args: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            duration = time.perf_counter() - start
+            self._average_duration = duration if not self._average_duration else 0.8 * self._average_duration + 0.2 * duration
+
+    async def run(self, function: Callable[..., Any], *args: Any) -> Any:
+        """Runs `function(*args)` in the pool and returns its result.
+
+        Raises:
+        - ExecutorSaturated: If `max_pending` jobs are already pending.
+        """
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise ExecutorSaturated(self.retry_after())
+            self.pending += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix=self.thread_name_prefix)
+        try:
+            # Jobs run in the context of the caller, like `run_in_threadpool`, so they keep its request ID
+            context = contextvars.copy_context()
+            return await asyncio.get_event_loop().run_in_executor(self._executor, context.run, self._timed, function, *args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
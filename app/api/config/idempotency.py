@@ -0,0 +1,257 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.api.config.env import IDEMPOTENCY_BACKEND, IDEMPOTENCY_DIR, IDEMPOTENCY_TTL, IDEMPOTENCY_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+class StoredResponse:
+    """Response of a request sent with an Idempotency-Key, with the fingerprint of that request."""
+
+    __slots__ = ("status", "headers", "body", "fingerprint")
+
+    def __init__(self, status: int, headers: List[Tuple[bytes, bytes]], body: bytes, fingerprint: str):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.fingerprint = fingerprint
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(name) + len(value) for name, value in self.headers)
+
+    def dumps(self) -> bytes:
+        meta = {"status": self.status, "fingerprint": self.fingerprint,
+                "headers": [[name.decode("latin-1"), value.decode("latin-1")] for name, value in self.headers]}
+        return json.dumps(meta).encode() + b"\n" + self.body
+
+    @classmethod
+    def loads(cls, data: bytes) -> "StoredResponse":
+        meta, _, body = data.partition(b"\n")
+        meta = json.loads(meta)
+        headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in meta["headers"]]
+        return cls(meta["status"], headers, body, meta["fingerprint"])
+
+class MemoryStore:
+    """Responses kept in the memory of this worker, for single-worker deployments and tests.
+
+    Entries expire `ttl` seconds after they are stored, and the oldest are evicted when their
+    total size goes over `max_bytes`.
+    """
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, max_bytes: int = IDEMPOTENCY_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[str, Tuple[StoredResponse, float]]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Event] = {}
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[StoredResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[key]
+                self.size -= entry[0].size
+                return None
+            return entry[0]
+
+    async def claim(self, key: str) -> bool:
+        """Marks a key as in progress. Returns False when another request already holds it."""
+        if key in self._pending:
+            return False
+        self._pending[key] = asyncio.Event()
+        return True
+
+    async def complete(self, key: str, response: Optional[StoredResponse]) -> None:
+        """Releases a claimed key, storing its response unless it is None."""
+        if response is not None and response.size <= self.max_bytes:
+            with self._lock:
+                previous = self._entries.pop(key, None)
+                if previous is not None:
+                    self.size -= previous[0].size
+                self._entries[key] = (response, time.time() + self.ttl)
+                self.size += response.size
+                while self.size > self.max_bytes:
+                    _, (evicted, _) = self._entries.popitem(last=False)
+                    self.size -= evicted.size
+        event = self._pending.pop(key, None)
+        if event is not None:
+            event.set()
+
+    async def wait(self, key: str, timeout: float) -> bool:
+        """Waits until a claimed key is released. Returns False on timeout."""
+        event = self._pending.get(key)
+        if event is None:
+            return True
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+class FileStore:
+    """Responses kept in a directory shared by the workers of a host.
+
+    A request claims its key by creating `<key>.lock` exclusively, with its PID inside; a claim
+    whose process is gone is taken over. Responses are written to `<key>.response` and expire
+    `ttl` seconds after their modification time. At most every `sweep_interval` seconds, a
+    completing request deletes the expired files and the oldest ones over `max_bytes`.
+    """
+
+    def __init__(self, directory: str = IDEMPOTENCY_DIR, ttl: float = IDEMPOTENCY_TTL,
+                 max_bytes: int = IDEMPOTENCY_MAX_BYTES, sweep_interval: float = 60, poll_interval: float = 0.02):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self.poll_interval = poll_interval
+        self._last_sweep = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{key}.{suffix}")
+
+    def _get(self, key: str) -> Optional[StoredResponse]:
+        path = self._path(key, "response")
+        try:
+            if os.stat(path).st_mtime + self.ttl <= time.time():
+                os.remove(path)
+                return None
+            with open(path, "rb") as file:
+                return StoredResponse.loads(file.read())
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            logger.error("Discarding the unreadable idempotent response %s: %s", path, e)
+            os.remove(path)
+            return None
+
+    def _claim(self, key: str) -> bool:
+        path = self._path(key, "lock")
+        for _ in range(2):
+            try:
+                descriptor = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                if self._claim_alive(path):
+                    return False
+                try:
+                    os.remove(path)  # Left behind by a worker that died mid-request
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(descriptor, "w") as file:
+                file.write(str(os.getpid()))
+            return True
+        return False
+
+    def _claim_alive(self, path: str) -> bool:
+        try:
+            with open(path) as file:
+                pid = int(file.read() or 0)
+        except FileNotFoundError:
+            return False
+        except ValueError:
+            return True  # Being written by its owner
+        if pid == os.getpid():
+            return True
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            pass  # Exists, but belongs to another user
+        return True
+
+    def _complete(self, key: str, response: Optional[StoredResponse]) -> None:
+        if response is not None and response.size <= self.max_bytes:
+            path = self._path(key, "response")
+            with open(f"{path}.tmp", "wb") as file:
+                file.write(response.dumps())
+            os.replace(f"{path}.tmp", path)
+        try:
+            os.remove(self._path(key, "lock"))
+        except FileNotFoundError:
+            pass
+        if time.time() - self._last_sweep >= self.sweep_interval:
+            self._last_sweep = time.time()
+            self.sweep()
+
+    def sweep(self) -> None:
+        """Deletes the expired responses, then the oldest ones until the rest fit in `max_bytes`."""
+        now = time.time()
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if not entry.name.endswith(".response"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if stat.st_mtime + self.ttl <= now:
+                    self._remove(entry.path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    async def get(self, key: str) -> Optional[StoredResponse]:
+        return await run_in_threadpool(self._get, key)
+
+    async def claim(self, key: str) -> bool:
+        return await run_in_threadpool(self._claim, key)
+
+    async def complete(self, key: str, response: Optional[StoredResponse]) -> None:
+        await run_in_threadpool(self._complete, key, response)
+
+    async def wait(self, key: str, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        path = self._path(key, "lock")
+        while self._claim_alive(path):
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(self.poll_interval)
+        return True
+
+def create_store(name: str = IDEMPOTENCY_BACKEND):
+    if name == "memory":
+        return MemoryStore()
+    if name == "file":
+        return FileStore()
+    raise ValueError(f"Unknown idempotency backend: {name!r}")
+
+_store = None
+
+def get_store():
+    """Returns the response store selected by `IDEMPOTENCY_BACKEND`, creating it on first use."""
+    global _store
+    if _store is None:
+        _store = create_store()
+    return _store
+
+def set_store(store) -> None:
+    """Replaces the response store, e.g. with a `MemoryStore` in tests."""
+    global _store
+    _store = store
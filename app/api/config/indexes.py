@@ -0,0 +1,145 @@
+import re
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple, Type
+
+from pydantic import BaseModel
+
+# Sorts after every character, so (prefix + PREFIX_END) bounds every string that starts with prefix
+PREFIX_END = "\U0010ffff"
+
+# Kinds of index that can be declared on a model field, e.g. `name: str = Field(..., indexes=("hash", "text"))`
+INDEX_KINDS = ("hash", "sorted", "text")
+
+_EMPTY: FrozenSet[str] = frozenset()
+
+def index_value(value: Any) -> str:
+    """Normalizes a field value so keys of hand-edited items stay comparable."""
+    return value if isinstance(value, str) else ("" if value is None else str(value))
+
+def tokenize(value: Any) -> Set[str]:
+    """Splits a text into the lowercase words that the text index and the searches use."""
+    return set(re.findall(r"\w+", index_value(value).lower()))
+
+def declared_indexes(model: Type[BaseModel]) -> Dict[str, Tuple[str, ...]]:
+    """Returns the index kinds declared on each field of a model through `Field(..., indexes=...)`.
+
+    Raises:
+    - ValueError: If a field declares an unknown kind of index.
+    """
+    indexes = {}
+    for name, field in model.__fields__.items():
+        kinds = tuple(field.field_info.extra.get("indexes", ()))
+        for kind in kinds:
+            if kind not in INDEX_KINDS:
+                raise ValueError(f"Unknown index kind {kind!r} on field {name!r}")
+        if kinds:
+            indexes[name] = kinds
+    return indexes
+
+class SortedIndex:
+    """Sorted list of keys, kept up to date incrementally on every write.
+
+    Serves ordered range scans (keyset pagination, equality and prefix lookups) in
+    O(log n + page size). Each key ends with the item `id`, which makes keys unique.
+    """
+
+    def __init__(self, key: Callable[[Dict[str, Any]], Tuple[str, ...]]):
+        self.key = key
+        self._keys: List[Tuple[str, ...]] = []
+
+    def rebuild(self, items: Iterable[Dict[str, Any]]) -> None:
+        self._keys = sorted(self.key(item) for item in items)
+
+    def add(self, item: Dict[str, Any]) -> None:
+        insort(self._keys, self.key(item))
+
+    def remove(self, item: Dict[str, Any]) -> None:
+        key = self.key(item)
+        index = bisect_left(self._keys, key)
+        if index < len(self._keys) and self._keys[index] == key:
+            del self._keys[index]
+
+    def scan(self, low: Tuple[str, ...], high: Tuple[str, ...], after: Optional[Tuple[str, ...]] = None,
+             chunk_size: int = 256) -> Iterator[Tuple[str, ...]]:
+        """Yields the keys in [low, high) in order, starting right after `after` when given.
+
+        Keys are read in chunks (each slice is atomic), so a scan can run while writers modify
+        the index: it never fails, and later chunks pick up where the last key left off.
+        """
+        last = after if after is not None and after >= low else None
+        position = bisect_right(self._keys, last) if last is not None else bisect_left(self._keys, low)
+        while True:
+            chunk = self._keys[position:position + chunk_size]
+            if not chunk:
+                return
+            for key in chunk:
+                if key >= high:
+                    return
+                if last is not None and key <= last:
+                    continue
+                last = key
+                yield key
+            position = bisect_right(self._keys, last)
+
+class HashIndex:
+    """Map of each value of a field to the ids of the items that have it.
+
+    Serves equality lookups in O(1). Kept up to date incrementally on every write.
+    """
+
+    def __init__(self, field: str):
+        self.field = field
+        self._ids: Dict[str, Set[str]] = {}
+
+    def rebuild(self, items: Iterable[Dict[str, Any]]) -> None:
+        ids: Dict[str, Set[str]] = {}
+        for item in items:
+            ids.setdefault(index_value(item.get(self.field)), set()).add(item.get("id"))
+        self._ids = ids
+
+    def add(self, item: Dict[str, Any]) -> None:
+        self._ids.setdefault(index_value(item.get(self.field)), set()).add(item.get("id"))
+
+    def remove(self, item: Dict[str, Any]) -> None:
+        value = index_value(item.get(self.field))
+        ids = self._ids.get(value)
+        if ids is not None:
+            ids.discard(item.get("id"))
+            if not ids:
+                del self._ids[value]
+
+    def lookup(self, value: str) -> FrozenSet[str]:
+        # Copied while holding the GIL, so a concurrent writer never changes the result under the caller
+        return frozenset(self._ids.get(value, _EMPTY))
+
+class TextIndex:
+    """Inverted index of a text field: map of each word (see `tokenize`) to the ids of the items that contain it.
+
+    Serves full-text lookups in O(1) per word. Kept up to date incrementally on every write.
+    """
+
+    def __init__(self, field: str):
+        self.field = field
+        self._ids: Dict[str, Set[str]] = {}
+
+    def rebuild(self, items: Iterable[Dict[str, Any]]) -> None:
+        ids: Dict[str, Set[str]] = {}
+        for item in items:
+            for token in tokenize(item.get(self.field)):
+                ids.setdefault(token, set()).add(item.get("id"))
+        self._ids = ids
+
+    def add(self, item: Dict[str, Any]) -> None:
+        for token in tokenize(item.get(self.field)):
+            self._ids.setdefault(token, set()).add(item.get("id"))
+
+    def remove(self, item: Dict[str, Any]) -> None:
+        for token in tokenize(item.get(self.field)):
+            ids = self._ids.get(token)
+            if ids is not None:
+                ids.discard(item.get("id"))
+                if not ids:
+                    del self._ids[token]
+
+    def lookup(self, token: str) -> FrozenSet[str]:
+        return frozenset(self._ids.get(token, _EMPTY))
@@ -1,4 +1,313 @@
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+import asyncio
+import functools
+import hashlib
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
 
-limiter = Limiter(key_func=get_remote_address)
+from fastapi import HTTPException, Request
+
+from app.api.config.env import (RATE_LIMIT_ENABLED, RATE_LIMIT_BACKEND, RATE_LIMIT_FILE, RATE_LIMIT_FILE_SLOTS,
+                                RATE_LIMIT_REDIS_URL, RATE_LIMIT_DEFAULT, RATE_LIMITS)
+from app.api.config.metrics import RATE_LIMIT_REJECTIONS, record_timing
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+def parse_rate(rate: str) -> Tuple[int, float]:
+    """Parses a limit like "5/minute", "100 per hour" or "10/30 seconds".
+
+    Args:
+    - rate (str): Limit to parse.
+
+    Returns:
+    - Tuple[int, float]: Number of requests allowed and the period they are allowed in, in seconds.
+
+    Raises:
+    - ValueError: If the limit is not valid.
+    """
+    match = re.fullmatch(r"\s*(\d+)\s*(?:/|per)\s*(\d+)?\s*(second|minute|hour|day)s?\s*", rate)
+    if not match or int(match.group(1)) <= 0:
+        raise ValueError(f"Invalid rate limit: {rate!r}")
+    return int(match.group(1)), int(match.group(2) or 1) * _PERIODS[match.group(3)]
+
+def parse_route_limits(value: str) -> Dict[str, str]:
+    """Parses per-route limits given as "route_name=5/minute;other_route=100/hour"."""
+    limits = {}
+    for entry in filter(None, (part.strip() for part in value.split(";"))):
+        name, _, rate = entry.partition("=")
+        parse_rate(rate)
+        limits[name.strip()] = rate.strip()
+    return limits
+
+def gcra(tat: Optional[float], now: float, count: int, period: float) -> Tuple[Optional[float], float]:
+    """Generic cell rate algorithm: the state of a key is a single timestamp, its theoretical arrival time.
+
+    Allows bursts of up to `count` requests and then one request every `period / count` seconds.
+
+    Returns:
+    - Tuple[Optional[float], float]: The new arrival time to store (None if the request is rejected)
+      and the seconds to wait before retrying (0 if it is allowed).
+    """
+    new_tat = max(tat or now, now) + period / count
+    if new_tat - now > period:
+        return None, new_tat - now - period
+    return new_tat, 0.0
+
+class RateLimitExceeded(Exception):
+    """Raised when a request goes over its rate limit."""
+
+    def __init__(self, limit: str, retry_after: float):
+        super().__init__(f"Rate limit exceeded: {limit}")
+        self.limit = limit
+        self.retry_after = retry_after
+
+class MemoryBackend:
+    """Limiter state in a dictionary of the current process. Every worker enforces its own limits."""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._state: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    async def acquire(self, key: str, count: int, period: float) -> float:
+        now = time.time()
+        with self._lock:
+            tat, retry_after = gcra(self._state.get(key), now, count, period)
+            if tat is not None:
+                if len(self._state) >= self.max_keys and key not in self._state:
+                    # Keys whose arrival time has passed are back to a full burst, so they can be forgotten
+                    self._state = {key: value for key, value in self._state.items() if value > now}
+                self._state[key] = tat
+            return retry_after
+
+    async def close(self) -> None:
+        pass
+
+class FileBackend:
+    """Limiter state in a memory-mapped file, shared by every worker process on the host.
+
+    The file is a fixed-size hash table of (key hash, arrival time) slots grouped in buckets of
+    eight. A request only locks its own bucket (a byte-range lock), so updates are O(1) and
+    workers rarely contend. When a bucket is full, the slot that expires first is reused.
+    The locks are only ever tried: while another worker holds a bucket, the request waits
+    with `asyncio.sleep` and tries again, so the event loop keeps serving the others.
+    """
+
+    _SLOT = struct.Struct("<Qd")
+    _BUCKET_SLOTS = 8
+    # Seconds between attempts to lock a busy bucket, doubled up to the maximum
+    _RETRY_DELAY = 0.0005
+    _MAX_RETRY_DELAY = 0.01
+
+    def __init__(self, path: str = RATE_LIMIT_FILE, slots: int = RATE_LIMIT_FILE_SLOTS):
+        self.path = path
+        self.buckets = max(1, slots // self._BUCKET_SLOTS)
+        self._bucket_size = self._SLOT.size * self._BUCKET_SLOTS
+        size = self.buckets * self._bucket_size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size != size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        self._lock = threading.Lock()  # Byte-range locks are per process, threads need their own
+
+    def _lock_bucket(self, offset: int) -> bool:
+        try:
+            if fcntl is not None:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB, self._bucket_size, offset)
+            else:
+                os.lseek(self._fd, offset, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_NBLCK, self._bucket_size)
+        except OSError:
+            return False  # Held by another worker
+        return True
+
+    def _unlock_bucket(self, offset: int) -> None:
+        if fcntl is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, self._bucket_size, offset)
+        else:
+            os.lseek(self._fd, offset, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, self._bucket_size)
+
+    def _try_acquire(self, key_hash: int, offset: int, count: int, period: float) -> Optional[float]:
+        # Returns the seconds to wait before retrying (0 if allowed), or None when the bucket is busy
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            if not self._lock_bucket(offset):
+                return None
+            try:
+                slot, tat, oldest_tat = None, None, math.inf
+                for position in range(offset, offset + self._bucket_size, self._SLOT.size):
+                    slot_hash, slot_tat = self._SLOT.unpack_from(self._map, position)
+                    if slot_hash == key_hash:
+                        slot, tat = position, slot_tat
+                        break
+                    if slot_hash == 0:
+                        slot, tat = position, None  # Slots are filled in order, so the key is not further
+                        break
+                    if slot_tat < oldest_tat:
+                        slot, oldest_tat = position, slot_tat  # Reused if the bucket is full; its state does not apply
+                new_tat, retry_after = gcra(tat, time.time(), count, period)
+                if new_tat is not None:
+                    self._SLOT.pack_into(self._map, slot, key_hash, new_tat)
+                return retry_after
+            finally:
+                self._unlock_bucket(offset)
+        finally:
+            self._lock.release()
+
+    async def acquire(self, key: str, count: int, period: float) -> float:
+        key_hash = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+        offset = (key_hash % self.buckets) * self._bucket_size
+        delay = self._RETRY_DELAY
+        while True:
+            retry_after = self._try_acquire(key_hash, offset, count, period)
+            if retry_after is not None:
+                return retry_after
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self._MAX_RETRY_DELAY)
+
+    async def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+class RedisBackend:
+    """Limiter state in Redis (or any server speaking its protocol), shared by every worker and host.
+
+    Each key is updated with an optimistic WATCH/MULTI/EXEC transaction and expires once its
+    burst is full again. `client` is a `redis.asyncio` client, created from `url` when not given.
+    """
+
+    def __init__(self, url: str = RATE_LIMIT_REDIS_URL, client: Optional[Any] = None,
+                 watch_error: Optional[type] = None, prefix: str = "ratelimit:"):
+        if client is None or watch_error is None:
+            import redis.asyncio
+            from redis.exceptions import WatchError
+            client = client or redis.asyncio.from_url(url)
+            watch_error = watch_error or WatchError
+        self.client = client
+        self.watch_error = watch_error
+        self.prefix = prefix
+
+    async def acquire(self, key: str, count: int, period: float) -> float:
+        key = self.prefix + key
+        while True:
+            async with self.client.pipeline(transaction=True) as pipe:
+                try:
+                    await pipe.watch(key)
+                    stored = await pipe.get(key)
+                    now = time.time()
+                    new_tat, retry_after = gcra(float(stored) if stored else None, now, count, period)
+                    if new_tat is None:
+                        await pipe.unwatch()
+                        return retry_after
+                    pipe.multi()
+                    pipe.set(key, repr(new_tat), px=max(1, math.ceil((new_tat - now) * 1000)))
+                    await pipe.execute()
+                    return 0.0
+                except self.watch_error:
+                    continue  # Another worker updated the key in between
+
+    async def close(self) -> None:
+        close = getattr(self.client, "aclose", None) or self.client.close
+        await close()
+
+def create_backend(name: str = RATE_LIMIT_BACKEND):
+    if name == "memory":
+        return MemoryBackend()
+    if name == "file":
+        return FileBackend()
+    if name == "redis":
+        return RedisBackend()
+    raise ValueError(f"Unknown rate limit backend: {name!r}")
+
+def get_request_key(request: Request) -> str:
+    """Identifies the client of a request: its user when it sends a valid token, its IP address otherwise."""
+    authorization = request.headers.get("authorization", "")
+    if authorization[:7].lower() == "bearer ":
+        from app.api.auth.auth import auth_handler
+        try:
+            user = auth_handler.decode_token(authorization[7:].strip())
+        except HTTPException:
+            user = None
+        if isinstance(user, dict) and user.get("id") is not None:
+            return f"user:{user['id']}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+class Limiter:
+    """Rate limiter applied to routes with the `limit` decorator.
+
+    Limits are kept per route and per client (see `get_request_key`), with GCRA state in the
+    backend selected by `RATE_LIMIT_BACKEND`. Routes get the limit named after them in
+    `RATE_LIMITS` (e.g. "list_items=100/minute;create_item=10/minute"), else the one given to
+    the decorator, else `default_rate` (`RATE_LIMIT_DEFAULT`).
+    """
+
+    def __init__(self, key_func: Callable[[Request], str] = get_request_key, backend: Optional[Any] = None,
+                 route_limits: Optional[Dict[str, str]] = None, enabled: bool = RATE_LIMIT_ENABLED,
+                 default_rate: str = RATE_LIMIT_DEFAULT):
+        parse_rate(default_rate)
+        self.key_func = key_func
+        self.route_limits = parse_route_limits(RATE_LIMITS) if route_limits is None else route_limits
+        self.default_rate = default_rate
+        self.enabled = enabled
+        self._backend = backend
+
+    @property
+    def backend(self):
+        # Created on first use, so importing the app never touches the limiter file or Redis
+        if self._backend is None:
+            self._backend = create_backend()
+        return self._backend
+
+    @backend.setter
+    def backend(self, backend) -> None:
+        self._backend = backend
+
+    async def hit(self, request: Request, scope: str, rate: str, count: int, period: float) -> None:
+        """Counts a request against the `count` per `period` limit of `scope`.
+
+        Raises:
+        - RateLimitExceeded: If the client went over the limit.
+        """
+        key = f"{scope}:{self.key_func(request)}"
+        start = time.perf_counter()
+        retry_after = await self.backend.acquire(key, count, period)
+        record_timing("ratelimit", time.perf_counter() - start)
+        if retry_after > 0:
+            RATE_LIMIT_REJECTIONS.inc(scope)
+            raise RateLimitExceeded(rate, retry_after)
+
+    def limit(self, rate: Optional[str] = None) -> Callable:
+        """Limits an async route, which must take a `request: Request` argument."""
+        def decorator(function: Callable) -> Callable:
+            scope = function.__name__
+            route_rate = self.route_limits.get(scope, rate or self.default_rate)
+            count, period = parse_rate(route_rate)
+
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                request = kwargs.get("request")
+                if self.enabled and request is not None:
+                    await self.hit(request, scope, route_rate, count, period)
+                return await function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    async def close(self) -> None:
+        if self._backend is not None:
+            await self._backend.close()
+            self._backend = None
+
+limiter = Limiter()
@@ -0,0 +1,134 @@
+import copy
+import json
+import logging
+import queue
+import random
+import zlib
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, List, Optional
+
+from app.api.config.env import LOG_FILE, LOG_LEVEL, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_QUEUE_SIZE, LOG_INFO_SAMPLE_RATE
+
+# ID of the request being served, set by the access log middleware and added to every record
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed through `extra` and is emitted as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+class JSONFormatter(logging.Formatter):
+    """Formats records as single-line JSON objects.
+
+    Every line has the time, level, logger and message, the ID of the request being served
+    (when there is one) and the fields passed through `extra`, e.g. `latency_ms`.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class SamplingFilter(logging.Filter):
+    """Keeps only a fraction of the INFO and DEBUG records; warnings and errors always pass.
+
+    Records of a request are kept or dropped together, by hashing its ID, so a sampled
+    request can still be followed from start to end.
+    """
+
+    def __init__(self, rate: float = LOG_INFO_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO or self.rate >= 1:
+            return True
+        current_request_id = request_id.get()
+        if current_request_id:
+            return zlib.crc32(current_request_id.encode()) % 10000 < self.rate * 10000
+        return random.random() < self.rate
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Puts records on a bounded queue for a background thread to format and write.
+
+    The calling thread (often the event loop) only tags the record with the request ID and
+    merges its arguments; when the queue is full the record is dropped instead of waiting.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.request_id = request_id.get()
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Tracebacks hold frames that must not cross threads, so they are rendered here
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+
+def setup_logging(force: bool = False) -> None:
+    """Routes the root logger through a queue to a size-rotated JSON lines file and stderr.
+
+    Like `logging.basicConfig`, does nothing when the root logger already has handlers
+    (e.g. under pytest), unless `force` is given.
+    """
+    global _listener, _queue_handler
+    root = logging.getLogger()
+    if root.handlers and not force:
+        return
+    shutdown_logging()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+
+    formatter = JSONFormatter()
+    handlers: List[logging.Handler] = [logging.StreamHandler()]
+    if LOG_FILE:
+        handlers.append(RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    _queue_handler.addFilter(SamplingFilter())
+    root.addHandler(_queue_handler)
+    root.setLevel(LOG_LEVEL)
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+def shutdown_logging() -> None:
+    """Writes out the queued records and stops the background writer."""
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
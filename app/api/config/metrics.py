@@ -0,0 +1,280 @@
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.api.config.env import METRICS_ENABLED, METRICS_DIR, METRICS_FLUSH_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the latency histogram buckets: from 100 µs (cached reads, limiter checks) to 10 s
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Durations spent by the current request in each component (storage, auth, ratelimit), for its Server-Timing header
+server_timing: ContextVar[Optional[Dict[str, float]]] = ContextVar("server_timing", default=None)
+
+def record_timing(name: str, seconds: float) -> None:
+    """Adds a duration to the Server-Timing entry `name` of the current request, if any."""
+    timings = server_timing.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+class Metric:
+    """Base of the metric types: values are kept per label values and per thread.
+
+    Each thread only ever writes to its own shard, so recording takes no lock (the event loop and
+    every threadpool thread have one shard each); `collect` adds the shards up when scraped.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        self._shards: List[Dict[Tuple[str, ...], List[float]]] = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> Dict[Tuple[str, ...], List[float]]:
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            with self._shards_lock:
+                self._shards.append(values)
+            return values
+
+    def collect(self) -> Dict[Tuple[str, ...], List[float]]:
+        """Returns the values of every label set, added up across threads."""
+        with self._shards_lock:
+            shards = list(self._shards)
+        totals: Dict[Tuple[str, ...], List[float]] = {}
+        for shard in shards:
+            for label_values, row in shard.copy().items():
+                total = totals.get(label_values)
+                if total is None:
+                    totals[label_values] = list(row)
+                else:
+                    for index, value in enumerate(row):
+                        total[index] += value
+        return totals
+
+    def clear(self) -> None:
+        with self._shards_lock:
+            for shard in self._shards:
+                shard.clear()
+
+class Counter(Metric):
+    """Monotonic count, e.g. of rejected requests."""
+
+    type = "counter"
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        if not METRICS_ENABLED:
+            return
+        shard = self._shard()
+        row = shard.get(label_values)
+        if row is None:
+            row = shard[label_values] = [0.0]
+        row[0] += amount
+
+class Gauge(Counter):
+    """Value that goes up and down, e.g. requests in flight."""
+
+    type = "gauge"
+
+    def dec(self, *label_values: str, amount: float = 1) -> None:
+        self.inc(*label_values, amount=-amount)
+
+class Histogram(Metric):
+    """Distribution of durations in seconds, with the count and the sum of the observations."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *label_values: str) -> None:
+        # Row layout: one (non-cumulative) count per bucket, then the +Inf bucket, the sum and the count
+        if not METRICS_ENABLED:
+            return
+        shard = self._shard()
+        row = shard.get(label_values)
+        if row is None:
+            row = shard[label_values] = [0.0] * (len(self.buckets) + 3)
+        row[bisect_left(self.buckets, value)] += 1
+        row[-2] += value
+        row[-1] += 1
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: Tuple[str, ...], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if value == int(value) else repr(value)
+
+class MetricsRegistry:
+    """Set of metrics exposed together in the Prometheus text format.
+
+    Every worker process aggregates its own metrics. With `METRICS_DIR`, each worker also writes
+    its values to `<METRICS_DIR>/metrics-<pid>.json` every `METRICS_FLUSH_INTERVAL` seconds, and
+    `render` adds up the files of every worker, so any of them can be scraped for the whole host.
+    Gauges only count the workers that are still running; clear the directory on deploys.
+    """
+
+    def __init__(self, directory: str = METRICS_DIR, flush_interval: float = METRICS_FLUSH_INTERVAL):
+        self.metrics: Dict[str, Metric] = {}
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._flusher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Iterable[str] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def snapshot(self) -> Dict[str, Dict[Tuple[str, ...], List[float]]]:
+        return {name: metric.collect() for name, metric in self.metrics.items()}
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(self.directory, f"metrics-{pid}.json")
+
+    def flush(self) -> None:
+        """Writes the values of this worker to its file in `directory`."""
+        data = {name: [[list(label_values), row] for label_values, row in values.items()] for name, values in self.snapshot().items()}
+        path = self._path(os.getpid())
+        with open(f"{path}.tmp", "w") as file:
+            json.dump(data, file)
+        os.replace(f"{path}.tmp", path)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError as e:
+                logger.error("Error writing the metrics to %s: %s", self.directory, e)
+
+    def start(self) -> None:
+        """Starts writing the values of this worker to `directory`, if one is set."""
+        if not self.directory or self._flusher is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._stop.clear()
+        self._flusher = threading.Thread(target=self._run, name="metrics-flush", daemon=True)
+        self._flusher.start()
+
+    def stop(self) -> None:
+        if self._flusher is None:
+            return
+        self._stop.set()
+        self._flusher.join()
+        self._flusher = None
+        try:
+            self.flush()
+        except OSError as e:
+            logger.error("Error writing the metrics to %s: %s", self.directory, e)
+
+    def _merged(self) -> Dict[str, Dict[Tuple[str, ...], List[float]]]:
+        merged = self.snapshot()
+        if not self.directory:
+            return merged
+        for path in glob.glob(os.path.join(self.directory, "metrics-*.json")):
+            try:
+                pid = int(os.path.basename(path)[8:-5])
+            except ValueError:
+                continue
+            if pid == os.getpid():
+                continue
+            try:
+                with open(path) as file:
+                    data = json.load(file)
+            except (OSError, ValueError):
+                continue
+            try:
+                os.kill(pid, 0)
+                alive = True
+            except ProcessLookupError:
+                alive = False
+            except OSError:
+                alive = True  # Exists, but belongs to another user
+            for name, rows in data.items():
+                metric = self.metrics.get(name)
+                if metric is None or (metric.type == "gauge" and not alive):
+                    continue
+                values = merged.setdefault(name, {})
+                for label_values, row in rows:
+                    total = values.setdefault(tuple(label_values), [0.0] * len(row))
+                    for index, value in enumerate(row):
+                        total[index] += value
+        return merged
+
+    def render(self) -> str:
+        """Returns every metric in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for name, values in self._merged().items():
+            metric = self.metrics[name]
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            for label_values, row in sorted(values.items()):
+                if metric.type != "histogram":
+                    lines.append(f"{name}{_format_labels(metric.labels, label_values)} {_format_value(row[0])}")
+                    continue
+                cumulative = 0.0
+                for bound, count in zip(metric.buckets + (float("inf"),), row):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{_format_labels(metric.labels + ('le',), label_values + (le,))} {_format_value(cumulative)}")
+                lines.append(f"{name}_sum{_format_labels(metric.labels, label_values)} {repr(row[-2])}")
+                lines.append(f"{name}_count{_format_labels(metric.labels, label_values)} {_format_value(row[-1])}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        for metric in self.metrics.values():
+            metric.clear()
+
+registry = MetricsRegistry()
+
+REQUEST_DURATION = registry.histogram("http_request_duration_seconds", "Latency of the HTTP requests, until the response is sent.",
+                                      ("method", "route", "status"))
+REQUESTS_IN_PROGRESS = registry.gauge("http_requests_in_progress", "HTTP requests being served.")
+STORAGE_DURATION = registry.histogram("storage_operation_duration_seconds",
+                                      "Duration of the file operations of the item store (read, write, append, commit, fsync).",
+                                      ("operation",))
+RATE_LIMIT_REJECTIONS = registry.counter("rate_limit_rejections_total", "Requests rejected by the rate limiter.", ("route",))
+CHANGE_SUBSCRIBERS = registry.gauge("change_feed_subscribers", "Clients listening to the change feed.")
+CHANGE_EVENTS = registry.counter("change_feed_events_total", "Events published on the change feed.", ("op",))
+CHANGE_DROPPED = registry.counter("change_feed_dropped_total", "Change feed clients disconnected for being too slow.")
+CONCURRENCY_LIMIT = registry.gauge("concurrency_limit", "Adaptive concurrency limit of each route, and of the workers ('*').", ("route",))
+CONCURRENCY_QUEUED = registry.gauge("concurrency_queued_requests", "Requests waiting for the concurrency limit.")
+CONCURRENCY_SHED = registry.counter("concurrency_shed_total", "Requests answered with a 503 by the concurrency limiter.", ("route", "reason"))
+AUTH_DECODE_DURATION = registry.histogram("auth_token_decode_seconds", "Time spent decoding bearer tokens.", ("result",))
+
+def observe_storage(operation: str, start: float, request: bool = True) -> None:
+    """Records a storage operation that began at `start` (a `time.perf_counter` value).
+
+    With `request`, the duration also counts towards the `storage` Server-Timing entry of the
+    current request; nested operations (an fsync inside a write) pass False to not count twice.
+    """
+    elapsed = time.perf_counter() - start
+    STORAGE_DURATION.observe(elapsed, operation)
+    if request:
+        record_timing("storage", elapsed)
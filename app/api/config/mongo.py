@@ -0,0 +1,171 @@
+import re
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+
+from app.api.config.db import FILTER_FIELDS, TEXT_FIELDS, StorageBackend, decode_cursor, encode_cursor
+from app.api.config.indexes import tokenize
+from app.api.config.env import MONGO_URI, MONGO_DB, MONGO_COLLECTION, MONGO_MAX_POOL_SIZE
+from app.api.methods.methods import is_valid_objectid, convert_objectid_to_str
+
+class MongoBackend(StorageBackend):
+    """Storage backend over a MongoDB collection, through the asynchronous motor driver.
+
+    The client, and with it the connection pool, is created by `connect` (called from the
+    `on_startup` event) and closed by `close` (called from `on_shutdown`). A collection can be
+    given instead, e.g. an in-process fake in tests, in which case no client is created.
+    """
+
+    def __init__(self, uri: str = MONGO_URI, database: str = MONGO_DB, collection_name: str = MONGO_COLLECTION,
+                 max_pool_size: int = MONGO_MAX_POOL_SIZE, collection: Optional[Any] = None):
+        super().__init__()
+        self.uri = uri
+        self.database = database
+        self.collection_name = collection_name
+        self.max_pool_size = max_pool_size
+        self.client = None
+        self.collection = collection
+
+    async def connect(self) -> None:
+        if self.collection is None:
+            from motor.motor_asyncio import AsyncIOMotorClient
+            self.client = AsyncIOMotorClient(self.uri, maxPoolSize=self.max_pool_size)
+            self.collection = self.client[self.database][self.collection_name]
+        # Filtered pages are served by (field, _id) indexes
+        for field in FILTER_FIELDS:
+            await self.collection.create_index([(field, 1), ("_id", 1)])
+        # Searches use a single text index over every text-indexed field
+        if TEXT_FIELDS:
+            await self.collection.create_index([(field, "text") for field in TEXT_FIELDS])
+
+    async def close(self) -> None:
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+            self.collection = None
+
+    async def get_items(self) -> List[Dict[str, Any]]:
+        return [convert_objectid_to_str(document) async for document in self.collection.find()]
+
+    async def find_item(self, item_id: str) -> Dict[str, Any]:
+        if not is_valid_objectid(item_id):
+            return {}
+        document = await self.collection.find_one({"_id": ObjectId(item_id)})
+        return convert_objectid_to_str(document) if document else {}
+
+    async def list_items(self, limit: int, cursor: Optional[str] = None, filters: Optional[Dict[str, Tuple[str, str]]] = None,
+                         fields: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        query = {}
+        for field, (operator, value) in (filters or {}).items():
+            query[field] = value if operator == "eq" else {"$regex": f"^{re.escape(value)}"}
+        return await self._find_page(query, limit, cursor, fields)
+
+    async def search_items(self, limit: int, cursor: Optional[str] = None, text: Optional[str] = None,
+                           criteria: Optional[List[Tuple[str, str, str]]] = None,
+                           fields: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        operators = {"eq": "$eq", "gte": "$gte", "lte": "$lte"}
+        query: Dict[str, Any] = {}
+        for field, operator, value in criteria or []:
+            condition = query.setdefault(field, {})
+            if operator == "prefix":
+                condition["$regex"] = f"^{re.escape(value)}"
+            else:
+                condition[operators[operator]] = value
+        tokens = tokenize(text) if text else set()
+        if tokens:
+            # Quoted words are all required by $text
+            query["$text"] = {"$search": " ".join(f'"{token}"' for token in sorted(tokens))}
+        return await self._find_page(query, limit, cursor, fields, cursor_prefix=("search",))
+
+    async def _find_page(self, query: Dict[str, Any], limit: int, cursor: Optional[str], fields: Optional[List[str]],
+                         cursor_prefix: Tuple[str, ...] = ()) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        if cursor:
+            last_id = decode_cursor(cursor)[-1]
+            if not is_valid_objectid(last_id):
+                raise ValueError("Invalid cursor.")
+            query["_id"] = {"$gt": ObjectId(last_id)}
+        projection = None if fields is None else {field: 1 for field in fields}
+        documents = self.collection.find(query, projection).sort("_id", 1).limit(limit + 1)
+        page = [convert_objectid_to_str(document) async for document in documents]
+        if len(page) > limit:
+            return page[:limit], encode_cursor((*cursor_prefix, page[limit - 1]["id"]))
+        return page, None
+
+    async def iter_items(self, batch_size: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+        async for document in self.collection.find({}, batch_size=batch_size):
+            yield convert_objectid_to_str(document)
+
+    async def add_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        document = {key: value for key, value in item.items() if key != "id"}
+        if is_valid_objectid(item.get("id")):
+            document["_id"] = ObjectId(item["id"])
+        result = await self.collection.insert_one(document)
+        added_item = convert_objectid_to_str({**document, "_id": result.inserted_id})
+        self._notify([added_item["id"]], [{"op": "create", "id": added_item["id"], "item": added_item}])
+        return added_item
+
+    async def update_item(self, item_id: str, item_update: Dict[str, Any]) -> Dict[str, Any]:
+        if not is_valid_objectid(item_id):
+            return {}
+        item_update = {key: value for key, value in item_update.items() if key != "id"}
+        document = await self.collection.find_one_and_update(
+            {"_id": ObjectId(item_id)}, {"$set": item_update}, return_document=ReturnDocument.AFTER)
+        if not document:
+            return {}
+        updated_item = convert_objectid_to_str(document)
+        self._notify([item_id], [{"op": "update", "id": item_id, "item": updated_item}])
+        return updated_item
+
+    async def delete_item(self, item_id: str) -> Dict[str, Any]:
+        if not is_valid_objectid(item_id):
+            return {}
+        document = await self.collection.find_one_and_delete({"_id": ObjectId(item_id)})
+        if not document:
+            return {}
+        self._notify([item_id], [{"op": "delete", "id": item_id}])
+        return convert_objectid_to_str(document)
+
+    async def add_items(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        documents = []
+        for item in items:
+            document = {key: value for key, value in item.items() if key != "id"}
+            if is_valid_objectid(item.get("id")):
+                document["_id"] = ObjectId(item["id"])
+            documents.append(document)
+        if not documents:
+            return []
+        result = await self.collection.insert_many(documents)
+        added_items = [convert_objectid_to_str({**document, "_id": inserted_id})
+                       for document, inserted_id in zip(documents, result.inserted_ids)]
+        self._notify([item["id"] for item in added_items], [{"op": "create", "id": item["id"], "item": item} for item in added_items])
+        return added_items
+
+    async def update_items(self, updates: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        requests = [UpdateOne({"_id": ObjectId(item_id)}, {"$set": {key: value for key, value in item_update.items() if key != "id"}})
+                    for item_id, item_update in updates if is_valid_objectid(item_id)]
+        if not requests:
+            return [{} for _ in updates]
+        await self.collection.bulk_write(requests)
+        found = await self._find_by_ids([item_id for item_id, _ in updates])
+        self._notify(list(found), [{"op": "update", "id": item_id, "item": item} for item_id, item in found.items()])
+        return [found.get(item_id, {}) for item_id, _ in updates]
+
+    async def delete_items(self, item_ids: List[str]) -> List[Dict[str, Any]]:
+        found = await self._find_by_ids(item_ids)
+        if found:
+            await self.collection.delete_many({"_id": {"$in": [ObjectId(item_id) for item_id in found]}})
+            self._notify(list(found), [{"op": "delete", "id": item_id} for item_id in found])
+        deleted_items = []
+        for item_id in item_ids:
+            deleted_items.append(found.pop(item_id, {}))
+        return deleted_items
+
+    async def _find_by_ids(self, item_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        object_ids = [ObjectId(item_id) for item_id in set(item_ids) if is_valid_objectid(item_id)]
+        if not object_ids:
+            return {}
+        found = {}
+        async for document in self.collection.find({"_id": {"$in": object_ids}}):
+            item = convert_objectid_to_str(document)
+            found[item["id"]] = item
+        return found
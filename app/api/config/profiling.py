@@ -0,0 +1,226 @@
+import concurrent.futures.thread
+import contextvars
+import logging
+import os
+import random
+import re
+import sys
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from app.api.config.env import PROFILE_DIR, PROFILE_INTERVAL_MS, PROFILE_LATENCY_THRESHOLD_MS, PROFILE_MAX_DEPTH, PROFILE_SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+# Code of the method that runs every job of a ThreadPoolExecutor: the job of a request is `Context.run`
+# of a copy of the request context (see `run_in_threadpool` and `BoundedExecutor`)
+_WORK_ITEM_CODE = concurrent.futures.thread._WorkItem.run.__code__
+
+# The profile of the current request, read by the sampler through the context of the threadpool jobs
+current_profile: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar("current_profile", default=None)
+
+def frame_label(frame: Any) -> str:
+    """Names a frame in a collapsed stack, as module:function."""
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+def route_filename(route: str) -> str:
+    """Turns a route into a file name, e.g. 'GET /api/v1/x/items/{item_id}/' into 'GET_api_v1_x_items_item_id'."""
+    return re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+
+class RequestProfile:
+    """Stack samples taken while one request was being served."""
+
+    __slots__ = ("frame", "sampled", "samples")
+
+    def __init__(self, frame: Any, sampled: bool):
+        self.frame = frame  # Frame of the middleware call serving the request, on the event loop
+        self.sampled = sampled  # Picked by the sample rate; otherwise only kept when slower than the threshold
+        self.samples: Counter = Counter()
+
+class Profiler:
+    """Sampling profiler of requests, switched on and off at runtime.
+
+    While it runs, a background thread takes the stack of every thread each `interval_ms`
+    milliseconds, like py-spy does from the outside. A sample counts for a request when the
+    stack goes through the middleware call of that request (code running on the event loop) or
+    through a threadpool job started by it (storage I/O, bcrypt). A request that is not running
+    anywhere in a sample gets a "(waiting)" sample instead, e.g. while it waits for the network.
+
+    Requests are profiled when picked with probability `sample_rate`, or when they take longer
+    than `latency_threshold_ms` (when it is above 0). Their samples are added up per route as
+    collapsed stacks ("frame;frame;frame count" lines, the input of flamegraph.pl and speedscope),
+    written to `<directory>/<route>.<pid>.collapsed` by `flush`.
+
+    The overhead is nil while stopped. While running it is a dictionary insert per request
+    plus the sampling thread, which holds the GIL for some microseconds per sample.
+    """
+
+    def __init__(self, directory: str = PROFILE_DIR, sample_rate: float = PROFILE_SAMPLE_RATE,
+                 latency_threshold_ms: float = PROFILE_LATENCY_THRESHOLD_MS, interval_ms: float = PROFILE_INTERVAL_MS,
+                 max_depth: int = PROFILE_MAX_DEPTH):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.latency_threshold_ms = latency_threshold_ms
+        self.interval_ms = interval_ms
+        self.max_depth = max_depth
+        self.requests = 0  # Requests profiled since the profiler started
+        self.samples = 0  # Samples taken since the profiler started
+        self.stacks: Dict[str, Counter] = {}  # Collapsed stacks of the profiled requests, per route
+        self._active: Dict[Any, RequestProfile] = {}  # In-flight requests, by the frame of their middleware call
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "sample_rate": self.sample_rate,
+            "latency_threshold_ms": self.latency_threshold_ms,
+            "interval_ms": self.interval_ms,
+            "directory": self.directory,
+            "requests": self.requests,
+            "samples": self.samples,
+            "routes": {route: sum(stacks.values()) for route, stacks in sorted(self.stacks.items())},
+        }
+
+    def start(self, sample_rate: Optional[float] = None, latency_threshold_ms: Optional[float] = None,
+              interval_ms: Optional[float] = None) -> None:
+        """Starts profiling, optionally with new settings. Samples of a previous run are kept."""
+        with self._lock:
+            if sample_rate is not None:
+                self.sample_rate = sample_rate
+            if latency_threshold_ms is not None:
+                self.latency_threshold_ms = latency_threshold_ms
+            if interval_ms is not None:
+                self.interval_ms = interval_ms
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self._thread.start()
+        logger.warning("Profiling started: sample rate %s, latency threshold %s ms", self.sample_rate, self.latency_threshold_ms)
+
+    def stop(self) -> None:
+        """Stops profiling and writes the stacks collected so far."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join()
+        with self._lock:
+            self._active.clear()
+        self.flush()
+        logger.warning("Profiling stopped after %s requests", self.requests)
+
+    def toggle(self) -> None:
+        """Starts profiling if stopped and stops it otherwise, e.g. from a signal handler."""
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+
+    def clear(self) -> None:
+        with self._lock:
+            self.stacks = {}
+            self.requests = 0
+            self.samples = 0
+
+    def begin(self, frame: Any) -> Optional[RequestProfile]:
+        """Called when a request starts. Returns its profile, or None when it is not profiled."""
+        if self._thread is None:
+            return None
+        sampled = random.random() < self.sample_rate
+        if not sampled and self.latency_threshold_ms <= 0:
+            return None
+        profile = RequestProfile(frame, sampled)
+        self._active[frame] = profile
+        return profile
+
+    def end(self, profile: RequestProfile, route: str, elapsed: float) -> None:
+        """Called when a profiled request to `route` completes, after `elapsed` seconds."""
+        with self._lock:
+            self._active.pop(profile.frame, None)
+            keep = profile.sampled or (0 < self.latency_threshold_ms <= elapsed * 1000)
+            if keep and profile.samples:
+                self.requests += 1
+                stacks = self.stacks.setdefault(route, Counter())
+                stacks.update(profile.samples)
+        profile.frame = None
+
+    def _stack(self, frame: Any, stop_at: Any = None) -> List[str]:
+        labels = []
+        while frame is not None and frame is not stop_at:
+            labels.append(frame_label(frame))
+            frame = frame.f_back
+        labels.reverse()
+        return labels[-self.max_depth:]
+
+    def sample(self) -> None:
+        """Takes one sample of every thread and adds it to the requests it belongs to."""
+        own_thread = threading.get_ident()
+        with self._lock:
+            if not self._active:
+                return
+            seen = set()
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                current = frame
+                while current is not None:
+                    profile = self._active.get(current)
+                    if profile is None and current.f_code is _WORK_ITEM_CODE:
+                        # A threadpool job: find the request in the context it runs in
+                        run = getattr(current.f_locals.get("self"), "fn", None)
+                        context = getattr(run, "__self__", None)
+                        if isinstance(context, contextvars.Context):
+                            profile = context.get(current_profile)
+                        if profile is not None:
+                            profile.samples[";".join(["(thread)"] + self._stack(frame, current))] += 1
+                            seen.add(id(profile))
+                            break
+                    if profile is not None:
+                        # Only the frames below the middleware: the rest is the same server loop for every request
+                        profile.samples[";".join(self._stack(frame, current))] += 1
+                        seen.add(id(profile))
+                        break
+                    current = current.f_back
+            for profile in list(self._active.values()):
+                if id(profile) not in seen:
+                    profile.samples["(waiting)"] += 1
+            self.samples += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_ms / 1000):
+            try:
+                self.sample()
+            except Exception as e:  # The profiler must never take the app down
+                logger.error("Error sampling the stacks: %s", e)
+
+    def collapsed(self, route: Optional[str] = None) -> str:
+        """Returns the collapsed stacks of one route, or of every route under a root frame named after it."""
+        with self._lock:
+            if route is not None:
+                return "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.get(route, {}).items()))
+            return "".join(f"{name};{stack} {count}\n" for name, stacks in sorted(self.stacks.items())
+                           for stack, count in sorted(stacks.items()))
+
+    def flush(self) -> List[str]:
+        """Writes the collapsed stacks of every route to `directory` and returns the paths written."""
+        if not self.directory:
+            return []
+        os.makedirs(self.directory, exist_ok=True)
+        paths = []
+        for route in list(self.stacks):
+            path = os.path.join(self.directory, f"{route_filename(route)}.{os.getpid()}.collapsed")
+            with open(path, "w") as file:
+                file.write(self.collapsed(route))
+            paths.append(path)
+        return paths
+
+profiler = Profiler()
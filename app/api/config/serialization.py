@@ -0,0 +1,63 @@
+import json
+from typing import Any, Type
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from app.api.config.env import JSON_FAST
+
+try:
+    import orjson
+except ImportError:  # Optional: the standard library is used instead
+    orjson = None
+
+# Whether responses skip the revalidation of stored items and JSON goes through orjson when installed
+FAST_JSON = JSON_FAST
+
+def dumps(content: Any) -> bytes:
+    """Encodes content as compact UTF-8 JSON, with orjson when it is installed.
+
+    The output never contains newlines, so it is safe for JSON lines files.
+    """
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+def loads(data: Any) -> Any:
+    """Decodes JSON from bytes or str. Errors are ValueErrors with either library."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded with `dumps`, i.e. with orjson when it is installed.
+
+    Used as the default response class of the app, and by the routes to return stored items
+    directly when `FAST_JSON` is on.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def revalidate(model: Type[BaseModel], content: Any, **options: Any) -> Any:
+    """Validates stored content against a response model and returns it as a dict.
+
+    Items that come out of the storage backend were validated when they were written through
+    the API, and the JSON stores check those they load from their files (which can be edited
+    by hand), so with FAST_JSON this is skipped and the content is returned as it is. Items of
+    a database (SQLite, MongoDB) changed by other means are only checked with FAST_JSON off.
+    """
+    if FAST_JSON:
+        return content
+    return model(**content).dict(**options)
+
+def respond(content: Any, status_code: int = 200) -> Any:
+    """Returns stored content from a route.
+
+    With FAST_JSON the content is sent as it is in a FastJSONResponse, which skips the
+    `response_model` validation and `jsonable_encoder`; otherwise it is returned for FastAPI
+    to validate and encode.
+    """
+    if FAST_JSON:
+        return FastJSONResponse(content, status_code=status_code)
+    return content
@@ -0,0 +1,325 @@
+"""Hash-sharded JSON storage backend, and the tool that changes its number of shards.
+
+Run the tool from the repository root, with the API stopped:
+
+    python -m app.api.config.shards --shards 16 [--import-file data.json]
+"""
+import argparse
+import heapq
+import os
+import threading
+import time
+import zlib
+from itertools import chain, islice
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.api.config.db import (FILTER_FIELDS, HASH_FIELDS, FileLock, ItemStore, JSONBackend, encode_cursor, format_id,
+                               project, read_data, write_data)
+from app.api.config.env import (DATA_FILE, DATA_RELOAD_INTERVAL, DATA_PERSISTENCE, WAL_COMPACT_THRESHOLD, DATA_SHARDS,
+                                DATA_SHARD_DIR, DATA_ID_BLOCK_SIZE)
+from app.api.config.indexes import index_value, tokenize
+
+MANIFEST_FILE = "shards.json"
+COUNTER_FILE = "ids.json"
+
+def shard_index(item_id: str, shards: int) -> int:
+    """Returns the shard of an item: a stable hash of its id (the same in every process), modulo the number of shards."""
+    return zlib.crc32(str(item_id).encode()) % shards
+
+def shard_path(directory: str, index: int, shards: int) -> str:
+    # The number of shards is part of the name, so a rebalance to another number never overwrites the files it reads
+    return os.path.join(directory, f"shard-{index:03d}-of-{shards:03d}.json")
+
+def sort_key(index_name: str) -> Callable[[Dict[str, Any]], Tuple[str, ...]]:
+    """Returns the key of an item in the index that orders a page (see `ItemStore._scan_page`), without the index name."""
+    if index_name in ("id", "search"):
+        return lambda item: (index_value(item.get("id")),)
+    return lambda item: (index_value(item.get(index_name)), index_value(item.get("id")))
+
+def search_order(text: Optional[str], criteria: List[Tuple[str, str, str]]) -> str:
+    """Returns the index whose order `ItemStore.search_items` returns a search in ('search' meaning id order)."""
+    if (text and tokenize(text)) or any(operator == "eq" and field in HASH_FIELDS for field, operator, _ in criteria):
+        return "search"
+    return next((field for field, _, _ in criteria if field in FILTER_FIELDS), "id")
+
+def merge_pages(pages: List[Tuple[List[Dict[str, Any]], Optional[str]]], index_name: str, limit: int,
+                fields: Optional[List[str]]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Merges the pages that every shard returned for the same cursor into one page of `limit` items.
+
+    Each shard page is in index order and holds at most `limit` items, so the first `limit`
+    items of their merge are the next page of the whole collection. Its cursor is the key of
+    the last of them, which every shard resumes after.
+    """
+    key = sort_key(index_name)
+    merged = list(islice(heapq.merge(*(page for page, _ in pages), key=key), limit + 1))
+    more = len(merged) > limit or any(cursor is not None for _, cursor in pages)
+    page = merged[:limit]
+    cursor = encode_cursor((index_name, *key(page[-1]))) if more and page else None
+    return [project(item, fields) for item in page], cursor
+
+class IdAllocator:
+    """Allocates item ids from a counter file shared by every worker.
+
+    Ids are reserved from the file `block_size` at a time, under its lock, and handed out from
+    memory, so allocating one rarely touches the disk. Ids are unique across the shards and
+    never handed out again, but ids allocated by different workers do not follow the order in
+    which the items were created.
+    """
+
+    def __init__(self, path: str, block_size: int = DATA_ID_BLOCK_SIZE):
+        self.path = path
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(f"{path}.lock")
+        self._next = 0
+        self._end = 0  # Reserved block: [_next, _end)
+
+    def _reserve(self, count: int, last_id: int = 0) -> int:
+        # Called with the thread lock held: moves the counter past `last_id`, then reserves `count` ids and returns the first one
+        with self._file_lock:
+            counter = read_data(self.path).get("last_id", 0)
+            if count or counter < last_id:
+                write_data({"last_id": max(counter, last_id) + count}, self.path)
+        return max(counter, last_id) + 1
+
+    def allocate(self, count: int) -> List[str]:
+        with self._lock:
+            if self._end - self._next < count:
+                size = max(self.block_size, count)
+                self._next = self._reserve(size)
+                self._end = self._next + size
+            first, self._next = self._next, self._next + count
+        return [format_id(counter) for counter in range(first, first + count)]
+
+    def advance(self, last_id: int) -> None:
+        """Moves the counter past `last_id`, e.g. the largest id found in the shards."""
+        with self._lock:
+            self._reserve(0, last_id)
+
+    def close(self) -> None:
+        """Drops the ids left in the reserved block (they are skipped) and closes the lock file."""
+        with self._lock:
+            self._next = self._end = 0
+            self._file_lock.close()
+
+class ShardedStore:
+    """Item store partitioned across several `ItemStore` files by a hash of the item `id`.
+
+    Each shard has its own file, write-ahead log and locks, so writes to different shards run
+    in parallel, in the threads of a worker as in different workers, and each file only holds
+    a fraction of the items. Reads and writes of one item only touch its shard. Pages of the
+    listings and searches are the k-way merge of the same page of every shard, with the same
+    order and cursors as a single `ItemStore`. Bulk writes are split by shard, with one commit
+    per shard: a batch is atomic within a shard, not across shards.
+
+    The number of shards is recorded in a manifest in `directory`; the store refuses to load
+    files laid out for another number, which only the rebalancing tool of this module changes.
+    It exposes the same methods as `ItemStore`, so `JSONBackend` serves it.
+    """
+
+    def __init__(self, directory: str = DATA_SHARD_DIR, shards: int = DATA_SHARDS,
+                 reload_interval: float = DATA_RELOAD_INTERVAL, persistence: str = DATA_PERSISTENCE,
+                 compact_threshold: int = WAL_COMPACT_THRESHOLD, id_block_size: int = DATA_ID_BLOCK_SIZE):
+        if shards < 1:
+            raise ValueError("The number of shards must be at least 1.")
+        self.directory = directory
+        self.shards = [ItemStore(shard_path(directory, index, shards), reload_interval, persistence,
+                                 compact_threshold=compact_threshold) for index in range(shards)]
+        self.ids = IdAllocator(os.path.join(directory, COUNTER_FILE), id_block_size)
+
+    def _open(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        manifest_path = os.path.join(self.directory, MANIFEST_FILE)
+        shards = read_data(manifest_path).get("shards")
+        if shards is None:
+            write_data({"shards": len(self.shards)}, manifest_path)
+        elif shards != len(self.shards):
+            raise ValueError(f"{self.directory} holds {shards} shards, not {len(self.shards)}: "
+                             f"run `python -m app.api.config.shards --shards {len(self.shards)}` first.")
+
+    def _shard(self, item_id: str) -> ItemStore:
+        return self.shards[shard_index(item_id, len(self.shards))]
+
+    def load(self) -> None:
+        """(Re)loads every shard."""
+        self._open()
+        for shard in self.shards:
+            shard.load()
+        # The counter may be behind the items, e.g. after they were copied from a backup
+        self.ids.advance(max(shard._last_id for shard in self.shards))
+
+    def preload(self) -> None:
+        """Loads every shard before the server forks its workers, see `ItemStore.preload`."""
+        self.load()
+        for shard in self.shards:
+            shard.preload()
+        # A block reserved now would be handed out by every worker
+        self.ids.close()
+
+    @property
+    def preloaded(self) -> bool:
+        return all(shard.preloaded for shard in self.shards)
+
+    def resume(self) -> None:
+        for shard in self.shards:
+            shard.resume()
+
+    def close(self) -> None:
+        for shard in self.shards:
+            shard.close()
+        self.ids.close()
+
+    @property
+    def version(self) -> int:
+        # The version of every shard only grows, so their sum changes whenever one of them does
+        return sum(shard.version for shard in self.shards)
+
+    @property
+    def stale(self) -> bool:
+        return any(shard.stale for shard in self.shards)
+
+    def reload_if_changed(self) -> bool:
+        return any([shard.reload_if_changed() for shard in self.shards])
+
+    def subscribe(self, listener: Callable[[Optional[List[str]]], None]) -> None:
+        for shard in self.shards:
+            shard.subscribe(listener)
+
+    def subscribe_changes(self, listener: Callable[[List[Dict[str, Any]]], None]) -> None:
+        for shard in self.shards:
+            shard.subscribe_changes(listener)
+
+    def get_items(self) -> List[Dict[str, Any]]:
+        return list(chain.from_iterable(shard.get_items() for shard in self.shards))
+
+    def find_item(self, item_id: str) -> Dict[str, Any]:
+        return self._shard(item_id).find_item(item_id)
+
+    def list_items(self, limit: int, cursor: Optional[str] = None, filters: Optional[Dict[str, Tuple[str, str]]] = None,
+                   fields: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Returns one page of items in index order, see `ItemStore.list_items`."""
+        pages = [shard.list_items(limit, cursor, filters) for shard in self.shards]
+        return merge_pages(pages, next(iter(filters or {}), "id"), limit, fields)
+
+    def search_items(self, limit: int, cursor: Optional[str] = None, text: Optional[str] = None,
+                     criteria: Optional[List[Tuple[str, str, str]]] = None,
+                     fields: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Returns one page of the items that match a search, see `ItemStore.search_items`."""
+        pages = [shard.search_items(limit, cursor, text, criteria) for shard in self.shards]
+        return merge_pages(pages, search_order(text, criteria or []), limit, fields)
+
+    def add_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        if not item.get("id"):
+            item = {**item, "id": self.ids.allocate(1)[0]}
+        return self._shard(item["id"]).add_item(item)
+
+    def update_item(self, item_id: str, item_update: Dict[str, Any]) -> Dict[str, Any]:
+        return self._shard(item_id).update_item(item_id, item_update)
+
+    def delete_item(self, item_id: str) -> Dict[str, Any]:
+        return self._shard(item_id).delete_item(item_id)
+
+    def _split(self, entries: List[Any], item_id: Callable[[Any], str],
+               write: Callable[[ItemStore, List[Any]], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        # Writes the entries of each shard in one batch, and returns the results in the order of the entries
+        positions: Dict[int, List[int]] = {}
+        for position, entry in enumerate(entries):
+            positions.setdefault(shard_index(item_id(entry), len(self.shards)), []).append(position)
+        results: List[Dict[str, Any]] = [{}] * len(entries)
+        for index, shard_positions in positions.items():
+            for position, result in zip(shard_positions, write(self.shards[index], [entries[position] for position in shard_positions])):
+                results[position] = result
+        return results
+
+    def add_items(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Adds several items, with one commit per shard, allocating their ids, and returns them."""
+        ids = iter(self.ids.allocate(sum(1 for item in items if not item.get("id"))))
+        items = [item if item.get("id") else {**item, "id": next(ids)} for item in items]
+        return self._split(items, lambda item: item["id"], ItemStore.add_items)
+
+    def update_items(self, updates: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Updates several items, with one commit per shard, see `ItemStore.update_items`."""
+        return self._split(updates, lambda update: update[0], ItemStore.update_items)
+
+    def delete_items(self, item_ids: List[str]) -> List[Dict[str, Any]]:
+        """Deletes several items, with one commit per shard, see `ItemStore.delete_items`."""
+        return self._split(item_ids, lambda item_id: item_id, ItemStore.delete_items)
+
+class ShardedBackend(JSONBackend):
+    """Storage backend over a `ShardedStore`, served like the JSON file backend."""
+
+    def __init__(self, sharded_store: Optional[ShardedStore] = None):
+        super().__init__(ShardedStore() if sharded_store is None else sharded_store)
+
+def remove_files(path: str, suffixes: Tuple[str, ...] = ("", ".log", ".log.1", ".lock", ".compact", ".compact.lock")) -> None:
+    """Removes a shard file and the files an `ItemStore` keeps next to it."""
+    for suffix in suffixes:
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+def rebalance(directory: str = DATA_SHARD_DIR, shards: int = DATA_SHARDS, import_file: Optional[str] = None,
+              persistence: str = DATA_PERSISTENCE) -> int:
+    """Redistributes the items of a sharded store across `shards` new shard files.
+
+    The items of the current shards (and of `import_file`, a JSON data file, if given) are
+    written to the files of the new layout, then the manifest is replaced, which switches to
+    it, and only then are the old files removed: the store is never left half moved. Items
+    keep their ids, and the id counter is moved past the largest one. The API must be stopped,
+    and `persistence` must be the mode it ran with, so the write-ahead logs are replayed.
+
+    Returns:
+    - int: Number of items in the new shards.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    current = read_data(manifest_path).get("shards")
+    sources: List[ItemStore] = []
+    if current is not None:
+        sources.extend(ItemStore(shard_path(directory, index, current), float("inf"), persistence) for index in range(current))
+    if import_file:
+        sources.append(ItemStore(import_file, float("inf"), persistence))
+
+    partitions: List[List[Dict[str, Any]]] = [[] for _ in range(shards)]
+    last_id = 0
+    for source in sources:
+        # Loading replays the write-ahead log of the shard, so nothing committed is left behind
+        source.load()
+        try:
+            for item in source.get_items():
+                partitions[shard_index(item.get("id"), shards)].append(item)
+            for item in source.invalid_items:  # Moved as they are, to be fixed by hand
+                partitions[shard_index(item.get("id") if isinstance(item, dict) else None, shards)].append(item)
+            last_id = max(last_id, source._last_id)
+        finally:
+            source.close()
+
+    new_paths = [shard_path(directory, index, shards) for index in range(shards)]
+    for path, items in zip(new_paths, partitions):
+        write_data({"items": items, "last_id": last_id}, path)
+        # Already folded into the new file (same number of shards), or left over by an interrupted rebalance
+        remove_files(path, (".log", ".log.1", ".compact"))
+    IdAllocator(os.path.join(directory, COUNTER_FILE)).advance(last_id)
+    write_data({"shards": shards}, manifest_path)
+    if current is not None and current != shards:
+        for index in range(current):
+            remove_files(shard_path(directory, index, current))
+    return sum(len(items) for items in partitions)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Changes the number of shards of the sharded storage backend.")
+    parser.add_argument("--shards", type=int, default=DATA_SHARDS, help="New number of shards.")
+    parser.add_argument("--directory", default=DATA_SHARD_DIR, help="Directory of the shard files.")
+    parser.add_argument("--import-file", help=f"JSON data file (e.g. {DATA_FILE}) whose items are added to the shards.")
+    parser.add_argument("--persistence", default=DATA_PERSISTENCE, choices=("snapshot", "wal"),
+                        help="Persistence mode the shards (and the imported file) were written with.")
+    args = parser.parse_args()
+    if args.shards < 1:
+        parser.error("--shards must be at least 1")
+    start = time.perf_counter()
+    count = rebalance(args.directory, args.shards, args.import_file, args.persistence)
+    print(f"{count} items in {args.shards} shards in {args.directory} ({time.perf_counter() - start:.1f} s)")
+
+if __name__ == "__main__":
+    main()
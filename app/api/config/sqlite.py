@@ -0,0 +1,483 @@
+"""SQLite storage backend, and the tool that imports a JSON data file into it.
+
+Run the import from the repository root, with the API stopped:
+
+    python -m app.api.config.sqlite [--data-file data.json] [--sqlite-path data.db]
+"""
+import argparse
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.api.config.cache import single_flight
+from app.api.config.db import (FILTER_FIELDS, HASH_FIELDS, SEARCH_OPERATORS, TEXT_FIELDS, ItemStore, StorageBackend,
+                               decode_cursor, encode_cursor, format_id, parse_id, project)
+from app.api.config.env import DATA_FILE, DATA_RELOAD_INTERVAL, SQLITE_PATH, SQLITE_SYNCHRONOUS, SQLITE_BUSY_TIMEOUT
+from app.api.config.indexes import PREFIX_END, index_value, tokenize
+from app.api.config.metrics import observe_storage
+from app.api.config.serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# Fields with their own column (and index), so they can be filtered and searched on in SQL
+COLUMNS = tuple(dict.fromkeys(FILTER_FIELDS + HASH_FIELDS))
+
+# Statements prepared by each connection are kept in its cache and reused, keyed by their SQL text
+STATEMENT_CACHE_SIZE = 256
+
+SCHEMA = [
+    f"CREATE TABLE IF NOT EXISTS items (id TEXT PRIMARY KEY, {''.join(f'{column} TEXT, ' for column in COLUMNS)}data BLOB NOT NULL)",
+    *[f"CREATE INDEX IF NOT EXISTS items_{column} ON items ({column}, id)" for column in COLUMNS],
+    # Inverted index of the text-indexed fields, for full-text search
+    "CREATE TABLE IF NOT EXISTS item_words (word TEXT NOT NULL, id TEXT NOT NULL, PRIMARY KEY (word, id)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS item_words_id ON item_words (id)",
+    # Id counter and change counter, shared by every process that opens the database
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+    "INSERT OR IGNORE INTO meta (key, value) VALUES ('last_id', 0), ('version', 0)",
+]
+
+UPSERT_ITEM = f"INSERT OR REPLACE INTO items (id, {''.join(f'{column}, ' for column in COLUMNS)}data) VALUES ({', '.join('?' * (len(COLUMNS) + 2))})"
+SELECT_ITEM = "SELECT data FROM items WHERE id = ?"
+DELETE_ITEM = "DELETE FROM items WHERE id = ?"
+INSERT_WORD = "INSERT OR IGNORE INTO item_words (word, id) VALUES (?, ?)"
+DELETE_WORDS = "DELETE FROM item_words WHERE id = ?"
+SELECT_META = "SELECT value FROM meta WHERE key = ?"
+UPDATE_META = "UPDATE meta SET value = ? WHERE key = ?"
+COUNT_WORD = "SELECT count(*) FROM (SELECT 1 FROM item_words WHERE word = ? LIMIT ?)"
+WORD_COUNT_LIMIT = 1000
+
+# SQL conditions of the search operators, on a column
+CONDITIONS = {"eq": "{} = ?", "gte": "{} >= ?", "lte": "{} <= ?", "prefix": "{0} >= ? AND {0} < ?"}
+
+class SQLiteStore:
+    """Item store in a SQLite database, for single-node deployments without a database server.
+
+    Items are stored whole as JSON, next to a column per filtered or hash-indexed field of
+    `Item` with a (field, id) index, so filters, searches and pagination run as index range
+    scans and return the same pages and cursors as `ItemStore`. Full-text searches use a table
+    of (word, id) pairs, kept up to date on every write.
+
+    The database runs in WAL mode, so readers never block the writer nor each other. Each
+    thread gets its own connection, opened on first use and kept for the life of the store
+    (the threadpool threads are long-lived), with its prepared statements cached and reused.
+    Writes run in `BEGIN IMMEDIATE` transactions, which several workers can share safely.
+
+    Every write bumps a change counter in the database. It is checked at most every
+    `reload_interval` seconds (see `check_version`), so listeners hear about the writes of
+    other processes too.
+    """
+
+    def __init__(self, path: str = SQLITE_PATH, synchronous: str = SQLITE_SYNCHRONOUS, busy_timeout: float = SQLITE_BUSY_TIMEOUT,
+                 reload_interval: float = DATA_RELOAD_INTERVAL):
+        self.path = path
+        self.synchronous = synchronous
+        self.busy_timeout = busy_timeout
+        self.reload_interval = reload_interval
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._generation = 0
+        self._seen_version = 0  # Change counter of the database when this process last looked
+        self._version_lock = threading.Lock()
+        self._last_check = 0.0
+        self._listeners: List[Callable[[Optional[List[str]]], None]] = []
+        self._change_listeners: List[Callable[[List[Dict[str, Any]]], None]] = []
+        self.version = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.generation != self._generation:
+            # Autocommit mode: transactions are opened explicitly by `_transaction`
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                         check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(f"PRAGMA synchronous={self.synchronous}")
+            self._local.connection = connection
+            self._local.generation = self._generation
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        connection = self._connection()
+        start = time.perf_counter()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        finally:
+            observe_storage("write", start)
+
+    def _query(self, sql: str, params: Tuple[Any, ...] = ()) -> List[Tuple[Any, ...]]:
+        start = time.perf_counter()
+        try:
+            return self._connection().execute(sql, params).fetchall()
+        finally:
+            observe_storage("read", start)
+
+    def subscribe(self, listener: Callable[[Optional[List[str]]], None]) -> None:
+        """Registers a callback run after every change, with the ids of the changed items (None when everything may have changed)."""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def subscribe_changes(self, listener: Callable[[List[Dict[str, Any]]], None]) -> None:
+        """Registers a callback run after every change with what changed, see `StorageBackend.subscribe_changes`."""
+        if listener not in self._change_listeners:
+            self._change_listeners.append(listener)
+
+    def _notify(self, item_ids: Optional[List[str]], changes: Optional[List[Dict[str, Any]]] = None) -> None:
+        self.version += 1
+        for listener in self._listeners:
+            try:
+                listener(item_ids)
+            except Exception as e:
+                logger.exception("Error notifying a change listener: %s", e)
+        if item_ids is None:
+            changes = [{"op": "reset"}]
+        if not changes:
+            return
+        for listener in self._change_listeners:
+            try:
+                listener(changes)
+            except Exception as e:
+                logger.exception("Error notifying a change listener: %s", e)
+
+    def load(self) -> None:
+        """Creates the tables and indexes that are missing and reads the change counter."""
+        with self._transaction() as connection:
+            for statement in SCHEMA:
+                connection.execute(statement)
+        with self._version_lock:
+            self._seen_version = self._query(SELECT_META, ("version",))[0][0]
+        self._last_check = time.monotonic()
+        self._notify(None)
+
+    def close(self) -> None:
+        """Closes the connection of every thread; they are reopened on the next use."""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+            self._generation += 1
+        for connection in connections:
+            connection.close()
+
+    @property
+    def stale(self) -> bool:
+        """True when the next `check_version` will look for changes made by other processes."""
+        return time.monotonic() - self._last_check >= self.reload_interval
+
+    def check_version(self) -> bool:
+        """Notifies the listeners if another process changed the database since the last check.
+
+        Returns:
+        - bool: True if the database had changed, False otherwise.
+        """
+        self._last_check = time.monotonic()
+        version = self._query(SELECT_META, ("version",))[0][0]
+        with self._version_lock:
+            if version <= self._seen_version:
+                return False
+            self._seen_version = version
+        self._notify(None)
+        return True
+
+    def _bump_version(self, connection: sqlite3.Connection) -> bool:
+        # Called inside a write transaction. Returns True when another process wrote since the last check.
+        version = connection.execute(SELECT_META, ("version",)).fetchone()[0]
+        connection.execute(UPDATE_META, (version + 1, "version"))
+        with self._version_lock:
+            external = version > self._seen_version
+            self._seen_version = version + 1
+        return external
+
+    def _write(self, function: Callable[[sqlite3.Connection], Tuple[Any, List[Dict[str, Any]]]]) -> Any:
+        # Runs `function` in a write transaction; it returns its result and its changes (see `subscribe_changes`)
+        with self._transaction() as connection:
+            result, changes = function(connection)
+            external = self._bump_version(connection) if changes else False
+        if external:
+            # The writes of the other processes are not known one by one: everything may have changed
+            self._notify(None)
+        elif changes:
+            self._notify([change["id"] for change in changes], changes)
+        return result
+
+    @staticmethod
+    def _put(connection: sqlite3.Connection, item: Dict[str, Any]) -> None:
+        connection.execute(UPSERT_ITEM, (item["id"], *[index_value(item.get(column)) for column in COLUMNS], dumps(item)))
+        connection.execute(DELETE_WORDS, (item["id"],))
+        words = set().union(*(tokenize(item.get(field)) for field in TEXT_FIELDS))
+        connection.executemany(INSERT_WORD, [(word, item["id"]) for word in words])
+
+    @staticmethod
+    def _find(connection: sqlite3.Connection, item_id: str) -> Optional[Dict[str, Any]]:
+        row = connection.execute(SELECT_ITEM, (item_id,)).fetchone()
+        return loads(row[0]) if row else None
+
+    @staticmethod
+    def _delete(connection: sqlite3.Connection, item_id: str) -> None:
+        connection.execute(DELETE_ITEM, (item_id,))
+        connection.execute(DELETE_WORDS, (item_id,))
+
+    @staticmethod
+    def _allocate(connection: sqlite3.Connection, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Gives an id to the items without one, from the counter shared by every process
+        last_id = connection.execute(SELECT_META, ("last_id",)).fetchone()[0]
+        allocated = []
+        for item in items:
+            item = dict(item)
+            if not item.get("id"):
+                last_id += 1
+                item["id"] = format_id(last_id)
+            last_id = max(last_id, parse_id(item["id"]))
+            allocated.append(item)
+        connection.execute(UPDATE_META, (last_id, "last_id"))
+        return allocated
+
+    def get_items(self) -> List[Dict[str, Any]]:
+        return [loads(data) for data, in self._query("SELECT data FROM items ORDER BY id")]
+
+    def find_item(self, item_id: str) -> Dict[str, Any]:
+        rows = self._query(SELECT_ITEM, (item_id,))
+        return loads(rows[0][0]) if rows else {}
+
+    def list_items(self, limit: int, cursor: Optional[str] = None, filters: Optional[Dict[str, Tuple[str, str]]] = None,
+                   fields: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Returns one page of items in index order, with the same pages and cursors as `ItemStore.list_items`.
+
+        Raises:
+        - ValueError: If the cursor is invalid or does not belong to these filters.
+        """
+        filters = filters or {}
+        conditions: List[str] = []
+        params: List[str] = []
+        for field, (operator, value) in filters.items():
+            if field not in FILTER_FIELDS:
+                raise ValueError(f"Cannot filter on {field}.")
+            self._condition(conditions, params, field, operator, value)
+        index_name = next(iter(filters), "id")
+        return self._page(conditions, params, index_name, index_name, limit, cursor, fields)
+
+    def search_items(self, limit: int, cursor: Optional[str] = None, text: Optional[str] = None,
+                     criteria: Optional[List[Tuple[str, str, str]]] = None,
+                     fields: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Returns one page of the items that match every search criterion, like `ItemStore.search_items`.
+
+        Full-text and hash-indexed equality searches return items in id order; the others in
+        the order of the first criterion with a sorted index.
+
+        Raises:
+        - ValueError: If a criterion or the cursor is invalid.
+        """
+        criteria = criteria or []
+        conditions: List[str] = []
+        params: List[str] = []
+        for field, operator, value in criteria:
+            if operator not in SEARCH_OPERATORS or field not in FILTER_FIELDS + HASH_FIELDS:
+                raise ValueError(f"Cannot search {field} with {operator}.")
+            self._condition(conditions, params, field, operator, value)
+        tokens = sorted(tokenize(text), key=self._word_count) if text else []
+        for position, token in enumerate(tokens):
+            # The rarest word drives the scan; the others are looked up for each of its items
+            conditions.append("id IN (SELECT id FROM item_words WHERE word = ?)" if position == 0 else
+                              "EXISTS (SELECT 1 FROM item_words WHERE word = ? AND item_words.id = items.id)")
+            params.append(token)
+        if tokens or any(operator == "eq" and field in HASH_FIELDS for field, operator, _ in criteria):
+            return self._page(conditions, params, "id", "search", limit, cursor, fields)
+        index_name = next((field for field, _, _ in criteria if field in FILTER_FIELDS), "id")
+        return self._page(conditions, params, index_name, index_name, limit, cursor, fields)
+
+    def _word_count(self, word: str) -> int:
+        # Items with a word, counted up to WORD_COUNT_LIMIT: enough to tell rare words from common ones
+        return self._query(COUNT_WORD, (word, WORD_COUNT_LIMIT))[0][0]
+
+    @staticmethod
+    def _condition(conditions: List[str], params: List[str], field: str, operator: str, value: str) -> None:
+        conditions.append(CONDITIONS[operator].format(field))
+        params.extend([value, value + PREFIX_END] if operator == "prefix" else [value])
+
+    def _page(self, conditions: List[str], params: List[str], index_name: str, cursor_name: str, limit: int,
+              cursor: Optional[str], fields: Optional[List[str]]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        order = ["id"] if index_name == "id" else [index_name, "id"]
+        if cursor:
+            cursor_index, *after = decode_cursor(cursor)
+            if cursor_index != cursor_name or len(after) != len(order):
+                raise ValueError("Cursor does not match the filters.")
+            conditions = conditions + [f"({', '.join(order)}) > ({', '.join('?' * len(order))})"]
+            params = params + after
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = f"SELECT {', '.join(order)}, data FROM items{where} ORDER BY {', '.join(order)} LIMIT ?"
+        rows = self._query(sql, (*params, limit + 1))
+        page = [project(loads(row[-1]), fields) for row in rows[:limit]]
+        if len(rows) > limit:
+            return page, encode_cursor((cursor_name, *rows[limit - 1][:-1]))
+        return page, None
+
+    def add_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Adds an item, allocating its id unless it already has one, and returns it."""
+        return self.add_items([item])[0]
+
+    def update_item(self, item_id: str, item_update: Dict[str, Any]) -> Dict[str, Any]:
+        return self.update_items([(item_id, item_update)])[0]
+
+    def delete_item(self, item_id: str) -> Dict[str, Any]:
+        return self.delete_items([item_id])[0]
+
+    def add_items(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Adds several items in a single transaction, allocating their ids, and returns them."""
+        def add(connection: sqlite3.Connection) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+            added_items = self._allocate(connection, items)
+            for item in added_items:
+                self._put(connection, item)
+            return added_items, [{"op": "create", "id": item["id"], "item": item} for item in added_items]
+        return self._write(add)
+
+    def update_items(self, updates: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Updates several items in a single transaction.
+
+        Returns:
+        - List[dict]: The updated items, with an empty dict for each item that was not found.
+        """
+        def update(connection: sqlite3.Connection) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+            updated_items = []
+            pending: Dict[str, Dict[str, Any]] = {}
+            for item_id, item_update in updates:
+                item = pending.get(item_id) or self._find(connection, item_id)
+                if item is None:
+                    updated_items.append({})
+                    continue
+                pending[item_id] = {**item, **item_update, "id": item_id}
+                updated_items.append(pending[item_id])
+            for item in pending.values():
+                self._put(connection, item)
+            return updated_items, [{"op": "update", "id": item_id, "item": item} for item_id, item in pending.items()]
+        return self._write(update)
+
+    def delete_items(self, item_ids: List[str]) -> List[Dict[str, Any]]:
+        """Deletes several items in a single transaction.
+
+        Returns:
+        - List[dict]: The deleted items, with an empty dict for each item that was not found.
+        """
+        def delete(connection: sqlite3.Connection) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+            deleted_items = []
+            deleted_ids: Dict[str, None] = {}
+            for item_id in item_ids:
+                item = self._find(connection, item_id) if item_id not in deleted_ids else None
+                deleted_items.append(item or {})
+                if item is not None:
+                    self._delete(connection, item_id)
+                    deleted_ids[item_id] = None
+            return deleted_items, [{"op": "delete", "id": item_id} for item_id in deleted_ids]
+        return self._write(delete)
+
+class SQLiteBackend(StorageBackend):
+    """Storage backend over a `SQLiteStore`.
+
+    Every operation runs in the threadpool, since each one is a query on the database file.
+    """
+
+    cacheable = True
+
+    def __init__(self, sqlite_store: Optional[SQLiteStore] = None):
+        super().__init__()
+        self.store = SQLiteStore() if sqlite_store is None else sqlite_store
+
+    def subscribe(self, listener: Callable[[Optional[List[str]]], None]) -> None:
+        self.store.subscribe(listener)
+
+    def subscribe_changes(self, listener: Callable[[List[Dict[str, Any]]], None]) -> None:
+        self.store.subscribe_changes(listener)
+
+    async def get_version(self) -> int:
+        # Checking the change counter here keeps cached responses in sync with the other workers
+        if self.store.stale:
+            await single_flight.do(("check", id(self.store)), lambda: run_in_threadpool(self.store.check_version))
+        return self.store.version
+
+    async def connect(self) -> None:
+        await run_in_threadpool(self.store.load)
+
+    async def close(self) -> None:
+        await run_in_threadpool(self.store.close)
+
+    async def get_items(self) -> List[Dict[str, Any]]:
+        return await run_in_threadpool(self.store.get_items)
+
+    async def find_item(self, item_id: str) -> Dict[str, Any]:
+        return await run_in_threadpool(self.store.find_item, item_id)
+
+    async def list_items(self, limit: int, cursor: Optional[str] = None, filters: Optional[Dict[str, Tuple[str, str]]] = None,
+                         fields: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        return await run_in_threadpool(self.store.list_items, limit, cursor, filters, fields)
+
+    async def search_items(self, limit: int, cursor: Optional[str] = None, text: Optional[str] = None,
+                           criteria: Optional[List[Tuple[str, str, str]]] = None,
+                           fields: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        return await run_in_threadpool(self.store.search_items, limit, cursor, text, criteria, fields)
+
+    async def add_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        return await run_in_threadpool(self.store.add_item, item)
+
+    async def update_item(self, item_id: str, item_update: Dict[str, Any]) -> Dict[str, Any]:
+        return await run_in_threadpool(self.store.update_item, item_id, item_update)
+
+    async def delete_item(self, item_id: str) -> Dict[str, Any]:
+        return await run_in_threadpool(self.store.delete_item, item_id)
+
+    async def add_items(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return await run_in_threadpool(self.store.add_items, items)
+
+    async def update_items(self, updates: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        return await run_in_threadpool(self.store.update_items, updates)
+
+    async def delete_items(self, item_ids: List[str]) -> List[Dict[str, Any]]:
+        return await run_in_threadpool(self.store.delete_items, item_ids)
+
+def migrate(data_file: str = DATA_FILE, sqlite_path: str = SQLITE_PATH, batch_size: int = 10000) -> int:
+    """Imports every item of a JSON data file (and of its write-ahead log) into a SQLite database.
+
+    Items keep their ids, and the id counter carries over, so no id is ever handed out twice.
+    Items already in the database with the same ids are replaced.
+
+    Returns:
+    - int: Number of items imported.
+    """
+    source = ItemStore(data_file, reload_interval=float("inf"))
+    source.load()
+    try:
+        items = source.get_items()
+    finally:
+        source.close()
+    target = SQLiteStore(sqlite_path)
+    target.load()
+    try:
+        for start in range(0, len(items), batch_size):
+            target.add_items(items[start:start + batch_size])
+        with target._transaction() as connection:
+            last_id = connection.execute(SELECT_META, ("last_id",)).fetchone()[0]
+            connection.execute(UPDATE_META, (max(last_id, source._last_id), "last_id"))
+    finally:
+        target.close()
+    return len(items)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Imports a JSON data file into a SQLite database.")
+    parser.add_argument("--data-file", default=DATA_FILE, help="JSON data file to import.")
+    parser.add_argument("--sqlite-path", default=SQLITE_PATH, help="SQLite database to import into (created if missing).")
+    parser.add_argument("--batch-size", type=int, default=10000, help="Items written per transaction.")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    count = migrate(args.data_file, args.sqlite_path, args.batch_size)
+    print(f"Imported {count} items from {args.data_file} into {args.sqlite_path} in {time.perf_counter() - start:.1f} s")
+
+if __name__ == "__main__":
+    main()
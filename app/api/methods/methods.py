@@ -1,10 +1,13 @@
 import re
 from fastapi import HTTPException, status
 from logging import Logger
+from pydantic import ValidationError
 
-from typing import Union, List, Dict
+from typing import Any, AsyncIterator, Union, List, Dict
 from datetime import date
 
+from app.api.config.serialization import dumps, loads
+
 def is_valid_objectid(oid: str) -> bool:
     """
     Check if the given string is a valid ObjectId (typically for MongoDB).
@@ -58,3 +61,88 @@ def convert_date_to_str(data: Union[Dict, List[Dict]], key: str) -> Union[Dict,
             data[key] = data[key].strftime('%Y-%m-%d')
 
     return data
+
+async def stream_json_array(items: AsyncIterator[Dict[str, Any]], chunk_size: int = 65536) -> AsyncIterator[bytes]:
+    """Encode items as a JSON array, one chunk at a time.
+    
+    Args:
+    - items (AsyncIterator[dict]): Items to encode.
+    - chunk_size (int): Approximate size in bytes of each chunk.
+
+    Returns:
+    - AsyncIterator[bytes]: Chunks of the JSON array, starting right away with its opening bracket.
+    """
+    yield b"["
+    chunk = []
+    size = 0
+    separator = b""
+    async for item in items:
+        encoded = separator + dumps(item)
+        separator = b","
+        chunk.append(encoded)
+        size += len(encoded)
+        if size >= chunk_size:
+            yield b"".join(chunk)
+            chunk, size = [], 0
+    chunk.append(b"]")
+    yield b"".join(chunk)
+
+async def stream_ndjson(items: AsyncIterator[Dict[str, Any]], chunk_size: int = 65536) -> AsyncIterator[bytes]:
+    """Encode items as newline-delimited JSON, one chunk at a time.
+    
+    Args:
+    - items (AsyncIterator[dict]): Items to encode.
+    - chunk_size (int): Approximate size in bytes of each chunk.
+
+    Returns:
+    - AsyncIterator[bytes]: Chunks of NDJSON lines.
+    """
+    chunk = []
+    size = 0
+    async for item in items:
+        encoded = dumps(item) + b"\n"
+        chunk.append(encoded)
+        size += len(encoded)
+        if size >= chunk_size:
+            yield b"".join(chunk)
+            chunk, size = [], 0
+    if chunk:
+        yield b"".join(chunk)
+
+def parse_bulk_body(body: bytes, content_type: str, max_items: int) -> List[Any]:
+    """Parse the body of a bulk request, either a JSON array or NDJSON (one JSON value per line).
+    
+    Args:
+    - body (bytes): Raw request body.
+    - content_type (str): Content-Type header of the request; `application/x-ndjson` selects NDJSON.
+    - max_items (int): Maximum number of entries accepted.
+
+    Returns:
+    - List[Any]: The entries of the body.
+
+    Raises:
+    - HTTPException: If the body is malformed (400) or has too many entries (413).
+    """
+    try:
+        if "ndjson" in content_type:
+            entries = [loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            entries = loads(body)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid bulk body.")
+    if not isinstance(entries, list):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bulk body must be a JSON array or NDJSON.")
+    if len(entries) > max_items:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Bulk requests accept at most {max_items} items.")
+    return entries
+
+def validation_error_detail(error: ValidationError) -> str:
+    """Summarize a pydantic validation error in one line.
+    
+    Args:
+    - error (ValidationError): The validation error.
+
+    Returns:
+    - str: One `location: message` pair per error, separated by semicolons.
+    """
+    return "; ".join(f"{'.'.join(str(part) for part in entry['loc'])}: {entry['msg']}" for entry in error.errors())
@@ -0,0 +1,47 @@
+import logging
+import time
+import uuid
+
+from app.api.config.log import request_id
+
+logger = logging.getLogger(__name__)
+
+class AccessLogMiddleware:
+    """ASGI middleware that gives every request an ID and logs one line when it completes.
+
+    The ID is taken from the `X-Request-ID` header when the client sends one, is returned in
+    the same response header and is added to every record logged while serving the request.
+    The completion line carries the method, path, status and latency of the request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        current_request_id = headers.get(b"x-request-id", b"").decode("latin-1")[:64] or uuid.uuid4().hex
+        token = request_id.set(current_request_id)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_request_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", current_request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            logger.info("%s %s %s", scope["method"], scope["path"], status_code, extra={
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "latency_ms": round((time.perf_counter() - start) * 1000, 3),
+            })
+            request_id.reset(token)
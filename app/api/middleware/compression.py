@@ -0,0 +1,215 @@
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.api.config.cache import encoded_etag
+from app.api.config.env import (COMPRESSION_ENABLED, COMPRESSION_MIN_SIZE, COMPRESSION_GZIP_LEVEL, COMPRESSION_BROTLI_QUALITY,
+                                COMPRESSION_THREAD_MIN_SIZE, COMPRESSION_CACHE_MAX_BYTES)
+from app.api.config.metrics import record_timing
+
+try:
+    import brotli
+except ImportError:  # Optional: only gzip is offered
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "application/javascript", "application/xml", "text/")
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Picks the encoding for a request from its Accept-Encoding header: "br", "gzip" or None for identity.
+
+    Brotli is preferred when it is installed, and encodings with q=0 are never picked.
+    """
+    accepted = {}
+    for entry in accept_encoding.lower().split(","):
+        name, _, params = entry.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+    wildcard = accepted.get("*", 0.0)
+    if brotli is not None and accepted.get("br", wildcard) > 0:
+        return "br"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+def compressible_type(content_type: str) -> bool:
+    content_type = content_type.lower()
+    if content_type.startswith("text/event-stream"):
+        return False  # Long-lived streams of small events: each one would hold a compressor for hours
+    return content_type.startswith(COMPRESSIBLE_TYPES) or "+json" in content_type
+
+def compressible(headers: Headers) -> bool:
+    return "content-encoding" not in headers and compressible_type(headers.get("content-type", ""))
+
+class StreamCompressor:
+    """Compresses a body chunk by chunk, flushing after each one so the client gets it right away."""
+
+    def __init__(self, encoding: str, gzip_level: int = COMPRESSION_GZIP_LEVEL, brotli_quality: int = COMPRESSION_BROTLI_QUALITY):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)  # 31: gzip container, without a timestamp
+
+    def compress(self, chunk: bytes, last: bool = False) -> bytes:
+        if self.encoding == "br":
+            data = self._compressor.process(chunk)
+            return data + (self._compressor.finish() if last else self._compressor.flush())
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+def compress(body: bytes, encoding: str, gzip_level: int = COMPRESSION_GZIP_LEVEL, brotli_quality: int = COMPRESSION_BROTLI_QUALITY) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    return StreamCompressor("gzip", gzip_level).compress(body, last=True)
+
+class CompressedCache:
+    """LRU cache of compressed bodies keyed by (ETag, encoding), bounded by their total size.
+
+    ETags are hashes of the bodies, so entries never go stale: responses that change get new
+    ETags and the old entries age out.
+    """
+
+    def __init__(self, max_bytes: int = COMPRESSION_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str]) -> Optional[bytes]:
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return body
+
+    def put(self, key: Tuple[str, str], body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+class CompressionMiddleware:
+    """ASGI middleware that compresses responses with the best encoding the client accepts (br or gzip).
+
+    Only JSON and text responses of at least `minimum_size` bytes are compressed. Bodies of
+    `thread_min_size` bytes or more are compressed in the threadpool, so the event loop keeps
+    serving other requests meanwhile. Responses with an ETag (those of the response cache) are
+    compressed once: the compressed bytes are kept in a `CompressedCache` and reused for every
+    client until the ETag changes; the ETag sent gets an encoding suffix (e.g. "...-gzip"), which
+    `etag_matches` accepts back in If-None-Match, and so does a 304 for a response that would
+    have been compressed. Streaming responses are compressed chunk by chunk. Every response of
+    a compressible type gets `Vary: Accept-Encoding`, compressed or not, so shared caches keep
+    one copy per encoding.
+    """
+
+    def __init__(self, app, enabled: bool = COMPRESSION_ENABLED, minimum_size: int = COMPRESSION_MIN_SIZE,
+                 thread_min_size: int = COMPRESSION_THREAD_MIN_SIZE, cache: Optional[CompressedCache] = None):
+        self.app = app
+        self.enabled = enabled
+        self.minimum_size = minimum_size
+        self.thread_min_size = thread_min_size
+        self.cache = compressed_cache if cache is None else cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+
+        start_message = None
+        compressor: Optional[StreamCompressor] = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough
+            if passthrough or message["type"] not in ("http.response.start", "http.response.body"):
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start_message = message  # Held back until the first chunk tells whether to compress
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is not None:
+                message["body"] = await self._run(compressor.compress, body, not more_body)
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start_message.setdefault("headers", []))
+            etag = headers.get("etag")
+            status = start_message["status"]
+            if status == 304:
+                # Stands for the response the client has: same Vary, and the ETag of the same encoding
+                content_type, size = scope.get("representation", ("", 0))
+                if compressible_type(content_type):
+                    headers.add_vary_header("Accept-Encoding")
+                    if encoding is not None and etag and size >= self.minimum_size:
+                        headers["ETag"] = encoded_etag(etag, encoding)
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+            size = len(body) if not more_body else int(headers.get("content-length", self.minimum_size))
+            if compressible(headers):
+                headers.add_vary_header("Accept-Encoding")
+            if encoding is None or status < 200 or status == 204 or not compressible(headers) or size < self.minimum_size:
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            headers["Content-Encoding"] = encoding
+            if etag:
+                headers["ETag"] = encoded_etag(etag, encoding)
+            if more_body:
+                del headers["Content-Length"]
+                compressor = StreamCompressor(encoding)
+                message["body"] = await self._run(compressor.compress, body, False)
+            else:
+                compressed = self.cache.get((etag, encoding)) if etag else None
+                if compressed is None:
+                    compressed = await self._run(compress, body, encoding)
+                    if etag:
+                        self.cache.put((etag, encoding), compressed)
+                headers["Content-Length"] = str(len(compressed))
+                message["body"] = compressed
+            await send(start_message)
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+    async def _run(self, function: Callable[..., bytes], body: bytes, *args) -> bytes:
+        start = time.perf_counter()
+        if len(body) >= self.thread_min_size:
+            result = await run_in_threadpool(function, body, *args)
+        else:
+            result = function(body, *args)
+        record_timing("compress", time.perf_counter() - start)
+        return result
+
+# Instantiate the compressed body cache for further use
+compressed_cache = CompressedCache()
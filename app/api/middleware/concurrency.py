@@ -0,0 +1,120 @@
+import re
+import time
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+
+from fastapi.responses import JSONResponse
+
+from app.api.config.concurrency import ConcurrencyLimitExceeded, ConcurrencyLimiter, concurrency_limiter
+
+# Routes that are never limited: monitoring has to answer under overload, and change streams never end
+EXEMPT_PATHS = ("/metrics", "/health/live", "/health/ready", "/items/changes/", "/admin/concurrency/")
+
+NAMED_GROUP = re.compile(r"\(\?P<\w+>")
+
+class RouteIndex:
+    """Finds the first route whose path matches a request without matching every route in turn.
+
+    The patterns of the routes with path parameters are joined, in order, into one regular
+    expression whose group "r<n>" is the n-th route. The paths of the other routes are looked
+    up in a dict, which already holds the answer for them: their own position, or that of an
+    earlier route with parameters whose pattern matches them too.
+    """
+
+    def __init__(self, routes: List[Any]):
+        self.routes = routes
+        self.size = len(routes)
+        self.static: Dict[str, int] = {}
+        alternatives = []
+        for index, route in enumerate(routes):
+            path_regex = getattr(route, "path_regex", None)
+            if path_regex is None:
+                continue
+            if getattr(route, "param_convertors", None) == {}:
+                self.static.setdefault(route.path, index)
+            else:
+                alternatives.append(f"(?P<r{index}>{NAMED_GROUP.sub('(?:', path_regex.pattern)})")
+        self.expression: Optional[Pattern[str]] = re.compile("|".join(alternatives)) if alternatives else None
+        for path, index in self.static.items():
+            parametrized = self._match(path)
+            if parametrized is not None and parametrized < index:
+                self.static[path] = parametrized
+
+    def _match(self, path: str) -> Optional[int]:
+        match = self.expression.match(path) if self.expression is not None else None
+        return None if match is None else int(match.lastgroup[1:])
+
+    def first(self, path: str) -> Optional[int]:
+        """Returns the position of the first route whose path matches `path`, or None."""
+        index = self.static.get(path)
+        return self._match(path) if index is None else index
+
+# Route lists -> their index, rebuilt when routes are added
+_indexes: Dict[int, RouteIndex] = {}
+
+def match_template(scope) -> Optional[str]:
+    """Returns the path template of the route that will serve a request, or None when no route matches it."""
+    routes = getattr(scope.get("app"), "routes", [])
+    index = _indexes.get(id(routes))
+    if index is None or index.routes is not routes or index.size != len(routes):
+        index = _indexes[id(routes)] = RouteIndex(routes)
+    path, method = scope["path"], scope["method"]
+    start = index.first(path)
+    if start is None:
+        return None
+    route = routes[start]
+    if getattr(route, "methods", None) is None or method in route.methods:
+        return route.path
+    # Another method of the same path (e.g. PUT after GET /items/{item_id}/): what `Route.matches` checks,
+    # without converting the path parameters, for the routes that follow
+    for route in routes[start + 1:]:
+        path_regex = getattr(route, "path_regex", None)
+        if path_regex is not None and path_regex.match(path) and (getattr(route, "methods", None) is None or method in route.methods):
+            return route.path
+    return None
+
+class ConcurrencyLimitMiddleware:
+    """ASGI middleware that admits the requests through the adaptive concurrency limiter.
+
+    Requests are limited per method and route template (e.g. "GET /api/v1/x/items/{item_id}/"),
+    before they are routed, so a shed request costs no more than its 503. Its `Retry-After`
+    header says when the queue should have drained. The limits learn from the time each
+    request takes until its response is sent, and 5xx responses count as failures.
+    Requests that match no route, and the `exempt` paths, are not limited.
+    """
+
+    def __init__(self, app, limiter: Optional[ConcurrencyLimiter] = None, exempt: Tuple[str, ...] = EXEMPT_PATHS):
+        self.app = app
+        self.limiter = concurrency_limiter if limiter is None else limiter
+        self.exempt = exempt
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.limiter.enabled:
+            await self.app(scope, receive, send)
+            return
+        template = match_template(scope)
+        if template is None or template.endswith(self.exempt):
+            await self.app(scope, receive, send)
+            return
+
+        route = f"{scope['method']} {template}"
+        try:
+            await self.limiter.acquire(route, scope["method"])
+        except ConcurrencyLimitExceeded as e:
+            response = JSONResponse(status_code=503, content={"detail": "Server overloaded. Try again later."},
+                                    headers={"Retry-After": str(e.retry_after)})
+            await response(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.limiter.release(route, time.perf_counter() - start, status_code >= 500)
@@ -0,0 +1,118 @@
+import hashlib
+import time
+from typing import List, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.requests import Request
+
+from app.api.config.env import IDEMPOTENCY_ENABLED, IDEMPOTENCY_WAIT_TIMEOUT
+from app.api.config.idempotency import StoredResponse, get_store
+from app.api.config.limiter import get_request_key
+
+UNSAFE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+MAX_KEY_LENGTH = 255
+
+def fingerprint(method: str, path: str, query_string: bytes, body: bytes) -> str:
+    """Hashes what makes two requests the same request: method, path, query and body."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (method.encode(), path.encode(), query_string, body):
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+class IdempotencyMiddleware:
+    """ASGI middleware that makes writes sent with an `Idempotency-Key` header safe to retry.
+
+    The first request with a key runs as usual and its response is stored (unless it is a 429
+    or a 5xx, which the client should be able to retry). Requests with the same key and client
+    (see `get_request_key`) get the stored response back, with an `Idempotent-Replayed: true`
+    header, without running the route, so a retried `POST /items/` never creates a duplicate.
+    A retry that arrives while the first request is still running waits for it, up to
+    `wait_timeout` seconds (409 after that), and reusing a key for a different request is a 422.
+    """
+
+    def __init__(self, app, enabled: bool = IDEMPOTENCY_ENABLED, store=None, wait_timeout: float = IDEMPOTENCY_WAIT_TIMEOUT):
+        self.app = app
+        self.enabled = enabled
+        self.wait_timeout = wait_timeout
+        self._store = store
+
+    @property
+    def store(self):
+        # The shared store by default, created on first use so importing the app does not touch the disk
+        return get_store() if self._store is None else self._store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled or scope["method"] not in UNSAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+        idempotency_key = Headers(scope=scope).get("idempotency-key")
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            await JSONResponse(status_code=400, content={"detail": "Invalid Idempotency-Key header."})(scope, receive, send)
+            return
+
+        # The whole body is needed for the fingerprint; it is then handed to the app as one message
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        body = b"".join(chunks)
+        request_fingerprint = fingerprint(scope["method"], scope["path"], scope.get("query_string", b""), body)
+        client = get_request_key(Request(scope))
+        key = hashlib.blake2b(f"{client}\0{idempotency_key}".encode(), digest_size=20).hexdigest()
+
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            stored = await self.store.get(key)
+            if stored is not None:
+                if stored.fingerprint != request_fingerprint:
+                    await JSONResponse(status_code=422, content={"detail": "Idempotency-Key already used for a different request."})(scope, receive, send)
+                    return
+                await send({"type": "http.response.start", "status": stored.status,
+                            "headers": stored.headers + [(b"idempotent-replayed", b"true")]})
+                await send({"type": "http.response.body", "body": stored.body})
+                return
+            if await self.store.claim(key):
+                break
+            if not await self.store.wait(key, max(deadline - time.monotonic(), 0)):
+                await JSONResponse(status_code=409, content={"detail": "A request with this Idempotency-Key is still in progress."})(scope, receive, send)
+                return
+
+        body_sent = False
+
+        async def receive_body():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        status: Optional[int] = None
+        headers: List[Tuple[bytes, bytes]] = []
+        response_chunks = []
+
+        async def send_and_capture(message):
+            nonlocal status, headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                response_chunks.append(message.get("body", b""))
+            await send(message)
+
+        response = None
+        try:
+            await self.app(scope, receive_body, send_and_capture)
+            if status is not None and status < 500 and status != 429:
+                response = StoredResponse(status, headers, b"".join(response_chunks), request_fingerprint)
+        finally:
+            # Released even when the request failed, so a retry can run it again
+            await self.store.complete(key, response)
@@ -0,0 +1,62 @@
+import time
+from typing import Any, Callable, Dict
+
+from app.api.config.env import METRICS_ENABLED, SERVER_TIMING_ENABLED
+from app.api.config.metrics import REQUEST_DURATION, REQUESTS_IN_PROGRESS, server_timing
+
+_templates: Dict[Callable[..., Any], str] = {}
+
+def route_template(scope) -> str:
+    """Returns the path template of the route that served a request, or "unmatched"."""
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    template = _templates.get(endpoint)
+    if template is None:
+        # The router puts the endpoint of the matched route in the scope, not the route itself
+        routes = getattr(scope.get("app"), "routes", [])
+        template = next((route.path for route in routes if getattr(route, "endpoint", None) is endpoint), "unmatched")
+        _templates[endpoint] = template
+    return template
+
+class MetricsMiddleware:
+    """ASGI middleware that records the latency of every request and adds a `Server-Timing` header.
+
+    Requests are labelled with the path template of their route (e.g. /api/v1/x/items/{item_id}/),
+    so IDs do not create new series; requests that match no route are labelled "unmatched". The
+    `Server-Timing` header carries the time spent in storage, auth and the rate limiter (when
+    they were used) and the total time until the response started, in milliseconds.
+    """
+
+    def __init__(self, app, enabled: bool = METRICS_ENABLED, server_timing_enabled: bool = SERVER_TIMING_ENABLED):
+        self.app = app
+        self.enabled = enabled
+        self.server_timing_enabled = server_timing_enabled
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        timings: Dict[str, float] = {}
+        token = server_timing.set(timings)
+        start = time.perf_counter()
+        status_code = 500
+        REQUESTS_IN_PROGRESS.inc()
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.server_timing_enabled:
+                    entries = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in timings.items()]
+                    entries.append(f"total;dur={(time.perf_counter() - start) * 1000:.3f}")
+                    message["headers"] = list(message.get("headers", [])) + [(b"server-timing", ", ".join(entries).encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+            REQUEST_DURATION.observe(time.perf_counter() - start, scope["method"], route_template(scope), str(status_code))
+            server_timing.reset(token)
@@ -0,0 +1,33 @@
+import sys
+import time
+
+from app.api.config.profiling import current_profile, profiler
+from app.api.middleware.metrics import route_template
+
+class ProfilingMiddleware:
+    """ASGI middleware that hands the requests to the sampling profiler while it runs.
+
+    It does nothing but check `profiler.running` while profiling is stopped. Profiled requests
+    are grouped by method and route template, e.g. "GET /api/v1/x/items/{item_id}/".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiler.running:
+            await self.app(scope, receive, send)
+            return
+
+        # The sampler recognises the stacks of this request by the frame of this call
+        profile = profiler.begin(sys._getframe())
+        if profile is None:
+            await self.app(scope, receive, send)
+            return
+        token = current_profile.set(profile)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_profile.reset(token)
+            profiler.end(profile, f"{scope['method']} {route_template(scope)}", time.perf_counter() - start)
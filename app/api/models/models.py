@@ -1,5 +1,5 @@
 from typing import Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 # Define your data models and schemas here
 # For now, using generic examples
@@ -20,9 +20,12 @@ class ItemCreate(BaseModel):
     
     This model is used when a new item is being created and doesn't have an ID yet. By separating the creation model
     from the general item model, it ensures that the ID is not provided or altered during the creation process.
+    
+    The `indexes` of each field declare the in-memory indexes the item store keeps on it: "hash" for equality
+    lookups, "sorted" for prefix and range queries (and filtered pagination) and "text" for full-text search.
     """
-    name: str
-    description: str
+    name: str = Field(..., indexes=("hash", "sorted", "text"))
+    description: str = Field(..., indexes=("sorted", "text"))
 
 class Item(ItemCreate):
     """
@@ -34,6 +37,43 @@ class Item(ItemCreate):
     """
     id: str
 
+class ItemProjection(BaseModel):
+    """
+    Data model for an item restricted to some of its fields.
+    
+    This model is used when listing items with field projection: the ID is always present, but only the
+    requested fields are returned, so clients that need a couple of fields don't pay for the whole item.
+    """
+    id: str
+    name: Optional[str] = None
+    description: Optional[str] = None
+
+class BulkResult(BaseModel):
+    """
+    Data model for the outcome of one entry of a bulk request.
+    
+    Bulk endpoints apply every valid entry in a single storage operation and report each entry separately:
+    `index` is the position of the entry in the request, `status` the HTTP status it would have had as a
+    single request, and either `item` (on success) or `detail` (on failure) is set.
+    """
+    index: int
+    status: int
+    item: Optional[Item] = None
+    detail: Optional[str] = None
+
+class ProfilingSettings(BaseModel):
+    """
+    Data model for switching the request profiler on or off.
+    
+    Settings left out keep their current values. `sample_rate` is the fraction of requests that are profiled,
+    and requests slower than `latency_threshold_ms` are profiled too when it is above 0. `interval_ms` is the
+    time between two stack samples.
+    """
+    enabled: bool
+    sample_rate: Optional[float] = Field(None, ge=0, le=1)
+    latency_threshold_ms: Optional[float] = Field(None, ge=0)
+    interval_ms: Optional[float] = Field(None, ge=1)
+
 class ResponseError(BaseModel):
     """
     Data model for API error responses.
@@ -0,0 +1,121 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+import logging
+
+# Configuration, models and authentication modules imports
+from app.api.config.concurrency import concurrency_limiter
+from app.api.config.profiling import profiler
+from app.api.models.models import ResponseError, ProfilingSettings
+from app.api.auth.auth import auth_handler
+
+router = APIRouter()
+
+logger = logging.getLogger(__name__)
+
+@router.get('/admin/profiling/',
+            tags=["Admin"],
+            responses={
+                500: {"model": ResponseError, "description": "Internal server error."},
+                403: {"model": ResponseError, "description": "Admin role required."},
+            })
+async def get_profiling(admin=Depends(auth_handler.authenticate_admin)):
+    """Get the state of the request profiler of this worker.
+    
+    Returns:
+    - dict: Whether it runs, its settings, the requests and samples collected and the samples per route.
+    """
+    return profiler.status()
+
+@router.put('/admin/profiling/',
+            tags=["Admin"],
+            responses={
+                500: {"model": ResponseError, "description": "Internal server error."},
+                403: {"model": ResponseError, "description": "Admin role required."},
+            })
+async def set_profiling(settings: ProfilingSettings, admin=Depends(auth_handler.authenticate_admin)):
+    """Switch the request profiler of this worker on or off.
+    
+    Each worker has its own profiler: with several workers, repeat the request until every worker
+    reports the wanted state, or send `PROFILE_SIGNAL` to each of them. Stopping the profiler writes
+    the collected stacks to `PROFILE_DIR`.
+    
+    Args:
+    - settings (ProfilingSettings): Whether to profile, and optionally new sampling settings.
+    
+    Returns:
+    - dict: State of the profiler.
+    """
+    try:
+        if settings.enabled:
+            profiler.start(settings.sample_rate, settings.latency_threshold_ms, settings.interval_ms)
+        else:
+            await run_in_threadpool(profiler.stop)
+        logger.warning("Profiling switched %s by %s.", "on" if settings.enabled else "off", admin.get('id'))
+        return profiler.status()
+    except Exception as e:
+        logger.critical("Error switching the profiler: %s", e)
+        raise HTTPException(status_code=500, detail="Error switching the profiler.")
+
+@router.get('/admin/profiling/stacks/',
+            response_class=PlainTextResponse,
+            tags=["Admin"],
+            responses={
+                500: {"model": ResponseError, "description": "Internal server error."},
+                403: {"model": ResponseError, "description": "Admin role required."},
+                404: {"model": ResponseError, "description": "No samples for the route."},
+            })
+async def get_profiling_stacks(route: Optional[str] = Query(None, description='Route, e.g. "GET /api/v1/x/items/{item_id}/".'),
+                               admin=Depends(auth_handler.authenticate_admin)):
+    """Get the collapsed stacks collected by the profiler of this worker.
+    
+    The output is the input format of flamegraph.pl and speedscope: one "frame;frame;frame count" line
+    per distinct stack. Without `route`, the stacks of every route are returned under a root frame
+    named after their route.
+    
+    Args:
+    - route (str): Only return the stacks of this route.
+    
+    Returns:
+    - str: Collapsed stacks.
+    
+    Raises:
+    - HTTPException: If there are no samples for the route.
+    """
+    stacks = profiler.collapsed(route)
+    if route is not None and not stacks:
+        raise HTTPException(status_code=404, detail="No samples for the route.")
+    return PlainTextResponse(stacks)
+
+@router.delete('/admin/profiling/stacks/',
+               tags=["Admin"],
+               responses={
+                   500: {"model": ResponseError, "description": "Internal server error."},
+                   403: {"model": ResponseError, "description": "Admin role required."},
+               })
+async def clear_profiling_stacks(admin=Depends(auth_handler.authenticate_admin)):
+    """Discard the stacks collected by the profiler of this worker.
+    
+    Returns:
+    - dict: State of the profiler.
+    """
+    profiler.clear()
+    return profiler.status()
+
+@router.get('/admin/concurrency/',
+            tags=["Admin"],
+            responses={
+                500: {"model": ResponseError, "description": "Internal server error."},
+                403: {"model": ResponseError, "description": "Admin role required."},
+            })
+async def get_concurrency(admin=Depends(auth_handler.authenticate_admin)):
+    """Get the adaptive concurrency limits of this worker.
+    
+    Each worker has its own limits, learnt from the latency of its requests. The same values, summed
+    over the workers, are exported at /metrics.
+    
+    Returns:
+    - dict: The limit of the worker, its requests in flight and queued, the requests shed, and per route its limit, latency and baseline, requests in flight and queued, and requests shed by reason.
+    """
+    return concurrency_limiter.status()
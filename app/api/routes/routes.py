@@ -1,27 +1,22 @@
-from fastapi import APIRouter, HTTPException, Request, status
-from slowapi.errors import RateLimitExceeded
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from typing import List, Optional
 import logging
 
 # Configuration, models, methods and authentication modules imports
-from app.api.config.db import get_items, add_item, find_item, update_item, delete_item
-from app.api.config.limiter import limiter
-from app.api.config.env import API_NAME
-from app.api.models.models import ResponseError, ItemPatch, ItemCreate, Item
+from app.api.config.db import get_backend
+from app.api.config.cache import response_cache, single_flight, render_json, conditional_response
+from app.api.config.changes import change_feed
+from app.api.config.serialization import FastJSONResponse, respond, revalidate
+from app.api.config.limiter import limiter, RateLimitExceeded
+from app.api.config.env import BULK_MAX_ITEMS, PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX
+from app.api.models.models import ResponseError, ItemPatch, ItemCreate, Item, ItemProjection, BulkResult
 from app.api.auth.auth import auth_handler
-from app.api.methods.methods import is_valid_objectid, convert_objectid_to_str
+from app.api.methods.methods import is_valid_objectid, convert_objectid_to_str, stream_json_array, stream_ndjson, parse_bulk_body, validation_error_detail
 
 router = APIRouter()
 
-# Log file name
-log_filename = f"api_{API_NAME}.log"
-
-# Configurate the logging level to catch all messages from DEBUG onwards
-logging.basicConfig(level=logging.INFO,
-                    format='%(asctime)s [%(levelname)s] - %(message)s',
-                    handlers=[logging.FileHandler(log_filename),
-                              logging.StreamHandler()])
-
 logger = logging.getLogger(__name__)
 
 @router.post('/items/', 
@@ -32,8 +27,8 @@ logger = logging.getLogger(__name__)
                  500: {"model": ResponseError, "description": "Internal server error."},
                  429: {"model": ResponseError, "description": "Too many requests."}
              })
-@limiter.limit("5/minute")
-def create_item(item: ItemCreate, request: Request):#, auth=Depends(auth_handler.authenticate)):
+@limiter.limit()
+async def create_item(item: ItemCreate, request: Request):#, auth=Depends(auth_handler.authenticate)):
     """Create a new item in the database.
     
     Args:
@@ -44,50 +39,409 @@ def create_item(item: ItemCreate, request: Request):#, auth=Depends(auth_handler
     """
     try:
         logger.info("Creating a new item.")
-        item_dict = item.dict()
-        item_dict["id"] = str(len(get_items()) + 1)  # Simple ID assignment
-        add_item(item_dict)
-        logger.info(f"Item with ID {item_dict['id']} successfully created.")
-        return item_dict
+        item_dict = await get_backend().add_item(item.dict())  # The storage backend allocates a new unique ID
+        logger.info("Item with ID %s successfully created.", item_dict['id'])
+        return respond(item_dict, status_code=status.HTTP_201_CREATED)
     except RateLimitExceeded:
         raise HTTPException(status_code=429, detail="Too many requests.")
     except HTTPException:
         raise
     except Exception as e:
-        logger.critical(f"Error creating item: {str(e)}")
+        logger.critical("Error creating item: %s", e)
         raise HTTPException(status_code=500, detail="Error creating item.")
 
 @router.get('/items/', 
-            response_model=List[Item],
+            response_model=List[ItemProjection],
+            response_model_exclude_unset=True,
             tags=["CRUD"],
             responses={
                 500: {"model": ResponseError, "description": "Internal server error."},
                 429: {"model": ResponseError, "description": "Too many requests."},
                 404: {"model": ResponseError, "description": "No items found."},
+                400: {"model": ResponseError, "description": "Invalid cursor or fields."},
             })
-@limiter.limit("5/minute")
-def list_items(request: Request):#, auth=Depends(auth_handler.authenticate)):
-    """Fetch all items from the database.
+@limiter.limit()
+async def list_items(request: Request,
+                     limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+                     cursor: Optional[str] = None,
+                     name: Optional[str] = None,
+                     name_prefix: Optional[str] = None,
+                     description: Optional[str] = None,
+                     description_prefix: Optional[str] = None,
+                     fields: Optional[str] = None):#, auth=Depends(auth_handler.authenticate)):
+    """Fetch a page of items from the database.
+    
+    Items are returned in index order. When there are more items, the response carries a `Link` header
+    with the URL of the next page (`rel="next"`). Pages are cached until the collection changes and carry
+    an `ETag`; requests with a matching `If-None-Match` get a 304 without a body.
+    
+    Args:
+    - limit (int): Maximum number of items in the page.
+    - cursor (str): Cursor of the page to fetch, taken from the `Link` header of the previous page.
+    - name, description (str): Only return items whose field is exactly this value.
+    - name_prefix, description_prefix (str): Only return items whose field starts with this value.
+    - fields (str): Comma-separated fields to return besides the ID. Every field by default.
     
     Returns:
-    - List[Item]: List of items.
+    - List[ItemProjection]: Page of items.
     """
     try:
-        logger.info("Fetching all items.")
-        items = get_items()
-        if not items:
-            logger.warning("No items found.")
-            raise HTTPException(status_code=404, detail="No items found.")
+        logger.info("Fetching a page of items.")
+        values = {"name": (name, name_prefix), "description": (description, description_prefix)}
+        filters = {}
+        for field, (exact, prefix) in values.items():
+            if exact is not None:
+                filters[field] = ("eq", exact)
+            elif prefix is not None:
+                filters[field] = ("prefix", prefix)
+        projection = None
+        if fields is not None:
+            projection = [field.strip() for field in fields.split(",") if field.strip()]
+            if not set(projection) <= set(Item.__fields__):
+                raise HTTPException(status_code=400, detail="Invalid fields.")
+        backend = get_backend()
+        await backend.get_version()  # Applies the changes of other workers to the cache first
+        version = response_cache.version
+        key = ("list", request.url.query)
+        cached = response_cache.get(key) if backend.cacheable else None
+        if cached is None:
+            async def fetch():
+                items, next_cursor = await backend.list_items(limit, cursor, filters, projection)
+                if not items:
+                    return None
+                headers = {}
+                if next_cursor:
+                    headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+                rendered = render_json([revalidate(ItemProjection, item, exclude_unset=True) for item in items], headers)
+                if backend.cacheable:
+                    response_cache.put(key, rendered, version)
+                return rendered
+            try:
+                # Identical requests in flight share one storage read
+                cached = await single_flight.do((key, version), fetch)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor.")
+            if cached is None:
+                logger.warning("No items found.")
+                raise HTTPException(status_code=404, detail="No items found.")
         logger.info("Items successfully fetched.")
-        return items
+        return conditional_response(request, cached)
     except RateLimitExceeded:
         raise HTTPException(status_code=429, detail="Too many requests.")
     except HTTPException:
         raise
     except Exception as e:
-        logger.critical(f"Error fetching items: {str(e)}")
+        logger.critical("Error fetching items: %s", e)
         raise HTTPException(status_code=500, detail="Error fetching items.")
 
+@router.get('/items/export/',
+            response_class=StreamingResponse,
+            tags=["CRUD"],
+            responses={
+                200: {"content": {"application/json": {}, "application/x-ndjson": {}},
+                      "description": "Every item, as a JSON array or as NDJSON."},
+                500: {"model": ResponseError, "description": "Internal server error."},
+                429: {"model": ResponseError, "description": "Too many requests."},
+            })
+@limiter.limit()
+async def export_items(request: Request, format: str = Query("json", regex="^(json|ndjson)$")):#, auth=Depends(auth_handler.authenticate)):
+    """Export every item in the database.
+    
+    Items are streamed from the storage backend as they are read, so memory use does not grow
+    with the collection and the first bytes are sent right away.
+    
+    Args:
+    - format (str): `json` for a JSON array, `ndjson` for one JSON item per line.
+    
+    Returns:
+    - StreamingResponse: Every item.
+    """
+    try:
+        logger.info("Exporting all items as %s.", format)
+        items = get_backend().iter_items()
+        if format == "ndjson":
+            content, media_type = stream_ndjson(items), "application/x-ndjson"
+        else:
+            content, media_type = stream_json_array(items), "application/json"
+        return StreamingResponse(content, media_type=media_type,
+                                 headers={"Content-Disposition": f'attachment; filename="items.{format}"'})
+    except RateLimitExceeded:
+        raise HTTPException(status_code=429, detail="Too many requests.")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.critical("Error exporting items: %s", e)
+        raise HTTPException(status_code=500, detail="Error exporting items.")
+
+@router.get('/items/changes/',
+            response_class=StreamingResponse,
+            tags=["CRUD"],
+            responses={
+                200: {"content": {"text/event-stream": {}},
+                      "description": "Server-sent events: `create`, `update`, `delete` and `reset`."},
+                500: {"model": ResponseError, "description": "Internal server error."},
+                429: {"model": ResponseError, "description": "Too many requests."},
+            })
+@limiter.limit()
+async def item_changes(request: Request, last_event_id: Optional[str] = Query(None, max_length=64)):#, auth=Depends(auth_handler.authenticate)):
+    """Stream the changes of the items as server-sent events, instead of polling GET /items/.
+    
+    Every committed write is sent as a `create` or `update` event (with the item), or a
+    `delete` event (with its id). A `reset` event means that the items have to be read again,
+    e.g. because the data file was replaced or the client fell too far behind. Idle streams
+    get a keep-alive comment every few seconds, and clients that do not keep up are
+    disconnected.
+    
+    Args:
+    - last_event_id (str): Id of the last event received, to resume after a reconnection. The
+      `Last-Event-ID` header, sent by browsers when they reconnect, takes precedence.
+    
+    Returns:
+    - StreamingResponse: The change events, as they are committed.
+    """
+    try:
+        subscription = change_feed.subscribe(request.headers.get("last-event-id") or last_event_id)
+        logger.info("Streaming item changes to a new subscriber (%d listening).", len(change_feed))
+        return StreamingResponse(change_feed.stream(subscription), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    except RateLimitExceeded:
+        raise HTTPException(status_code=429, detail="Too many requests.")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.critical("Error streaming item changes: %s", e)
+        raise HTTPException(status_code=500, detail="Error streaming item changes.")
+
+@router.get('/items/search/',
+            response_model=List[ItemProjection],
+            response_model_exclude_unset=True,
+            tags=["CRUD"],
+            responses={
+                500: {"model": ResponseError, "description": "Internal server error."},
+                429: {"model": ResponseError, "description": "Too many requests."},
+                404: {"model": ResponseError, "description": "No items found."},
+                400: {"model": ResponseError, "description": "Invalid search, cursor or fields."},
+            })
+@limiter.limit()
+async def search_items(request: Request,
+                       q: Optional[str] = None,
+                       name: Optional[str] = None,
+                       name_prefix: Optional[str] = None,
+                       name_gte: Optional[str] = None,
+                       name_lte: Optional[str] = None,
+                       description: Optional[str] = None,
+                       description_prefix: Optional[str] = None,
+                       description_gte: Optional[str] = None,
+                       description_lte: Optional[str] = None,
+                       limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+                       cursor: Optional[str] = None,
+                       fields: Optional[str] = None):#, auth=Depends(auth_handler.authenticate)):
+    """Search items through the indexes declared on the item fields.
+    
+    Every given criterion must match. When the search has words or exact values, items are returned in
+    ID order; otherwise in the order of the first filtered field. The next page is linked in the `Link`
+    header (`rel="next"`), and pages are cached and carry an `ETag` like those of `GET /items/`.
+    
+    Args:
+    - q (str): Words that must all appear in the name or description (full-text search, case-insensitive).
+    - name, description (str): Only return items whose field is exactly this value.
+    - name_prefix, description_prefix (str): Only return items whose field starts with this value.
+    - name_gte, name_lte, description_gte, description_lte (str): Only return items whose field is within this range.
+    - limit (int): Maximum number of items in the page.
+    - cursor (str): Cursor of the page to fetch, taken from the `Link` header of the previous page.
+    - fields (str): Comma-separated fields to return besides the ID. Every field by default.
+    
+    Returns:
+    - List[ItemProjection]: Page of matching items.
+    """
+    try:
+        logger.info("Searching items.")
+        values = {
+            "name": {"eq": name, "prefix": name_prefix, "gte": name_gte, "lte": name_lte},
+            "description": {"eq": description, "prefix": description_prefix, "gte": description_gte, "lte": description_lte},
+        }
+        criteria = [(field, operator, value) for field, operators in values.items()
+                    for operator, value in operators.items() if value is not None]
+        if not criteria and not (q and q.strip()):
+            raise HTTPException(status_code=400, detail="At least one search criterion is required.")
+        projection = None
+        if fields is not None:
+            projection = [field.strip() for field in fields.split(",") if field.strip()]
+            if not set(projection) <= set(Item.__fields__):
+                raise HTTPException(status_code=400, detail="Invalid fields.")
+        backend = get_backend()
+        await backend.get_version()  # Applies the changes of other workers to the cache first
+        version = response_cache.version
+        key = ("list", f"search?{request.url.query}")
+        cached = response_cache.get(key) if backend.cacheable else None
+        if cached is None:
+            async def fetch():
+                items, next_cursor = await backend.search_items(limit, cursor, q, criteria, projection)
+                if not items:
+                    return None
+                headers = {}
+                if next_cursor:
+                    headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+                rendered = render_json([revalidate(ItemProjection, item, exclude_unset=True) for item in items], headers)
+                if backend.cacheable:
+                    response_cache.put(key, rendered, version)
+                return rendered
+            try:
+                # Identical requests in flight share one storage read
+                cached = await single_flight.do((key, version), fetch)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor.")
+            if cached is None:
+                logger.warning("No items found.")
+                raise HTTPException(status_code=404, detail="No items found.")
+        logger.info("Items successfully searched.")
+        return conditional_response(request, cached)
+    except RateLimitExceeded:
+        raise HTTPException(status_code=429, detail="Too many requests.")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.critical("Error searching items: %s", e)
+        raise HTTPException(status_code=500, detail="Error searching items.")
+
+@router.post('/items/bulk/',
+             response_model=List[BulkResult],
+             tags=["CRUD"],
+             responses={
+                 500: {"model": ResponseError, "description": "Internal server error."},
+                 429: {"model": ResponseError, "description": "Too many requests."},
+                 413: {"model": ResponseError, "description": "Too many items in the request."},
+                 400: {"model": ResponseError, "description": "Invalid bulk body."},
+             })
+@limiter.limit()
+async def create_items(request: Request):#, auth=Depends(auth_handler.authenticate)):
+    """Create several items in the database with a single storage operation.
+    
+    The body is a JSON array of `ItemCreate` objects, or NDJSON with one object per line when sent as
+    `application/x-ndjson`.
+    
+    Returns:
+    - List[BulkResult]: One result per entry, with status 201 and the created item, or 422 if the entry is invalid.
+    """
+    try:
+        entries = parse_bulk_body(await request.body(), request.headers.get("content-type", ""), BULK_MAX_ITEMS)
+        logger.info("Creating %s items in bulk.", len(entries))
+        results = [None] * len(entries)
+        valid = []
+        for index, entry in enumerate(entries):
+            try:
+                valid.append((index, ItemCreate.parse_obj(entry).dict()))
+            except ValidationError as e:
+                results[index] = {"index": index, "status": 422, "detail": validation_error_detail(e)}
+        created_items = await get_backend().add_items([item for _, item in valid])
+        for (index, _), created_item in zip(valid, created_items):
+            results[index] = {"index": index, "status": 201, "item": created_item}
+        logger.info("%s items successfully created in bulk.", len(created_items))
+        return FastJSONResponse(results)
+    except RateLimitExceeded:
+        raise HTTPException(status_code=429, detail="Too many requests.")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.critical("Error creating items in bulk: %s", e)
+        raise HTTPException(status_code=500, detail="Error creating items.")
+
+@router.patch('/items/bulk/',
+              response_model=List[BulkResult],
+              tags=["CRUD"],
+              responses={
+                  500: {"model": ResponseError, "description": "Internal server error."},
+                  429: {"model": ResponseError, "description": "Too many requests."},
+                  413: {"model": ResponseError, "description": "Too many items in the request."},
+                  400: {"model": ResponseError, "description": "Invalid bulk body."},
+              })
+@limiter.limit()
+async def patch_items(request: Request):#, auth=Depends(auth_handler.authenticate)):
+    """Partially update several items in the database with a single storage operation.
+    
+    The body is a JSON array (or NDJSON) of `ItemPatch` objects that also carry the `id` of the item to update.
+    
+    Returns:
+    - List[BulkResult]: One result per entry, with status 200 and the updated item, 400 for an invalid ID,
+      404 if the item does not exist or 422 if the entry is invalid.
+    """
+    try:
+        entries = parse_bulk_body(await request.body(), request.headers.get("content-type", ""), BULK_MAX_ITEMS)
+        logger.info("Patching %s items in bulk.", len(entries))
+        results = [None] * len(entries)
+        valid = []
+        for index, entry in enumerate(entries):
+            item_id = entry.get("id") if isinstance(entry, dict) else None
+            if not is_valid_objectid(item_id):
+                results[index] = {"index": index, "status": 400, "detail": "Invalid item_id format."}
+                continue
+            try:
+                item_patch = ItemPatch.parse_obj({key: value for key, value in entry.items() if key != "id"})
+            except ValidationError as e:
+                results[index] = {"index": index, "status": 422, "detail": validation_error_detail(e)}
+                continue
+            valid.append((index, item_id, item_patch.dict(exclude_unset=True)))
+        updated_items = await get_backend().update_items([(item_id, item_patch) for _, item_id, item_patch in valid])
+        for (index, _, _), updated_item in zip(valid, updated_items):
+            if updated_item:
+                results[index] = {"index": index, "status": 200, "item": updated_item}
+            else:
+                results[index] = {"index": index, "status": 404, "detail": "Item not found or not patched."}
+        logger.info("%s items successfully patched in bulk.", sum(1 for item in updated_items if item))
+        return FastJSONResponse(results)
+    except RateLimitExceeded:
+        raise HTTPException(status_code=429, detail="Too many requests.")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.critical("Error patching items in bulk: %s", e)
+        raise HTTPException(status_code=500, detail="Error patching items.")
+
+@router.delete('/items/bulk/',
+               response_model=List[BulkResult],
+               tags=["CRUD"],
+               responses={
+                   500: {"model": ResponseError, "description": "Internal server error."},
+                   429: {"model": ResponseError, "description": "Too many requests."},
+                   413: {"model": ResponseError, "description": "Too many items in the request."},
+                   400: {"model": ResponseError, "description": "Invalid bulk body."},
+               })
+@limiter.limit()
+async def delete_items(request: Request):#, auth=Depends(auth_handler.authenticate)):
+    """Delete several items from the database with a single storage operation.
+    
+    The body is a JSON array (or NDJSON) of item IDs.
+    
+    Returns:
+    - List[BulkResult]: One result per entry, with status 200 and the deleted item, 400 for an invalid ID
+      or 404 if the item does not exist.
+    """
+    try:
+        entries = parse_bulk_body(await request.body(), request.headers.get("content-type", ""), BULK_MAX_ITEMS)
+        logger.info("Deleting %s items in bulk.", len(entries))
+        results = [None] * len(entries)
+        valid = []
+        for index, item_id in enumerate(entries):
+            if is_valid_objectid(item_id):
+                valid.append((index, item_id))
+            else:
+                results[index] = {"index": index, "status": 400, "detail": "Invalid item_id format."}
+        deleted_items = await get_backend().delete_items([item_id for _, item_id in valid])
+        for (index, _), deleted_item in zip(valid, deleted_items):
+            if deleted_item:
+                results[index] = {"index": index, "status": 200, "item": deleted_item}
+            else:
+                results[index] = {"index": index, "status": 404, "detail": "Item not found or not deleted."}
+        logger.info("%s items successfully deleted in bulk.", sum(1 for item in deleted_items if item))
+        return FastJSONResponse(results)
+    except RateLimitExceeded:
+        raise HTTPException(status_code=429, detail="Too many requests.")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.critical("Error deleting items in bulk: %s", e)
+        raise HTTPException(status_code=500, detail="Error deleting items.")
+
 @router.get('/items/{item_id}/',
             response_model=Item,
             tags=["CRUD"],
@@ -97,10 +451,13 @@ def list_items(request: Request):#, auth=Depends(auth_handler.authenticate)):
                 404: {"model": ResponseError, "description": "Item not found."},
                 400: {"model": ResponseError, "description": "Invalid item_id format."},
             })
-@limiter.limit("5/minute")
-def get_item(item_id: str, request: Request):#, auth=Depends(auth_handler.authenticate)):
+@limiter.limit()
+async def get_item(item_id: str, request: Request):#, auth=Depends(auth_handler.authenticate)):
     """Fetch a single item from the database using its ID.
     
+    The item is cached until it changes and carries an `ETag`; requests with a matching
+    `If-None-Match` get a 304 without a body.
+    
     Args:
     - item_id (str): ID of the item to be fetched.
     
@@ -111,21 +468,36 @@ def get_item(item_id: str, request: Request):#, auth=Depends(auth_handler.authen
     - HTTPException: If the item is not found.
     """
     try:
-        logger.info(f"Fetching item with ID {item_id}.")
+        logger.info("Fetching item with ID %s.", item_id)
         if not is_valid_objectid(item_id):
             raise HTTPException(status_code=400, detail="Invalid item_id format.")
-        item = find_item(item_id)
-        if not item:
-            logger.warning(f"No item found with ID {item_id}.")
-            raise HTTPException(status_code=404, detail="Item not found.")
-        logger.info(f"Item with ID {item_id} successfully fetched.")
-        return item
+        backend = get_backend()
+        await backend.get_version()  # Applies the changes of other workers to the cache first
+        version = response_cache.version
+        key = ("item", item_id)
+        cached = response_cache.get(key) if backend.cacheable else None
+        if cached is None:
+            async def fetch():
+                item = await backend.find_item(item_id)
+                if not item:
+                    return None
+                rendered = render_json(revalidate(Item, item))
+                if backend.cacheable:
+                    response_cache.put(key, rendered, version)
+                return rendered
+            # Identical requests in flight share one storage read
+            cached = await single_flight.do((key, version), fetch)
+            if cached is None:
+                logger.warning("No item found with ID %s.", item_id)
+                raise HTTPException(status_code=404, detail="Item not found.")
+        logger.info("Item with ID %s successfully fetched.", item_id)
+        return conditional_response(request, cached)
     except RateLimitExceeded:
         raise HTTPException(status_code=429, detail="Too many requests.")
     except HTTPException:
         raise
     except Exception as e:
-        logger.critical(f"Error fetching item: {str(e)}")
+        logger.critical("Error fetching item: %s", e)
         raise HTTPException(status_code=500, detail="Error fetching item.")
 
 @router.put('/items/{item_id}/', 
@@ -137,8 +509,8 @@ def get_item(item_id: str, request: Request):#, auth=Depends(auth_handler.authen
                 404: {"model": ResponseError, "description": "Item not found or not updated."},
                 400: {"model": ResponseError, "description": "Invalid item_id format."},
             })
-@limiter.limit("5/minute")
-def update_item(item_id: str, item_update: ItemCreate, request: Request):#, auth=Depends(auth_handler.authenticate)):
+@limiter.limit()
+async def update_item(item_id: str, item_update: ItemCreate, request: Request):#, auth=Depends(auth_handler.authenticate)):
     """Update an item in the database.
     
     Args:
@@ -152,21 +524,21 @@ def update_item(item_id: str, item_update: ItemCreate, request: Request):#, auth
     - HTTPException: If the item is not found.
     """
     try:
-        logger.info(f"Updating item with ID {item_id}.")
+        logger.info("Updating item with ID %s.", item_id)
         if not is_valid_objectid(item_id):
             raise HTTPException(status_code=400, detail="Invalid item_id format.")
-        updated_item = update_item(item_id, item_update.dict())
+        updated_item = await get_backend().update_item(item_id, item_update.dict())
         if not updated_item:
-            logger.warning(f"Failed to update item with ID {item_id}.")
+            logger.warning("Failed to update item with ID %s.", item_id)
             raise HTTPException(status_code=404, detail="Item not found or not updated.")
-        logger.info(f"Item with ID {item_id} successfully updated.")
-        return updated_item
+        logger.info("Item with ID %s successfully updated.", item_id)
+        return respond(updated_item)
     except RateLimitExceeded:
         raise HTTPException(status_code=429, detail="Too many requests.")
     except HTTPException:
         raise
     except Exception as e:
-        logger.critical(f"Error updating item: {str(e)}")
+        logger.critical("Error updating item: %s", e)
         raise HTTPException(status_code=500, detail="Error updating item.")
 
 @router.patch('/items/{item_id}/',
@@ -178,8 +550,8 @@ def update_item(item_id: str, item_update: ItemCreate, request: Request):#, auth
                   404: {"model": ResponseError, "description": "Item not found or not patched."},
                   400: {"model": ResponseError, "description": "Invalid item_id format."},
               })
-@limiter.limit("5/minute")
-def patch_item(item_id: str, item_patch: ItemPatch, request: Request):#, auth=Depends(auth_handler.authenticate)):
+@limiter.limit()
+async def patch_item(item_id: str, item_patch: ItemPatch, request: Request):#, auth=Depends(auth_handler.authenticate)):
     """Partially update an item in the database.
     
     Args:
@@ -193,21 +565,21 @@ def patch_item(item_id: str, item_patch: ItemPatch, request: Request):#, auth=De
     - HTTPException: If the item is not found.
     """
     try:
-        logger.info(f"Partially updating item with ID {item_id}.")
+        logger.info("Partially updating item with ID %s.", item_id)
         if not is_valid_objectid(item_id):
             raise HTTPException(status_code=400, detail="Invalid item_id format.")
-        updated_item = update_item(item_id, item_patch.dict())
+        updated_item = await get_backend().update_item(item_id, item_patch.dict(exclude_unset=True))
         if not updated_item:
-            logger.warning(f"Failed to patch item with ID {item_id}.")
+            logger.warning("Failed to patch item with ID %s.", item_id)
             raise HTTPException(status_code=404, detail="Item not found or not patched.")
-        logger.info(f"Item with ID {item_id} successfully patched.")
-        return updated_item
+        logger.info("Item with ID %s successfully patched.", item_id)
+        return respond(updated_item)
     except RateLimitExceeded:
         raise HTTPException(status_code=429, detail="Too many requests.")
     except HTTPException:
         raise
     except Exception as e:
-        logger.critical(f"Error patching item: {str(e)}")
+        logger.critical("Error patching item: %s", e)
         raise HTTPException(status_code=500, detail="Error patching item.")
 
 @router.delete('/items/{item_id}/',
@@ -219,8 +591,8 @@ def patch_item(item_id: str, item_patch: ItemPatch, request: Request):#, auth=De
                    404: {"model": ResponseError, "description": "Item not found or not deleted."},
                    400: {"model": ResponseError, "description": "Invalid item_id format."},
                })
-@limiter.limit("5/minute")
-def delete_item(item_id: str, request: Request):#, auth=Depends(auth_handler.authenticate)):
+@limiter.limit()
+async def delete_item(item_id: str, request: Request):#, auth=Depends(auth_handler.authenticate)):
     """Delete an item from the database.
     
     Args:
@@ -233,19 +605,19 @@ def delete_item(item_id: str, request: Request):#, auth=Depends(auth_handler.aut
     - HTTPException: If the item is not found.
     """
     try:
-        logger.info(f"Deleting item with ID {item_id}.")
+        logger.info("Deleting item with ID %s.", item_id)
         if not is_valid_objectid(item_id):
             raise HTTPException(status_code=400, detail="Invalid item_id format.")
-        deleted_item = delete_item(item_id)
+        deleted_item = await get_backend().delete_item(item_id)
         if not deleted_item:
-            logger.warning(f"Failed to delete item with ID {item_id}.")
+            logger.warning("Failed to delete item with ID %s.", item_id)
             raise HTTPException(status_code=404, detail="Item not found or not deleted.")
-        logger.info(f"Item with ID {item_id} successfully deleted.")
-        return deleted_item
+        logger.info("Item with ID %s successfully deleted.", item_id)
+        return respond(deleted_item)
     except RateLimitExceeded:
         raise HTTPException(status_code=429, detail="Too many requests.")
     except HTTPException:
         raise
     except Exception as e:
-        logger.critical(f"Error deleting item: {str(e)}")
+        logger.critical("Error deleting item: %s", e)
         raise HTTPException(status_code=500, detail="Error deleting item.")
@@ -0,0 +1,30 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.app import app
+from app.api.config.db import ItemStore, JSONBackend, get_backend, set_backend
+from app.api.config.limiter import MemoryBackend, limiter
+
+# Whether the rate limits apply (counted in memory) to the requests of `client`; parametrize or override it to turn them on
+@pytest.fixture
+def rate_limit():
+    return False
+
+# JSON backend on a file of its own, in place of the configured one
+@pytest.fixture
+def backend(tmp_path):
+    previous = get_backend()
+    backend = JSONBackend(ItemStore(str(tmp_path / "data.json")))
+    set_backend(backend)
+    yield backend
+    set_backend(previous)
+
+# Test client of the app, started against `backend`
+@pytest.fixture
+def client(backend, rate_limit, monkeypatch):
+    if rate_limit:
+        monkeypatch.setattr(limiter, "_backend", MemoryBackend())
+    else:
+        monkeypatch.setattr(limiter, "enabled", False)
+    with TestClient(app) as client:
+        yield client
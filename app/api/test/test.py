@@ -1,13 +1,10 @@
+from app.api.config.env import API_NAME
 
-import pytest
-from fastapi.testclient import TestClient
-from app import app  # Suponiendo que la aplicación FastAPI principal está en app/main.py
-
-client = TestClient(app)
+prefix = f"/api/v1/{API_NAME}"
 
 # Test for POST /items/ endpoint
-def test_create_item():
-    response = client.post("/items/", json={"name": "Test Item", "description": "This is a test item."})
+def test_create_item(client):
+    response = client.post(f"{prefix}/items/", json={"name": "Test Item", "description": "This is a test item."})
     assert response.status_code == 201
     data = response.json()
     assert data["name"] == "Test Item"
@@ -15,8 +12,9 @@ def test_create_item():
     assert "id" in data
 
 # Test for GET /items/ endpoint
-def test_list_items():
-    response = client.get("/items/")
+def test_list_items(client):
+    client.post(f"{prefix}/items/", json={"name": "Test Item", "description": "This is a test item."})
+    response = client.get(f"{prefix}/items/")
     assert response.status_code == 200
     assert isinstance(response.json(), list)
 
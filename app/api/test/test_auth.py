@@ -0,0 +1,91 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta
+
+import jwt
+import pytest
+from fastapi import HTTPException
+
+from app.api.auth.auth import AuthenticationHandler
+
+USER = {"id": "64b7f0c2a1e4d3b2c1a09f8e", "name": "Test User"}
+
+# Test that a verified token is served from the cache until it expires
+def test_token_cache(monkeypatch):
+    handler = AuthenticationHandler(secret="test-secret")
+    token = handler.create_token(USER)
+    calls = []
+    decode = jwt.decode
+    monkeypatch.setattr(jwt, "decode", lambda *args, **kwargs: calls.append(1) or decode(*args, **kwargs))
+    assert handler.decode_token(token) == USER
+    assert handler.decode_token(token) == USER
+    assert len(calls) == 1
+
+    expiring = jwt.encode({"exp": int(time.time()) + 1, "user": USER}, "test-secret", algorithm="HS256")
+    assert handler.decode_token(expiring) == USER
+    time.sleep(1.1)
+    with pytest.raises(HTTPException) as error:
+        handler.decode_token(expiring)
+    assert error.value.detail == "Token has expired"
+
+    with pytest.raises(HTTPException):
+        handler.decode_token(token[:-2] + "xx")
+
+# Test that compact tokens only carry the user ID and resolve the user through the cached loader
+def test_compact_tokens():
+    handler = AuthenticationHandler(secret="test-secret", compact_tokens=True)
+    loads = []
+    handler.user_loader = lambda user_id: loads.append(user_id) or (USER if user_id == USER["id"] else None)
+    token = handler.create_token(USER)
+    assert "user" not in jwt.decode(token, "test-secret", algorithms=["HS256"])
+    assert handler.decode_token(token) == USER
+    assert handler.decode_token(handler.create_token(USER)) == USER
+    assert loads == [USER["id"]]
+
+    handler.invalidate_user(USER["id"])
+    handler.decode_token(token)
+    assert loads == [USER["id"], USER["id"]]
+
+    payload = {"exp": datetime.utcnow() + timedelta(minutes=1), "sub": "missing"}
+    with pytest.raises(HTTPException):
+        handler.decode_token(jwt.encode(payload, "test-secret", algorithm="HS256"))
+
+# Test the async password methods, including the rehash of outdated hashes on login
+def test_async_passwords():
+    async def scenario():
+        old_handler = AuthenticationHandler(secret="test-secret", bcrypt_rounds=4)
+        handler = AuthenticationHandler(secret="test-secret", bcrypt_rounds=5)
+        old_hash = await old_handler.hash_password_async("secret")
+        assert not await handler.verify_password_async("wrong", old_hash)
+
+        new_hashes = []
+        assert await handler.verify_password_async("secret", old_hash, on_rehash=new_hashes.append)
+        assert new_hashes and new_hashes[0].startswith("$2b$05$")
+        assert await handler.verify_and_update_async("secret", new_hashes[0]) == (True, None)
+        handler.close()
+        old_handler.close()
+
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(scenario())
+    loop.close()
+
+# Test that a saturated password pool answers 503 with Retry-After instead of queueing
+def test_password_pool_backpressure():
+    handler = AuthenticationHandler(secret="test-secret", bcrypt_rounds=4, bcrypt_workers=1, bcrypt_queue_size=1)
+    release = threading.Event()
+
+    async def scenario():
+        blocked = asyncio.ensure_future(handler._run_password_job(release.wait))
+        await asyncio.sleep(0.05)
+        with pytest.raises(HTTPException) as error:
+            await handler.hash_password_async("secret")
+        assert error.value.status_code == 503 and int(error.value.headers["Retry-After"]) >= 1
+        release.set()
+        await blocked
+        assert await handler.hash_password_async("secret")
+
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(scenario())
+    loop.close()
+    handler.close()
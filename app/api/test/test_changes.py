@@ -0,0 +1,134 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.app import app
+from app.api.benchmarks.load import ASGIClient
+from app.api.config.changes import ChangeBroadcaster, change_feed
+from app.api.config.db import ItemStore, JSONBackend, get_backend, set_backend
+from app.api.config.env import API_NAME
+from app.api.config.limiter import limiter
+
+prefix = f"/api/v1/{API_NAME}"
+
+def parse_events(body):
+    """Returns the (id, event, data) of each server-sent event in a body, skipping comments."""
+    events = []
+    for block in body.decode().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n") if line and not line.startswith(":"))
+        if fields:
+            events.append((fields["id"], fields["event"], json.loads(fields["data"])))
+    return events
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(limiter, "enabled", False)
+    previous = get_backend()
+    backend = JSONBackend(ItemStore(str(tmp_path / "data.json")))
+    set_backend(backend)
+    yield backend
+    set_backend(previous)
+
+# Test that the JSON store describes its writes, including the ones found when it reloads the file
+def test_store_changes(tmp_path):
+    store = ItemStore(str(tmp_path / "data.json"))
+    store.load()
+    changes = []
+    store.subscribe_changes(changes.append)
+    item = store.add_item({"name": "a", "description": "d"})
+    store.update_item(item["id"], {"name": "b"})
+    store.delete_item(item["id"])
+    store.add_items([{"name": "c", "description": "d"}, {"name": "e", "description": "d"}])
+    assert [[(change["op"], change.get("item", {}).get("name")) for change in batch] for batch in changes] == [
+        [("create", "a")], [("update", "b")], [("delete", None)], [("create", "c"), ("create", "e")]]
+    other_worker = ItemStore(str(tmp_path / "data.json"))
+    other_worker.load()
+    other_worker.update_item(changes[-1][0]["id"], {"name": "f"})
+    other_worker.delete_item(changes[-1][1]["id"])
+    other_worker.close()
+    store.reload_if_changed()
+    assert [(change["op"], change["id"]) for change in changes[-1]] == [("update", changes[-2][0]["id"]), ("delete", changes[-2][1]["id"])]
+    store.close()
+    store.load()
+    assert changes[-1] == [{"op": "reset"}]
+    store.close()
+
+# Test the replay of missed events and the reset sent when they are no longer known
+def test_replay():
+    feed = ChangeBroadcaster(buffer_size=4, queue_size=3)
+    for index in range(6):
+        feed._publish([{"op": "create", "id": str(index), "item": {"id": str(index)}}])
+    replayed = parse_events(b"".join(feed.subscribe(f"{feed.epoch}-4").events))
+    assert [event_id for event_id, _, _ in replayed] == [f"{feed.epoch}-5", f"{feed.epoch}-6"]
+    for last_event_id in (f"{feed.epoch}-1", f"{feed.epoch}-7", "other-5", "garbage"):
+        (_, event, _), = parse_events(b"".join(feed.subscribe(last_event_id).events))
+        assert event == "reset"
+    assert not feed.subscribe().events
+    feed.stop()
+
+# Test that a client that does not keep up is disconnected instead of queueing without bound
+def test_slow_subscriber_dropped():
+    feed = ChangeBroadcaster(buffer_size=10, queue_size=3)
+    slow, fast = feed.subscribe(), feed.subscribe()
+    for index in range(4):
+        feed._publish([{"op": "delete", "id": str(index)}])
+        fast.events.clear()
+    assert slow.closed and len(slow.events) == 3 and feed.dropped == 1
+    assert not fast.closed and len(feed) == 1
+    feed.stop()
+
+# Test the stream of GET /items/changes/: events of the committed writes, then resuming with Last-Event-ID
+def test_change_stream(backend):
+    async def listen(headers, disconnect):
+        scope = {"type": "http", "http_version": "1.1", "method": "GET", "scheme": "http", "root_path": "",
+                 "path": f"{prefix}/items/changes/", "raw_path": f"{prefix}/items/changes/".encode(), "query_string": b"",
+                 "headers": [(b"host", b"test")] + [(name.encode(), value.encode()) for name, value in headers.items()],
+                 "client": ("127.0.0.1", 50000), "server": ("test", 80)}
+        messages = []
+
+        async def receive():
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            messages.append(message)
+
+        await app(scope, receive, send)
+        return messages
+
+    async def scenario():
+        client = ASGIClient(app)
+        disconnect = asyncio.Event()
+        listener = asyncio.ensure_future(listen({"accept-encoding": "gzip"}, disconnect))
+        await asyncio.sleep(0.05)
+        assert len(change_feed) == 1
+        _, body = await client.request("POST", f"{prefix}/items/", b'{"name": "live", "description": "d"}', {"Content-Type": "application/json"})
+        item_id = json.loads(body)["id"]
+        await client.request("DELETE", f"{prefix}/items/{item_id}/")
+        await asyncio.sleep(0.05)
+        disconnect.set()
+        messages = await listener
+        await asyncio.sleep(0.01)  # The stream is cancelled, not awaited, when the client disconnects
+        assert len(change_feed) == 0
+
+        start = messages[0]
+        headers = dict(start["headers"])
+        assert start["status"] == 200 and headers[b"content-type"].startswith(b"text/event-stream")
+        assert b"content-encoding" not in headers
+        events = parse_events(b"".join(message.get("body", b"") for message in messages[1:]))
+        assert [(event, data["id"]) for _, event, data in events] == [("create", item_id), ("delete", item_id)]
+        assert events[0][2]["item"]["name"] == "live"
+
+        # Resuming after the first event replays the second one
+        disconnect = asyncio.Event()
+        listener = asyncio.ensure_future(listen({"last-event-id": events[0][0]}, disconnect))
+        await asyncio.sleep(0.05)
+        disconnect.set()
+        messages = await listener
+        replayed = parse_events(b"".join(message.get("body", b"") for message in messages[1:]))
+        assert replayed == events[1:]
+
+    with TestClient(app):
+        asyncio.get_event_loop().run_until_complete(scenario())
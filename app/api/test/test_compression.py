@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from app.api.config.env import API_NAME
+from app.api.middleware import compression
+from app.api.middleware.compression import compressed_cache, negotiate
+
+prefix = f"/api/v1/{API_NAME}"
+
+# Enough items for list pages and exports worth compressing
+@pytest.fixture
+def items(client):
+    compressed_cache.clear()
+    client.post(f"{prefix}/items/bulk/", json=[{"name": f"item {index}", "description": "compressed " * 10} for index in range(2000)])
+
+# Test the negotiation of the encoding
+def test_negotiate(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert negotiate("gzip, deflate") == "gzip" and negotiate("*") == "gzip"
+    assert negotiate("br") is None and negotiate("gzip;q=0") is None and negotiate("") is None
+    monkeypatch.setattr(compression, "brotli", object())
+    assert negotiate("gzip, br;q=0.5") == "br" and negotiate("gzip, br;q=0") == "gzip"
+
+# Test compressed list pages, their cache and their ETags
+def test_compressed_responses(client, items):
+    url = f"{prefix}/items/?limit=500"
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip" and "Accept-Encoding" in response.headers["vary"]
+    assert int(response.headers["content-length"]) < len(response.content) / 5
+    assert len(response.json()) == 500
+    etag = response.headers["etag"]
+    assert etag.endswith('-gzip"')
+
+    hits = compressed_cache.hits
+    assert client.get(url, headers={"Accept-Encoding": "gzip"}).headers["etag"] == etag
+    assert compressed_cache.hits == hits + 1
+    response = client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 304 and response.headers["etag"] == etag and "Accept-Encoding" in response.headers["vary"]
+
+    response = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers and response.headers["etag"] == etag.replace("-gzip", "")
+    assert "Accept-Encoding" in response.headers["vary"]
+    item_id = response.json()[0]["id"]
+    item_url = f"{prefix}/items/{item_id}/"
+    response = client.get(item_url, headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers and "Accept-Encoding" in response.headers["vary"]
+    assert client.get(item_url, headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["etag"]}).headers["etag"] == response.headers["etag"]
+
+# Test that streamed exports are compressed chunk by chunk
+def test_compressed_stream(client, items):
+    response = client.get(f"{prefix}/items/export/?format=ndjson", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip" and "content-length" not in response.headers
+    assert [json.loads(line)["name"] for line in response.text.splitlines()] == [f"item {index}" for index in range(2000)]
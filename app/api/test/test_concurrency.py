@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+
+from app.api.benchmarks.load import ASGIClient
+from app.api.config.concurrency import ConcurrencyLimitExceeded, ConcurrencyLimiter, GradientLimit
+from app.api.middleware.concurrency import ConcurrencyLimitMiddleware, match_template
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+# Test that the limit grows while the latency holds, and shrinks when it climbs or requests fail
+def test_gradient_limit():
+    limit = GradientLimit(10, 2, 100, tolerance=1.5)
+    for _ in range(50):
+        limit.in_flight = int(limit.limit)
+        limit.update(0.01)
+    grown = limit.limit
+    assert grown > 10
+    limit.in_flight = 1
+    limit.update(0.01)
+    assert limit.limit == grown  # Not in use: left alone
+    for _ in range(50):
+        limit.in_flight = int(limit.limit)
+        limit.update(0.05)
+    assert limit.limit < grown
+    shrunk = limit.limit
+    limit.update(0.05, dropped=True)
+    assert limit.limit == pytest.approx(max(2, shrunk * 0.9))
+
+# Test that queued reads are admitted before writes, take the place of writes in a full queue, and time out
+def test_priority_queue():
+    async def scenario():
+        limiter = ConcurrencyLimiter(initial_limit=10, min_limit=1, total_limit=1, queue_size=2, queue_timeout=0.2)
+        admitted = []
+
+        async def request(route, method):
+            try:
+                await limiter.acquire(route, method)
+            except ConcurrencyLimitExceeded as e:
+                admitted.append((route, e.reason))
+                return
+            admitted.append((route, "admitted"))
+            await asyncio.sleep(0.01)
+            limiter.release(route, 0.01)
+
+        await limiter.acquire("GET /slow", "GET")  # Holds the only slot of the worker
+        tasks = [asyncio.ensure_future(request("POST /items", "POST")), asyncio.ensure_future(request("POST /other", "POST"))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.ensure_future(request("GET /items", "GET")))
+        await asyncio.sleep(0.001)
+        assert admitted == [("POST /other", "evicted")]
+        status = limiter.status()
+        assert status["queued"] == 2 and status["routes"]["POST /other"]["shed"] == {"evicted": 1}
+        limiter.release("GET /slow", 0.01)
+        await asyncio.gather(*tasks)
+        assert admitted[1:] == [("GET /items", "admitted"), ("POST /items", "admitted")]
+
+        await limiter.acquire("GET /slow", "GET")
+        with pytest.raises(ConcurrencyLimitExceeded) as shed:
+            await limiter.acquire("GET /items", "GET")
+        assert shed.value.reason == "timeout" and shed.value.retry_after >= 1
+        limiter.release("GET /slow")
+        assert limiter.status()["in_flight"] == 0 and limiter.status()["queued"] == 0
+
+    run(scenario())
+
+# Test that a request cancelled while queued is neither admitted nor evicted, and does not hold up the others
+def test_cancelled_waiter():
+    async def scenario():
+        limiter = ConcurrencyLimiter(initial_limit=10, min_limit=1, total_limit=1, queue_size=2, queue_timeout=1)
+        await limiter.acquire("GET /slow", "GET")
+        cancelled = asyncio.ensure_future(limiter.acquire("GET /items", "GET"))
+        waiting = asyncio.ensure_future(limiter.acquire("POST /items", "POST"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        limiter.release("GET /slow", 0.01)  # Before the cancelled task resumes
+        await waiting
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        status = limiter.status()
+        assert status["in_flight"] == 1 and status["queued"] == 0
+        limiter.release("POST /items", 0.01)
+
+        # A full queue of cancelled requests makes room instead of evicting them
+        await limiter.acquire("GET /slow", "GET")
+        queued = [asyncio.ensure_future(limiter.acquire("POST /items", "POST")) for _ in range(2)]
+        await asyncio.sleep(0)
+        for task in queued:
+            task.cancel()
+        waiting = asyncio.ensure_future(limiter.acquire("GET /items", "GET"))
+        await asyncio.sleep(0)
+        limiter.release("GET /slow", 0.01)
+        await waiting
+        limiter.release("GET /items", 0.01)
+        await asyncio.gather(*queued, return_exceptions=True)
+        status = limiter.status()
+        assert status["in_flight"] == 0 and status["queued"] == 0 and status["shed"] == 0
+
+    run(scenario())
+
+# Test that the middleware answers the requests over the limit with a 503 and Retry-After
+def test_concurrency_middleware():
+    test_app = FastAPI()
+
+    @test_app.get("/slow")
+    async def slow():
+        await asyncio.sleep(0.05)
+        return {"ok": True}
+
+    @test_app.get("/health/live")
+    async def live():
+        return {"status": "ok"}
+
+    limiter = ConcurrencyLimiter(initial_limit=1, min_limit=1, queue_size=1, queue_timeout=1)
+    test_app.add_middleware(ConcurrencyLimitMiddleware, limiter=limiter)
+
+    async def scenario():
+        client = ASGIClient(test_app)
+        responses = await asyncio.gather(*(client.request("GET", "/slow") for _ in range(3)), client.request("GET", "/health/live"))
+        assert sorted(status for status, _ in responses) == [200, 200, 200, 503]
+        assert limiter.status()["routes"]["GET /slow"]["shed"] == {"queue_full": 1}
+        assert "GET /health/live" not in limiter.status()["routes"]
+
+    run(scenario())
+
+# Test that the route template of a request is the one of the route Starlette picks, in the same order
+def test_match_template():
+    app = FastAPI()
+    app.get("/items/{item_id}/")(lambda item_id: None)
+    app.get("/items/new/")(lambda: None)
+    app.put("/items/{item_id}/")(lambda item_id: None)
+    app.get("/health")(lambda: None)
+
+    def template(method, path):
+        return match_template({"type": "http", "app": app, "method": method, "path": path})
+
+    assert template("GET", "/items/new/") == "/items/{item_id}/"
+    assert template("PUT", "/items/1/") == "/items/{item_id}/" and template("DELETE", "/items/1/") is None
+    assert template("GET", "/health") == "/health" and template("GET", "/nope") is None
+    app.get("/later/{name}")(lambda name: None)
+    assert template("GET", "/later/x") == "/later/{name}"
@@ -0,0 +1,221 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+from app.api.config import db
+from app.api.config.db import ItemStore, format_id
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps({"items": [{"name": "a", "description": "first", "id": "1"}]}))
+    return str(path)
+
+# Test that writes are served from memory and persisted to the backing file
+def test_store_persists_writes(data_file):
+    store = ItemStore(data_file)
+    store.add_item({"name": "b", "description": "second", "id": "2"})
+    assert store.update_item("1", {"name": "A"})["name"] == "A"
+    assert store.delete_item("2")["id"] == "2"
+    assert store.find_item("2") == {}
+
+    with open(data_file) as file:
+        assert json.load(file)["items"] == [{"name": "A", "description": "first", "id": "1"}]
+
+# Test that external edits of the backing file are picked up
+def test_store_reloads_external_edits(data_file):
+    store = ItemStore(data_file, reload_interval=0)
+    assert store.find_item("1")["name"] == "a"
+
+    with open(data_file, "w") as file:
+        json.dump({"items": [{"name": "edited by hand", "description": "first", "id": "1"}]}, file)
+    os.utime(data_file, ns=(0, 0))
+
+    assert store.find_item("1")["name"] == "edited by hand"
+
+# Test that items edited by hand into the file are checked on load: coerced when they can be, set aside otherwise
+def test_store_validates_loaded_items(data_file):
+    with open(data_file, "w") as file:
+        json.dump({"items": [{"name": "a", "description": "first", "id": "1"}, {"name": 2, "description": "coerced", "id": "2"},
+                             {"description": "no name", "id": "3"}, "not an item"]}, file)
+    store = ItemStore(data_file)
+    assert [item["id"] for item in store.get_items()] == ["1", "2"] and store.find_item("2")["name"] == "2"
+    assert store.find_item("3") == {} and len(store.invalid_items) == 2
+    store.add_item({"name": "b", "description": "second", "id": "4"})
+
+    with open(data_file) as file:
+        items = json.load(file)["items"]
+    assert {"description": "no name", "id": "3"} in items and "not an item" in items and len(items) == 5
+
+# Test that the write-ahead log is replayed on load and folded into the snapshot by compaction
+def test_store_wal_replay_and_compaction(data_file):
+    store = ItemStore(data_file, persistence="wal", compact_threshold=1000)
+    for index in range(2, 12):
+        store.add_item({"name": f"item {index}", "description": "logged", "id": str(index)})
+    store.delete_item("1")
+    store.close()
+
+    with open(data_file) as file:
+        assert [item["id"] for item in json.load(file)["items"]] == ["1"]
+
+    store = ItemStore(data_file, persistence="wal", compact_threshold=1000)
+    assert len(store.get_items()) == 10
+    store.compact()
+    assert os.path.getsize(store.wal_path) == 0
+    store.close()
+
+    reloaded = ItemStore(data_file, persistence="wal")
+    assert [item["id"] for item in reloaded.get_items()] == [str(index) for index in range(2, 12)]
+    reloaded.close()
+
+def _add_items_concurrently(data_file, persistence, threads, items_per_thread):
+    store = ItemStore(data_file, persistence=persistence, compact_threshold=500)
+
+    def add_items(thread):
+        return [store.add_item({"name": f"{os.getpid()}-{thread}", "description": str(index)})["id"]
+                for index in range(items_per_thread)]
+
+    with ThreadPoolExecutor(threads) as executor:
+        ids = [item_id for thread_ids in executor.map(add_items, range(threads)) for item_id in thread_ids]
+    store.close()
+    return ids
+
+# Stress test: thousands of parallel writes from several processes and threads, none lost or duplicated
+@pytest.mark.parametrize("persistence, processes, threads, items_per_thread", [
+    ("wal", 4, 8, 100),
+    ("snapshot", 2, 4, 25),
+])
+def test_store_parallel_writes(tmp_path, persistence, processes, threads, items_per_thread):
+    data_file = str(tmp_path / "data.json")
+    with ProcessPoolExecutor(processes) as executor:
+        futures = [executor.submit(_add_items_concurrently, data_file, persistence, threads, items_per_thread)
+                   for _ in range(processes)]
+        ids = [item_id for future in futures for item_id in future.result()]
+
+    expected = processes * threads * items_per_thread
+    assert len(set(ids)) == expected
+    store = ItemStore(data_file, persistence=persistence)
+    assert sorted(item["id"] for item in store.get_items()) == sorted(ids)
+    store.close()
+
+# Test that ids are never reused, even after deleting the newest item
+def test_store_ids_are_monotonic(data_file):
+    store = ItemStore(data_file)
+    first = store.add_item({"name": "b", "description": "second"})
+    store.delete_item(first["id"])
+    second = ItemStore(data_file).add_item({"name": "c", "description": "third"})
+    assert int(second["id"], 16) > int(first["id"], 16) > 1
+
+# Test that a write that cannot be persisted changes nothing in memory and notifies nobody
+def test_store_failed_write_is_not_applied(data_file, monkeypatch):
+    store = ItemStore(data_file)
+    changes = []
+    store.subscribe(changes.append)
+    store.load()
+    changes.clear()
+
+    def disk_full(data, path):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(db, "write_data", disk_full)
+    for write in (lambda: store.add_item({"name": "b", "description": "second"}), lambda: store.update_item("1", {"name": "A"}),
+                  lambda: store.delete_item("1"), lambda: store.add_items([{"name": "c", "description": "third"}])):
+        with pytest.raises(OSError):
+            write()
+    assert store.get_items() == [{"name": "a", "description": "first", "id": "1"}] and changes == []
+    monkeypatch.undo()
+    assert store.add_item({"name": "b", "description": "second"})["id"] == format_id(2)
+
+# Test that a failed group commit drops its records from the log and undoes them in memory
+def test_store_failed_commit_is_rolled_back(data_file, monkeypatch):
+    store = ItemStore(data_file, persistence="wal")
+    changes = []
+    store.subscribe_changes(changes.extend)
+    kept = store.add_item({"name": "b", "description": "second"})
+    fsync = os.fsync
+    failures = []
+
+    def failing_fsync(fileno):
+        if not failures:
+            failures.append(fileno)
+            raise OSError(5, "Input/output error")
+        fsync(fileno)
+
+    monkeypatch.setattr(db.os, "fsync", failing_fsync)
+    with pytest.raises(OSError):
+        store.add_item({"name": "c", "description": "third"})
+    monkeypatch.undo()
+    assert [item["name"] for item in store.get_items()] == ["a", "b"]
+    assert [change["op"] for change in changes] == ["reset", "create", "create", "delete"]
+    added = store.add_item({"name": "d", "description": "fourth"})
+    store.close()
+
+    reloaded = ItemStore(data_file, persistence="wal")
+    assert [item["id"] for item in reloaded.get_items()] == ["1", kept["id"], added["id"]]
+    reloaded.close()
+
+# Test keyset pagination with exact and prefix filters and field projection
+def test_store_list_items_pages(tmp_path):
+    store = ItemStore(str(tmp_path / "data.json"))
+    for index in range(25):
+        store.add_item({"name": f"{'apple' if index % 2 else 'pear'} {index:02}", "description": str(index % 3)})
+
+    ids, cursor = [], None
+    while True:
+        page, cursor = store.list_items(10, cursor)
+        ids += [item["id"] for item in page]
+        if cursor is None:
+            break
+    assert ids == sorted(item["id"] for item in store.get_items())
+
+    page, cursor = store.list_items(5, filters={"name": ("prefix", "apple"), "description": ("eq", "0")}, fields=["name"])
+    assert [item["name"] for item in page] == ["apple 03", "apple 09", "apple 15", "apple 21"]
+    assert set(page[0]) == {"id", "name"} and cursor is None
+
+    page, cursor = store.list_items(2, filters={"name": ("eq", "pear 04")})
+    assert [item["name"] for item in page] == ["pear 04"]
+
+    with pytest.raises(ValueError):
+        store.list_items(5, "not a cursor")
+
+# Test that bulk writes are persisted as a single write-ahead log record
+def test_store_bulk_writes(data_file):
+    store = ItemStore(data_file, persistence="wal")
+    added = store.add_items([{"name": f"bulk {index}", "description": "loaded"} for index in range(1000)])
+    updated = store.update_items([(added[0]["id"], {"name": "patched"}), ("missing", {"name": "x"})])
+    deleted = store.delete_items([added[1]["id"], added[1]["id"], "missing"])
+    assert updated[0]["name"] == "patched" and updated[1] == {}
+    assert deleted[0]["id"] == added[1]["id"] and deleted[1:] == [{}, {}]
+    store.close()
+
+    with open(store.wal_path) as file:
+        assert len(file.readlines()) == 3
+    reloaded = ItemStore(data_file, persistence="wal")
+    assert len(reloaded.get_items()) == 1000
+    assert reloaded.list_items(1, filters={"name": ("eq", "patched")})[0][0]["id"] == added[0]["id"]
+    reloaded.close()
+
+# Test hash, range and full-text searches, and that the indexes follow every write
+def test_store_search_items(tmp_path):
+    store = ItemStore(str(tmp_path / "data.json"))
+    red = store.add_item({"name": "red apple", "description": "Sweet and crunchy fruit"})
+    green = store.add_item({"name": "green apple", "description": "Sour, crunchy fruit"})
+    store.add_item({"name": "banana", "description": "Sweet yellow fruit"})
+
+    assert [item["id"] for item in store.search_items(10, text="CRUNCHY sweet")[0]] == [red["id"]]
+    assert [item["id"] for item in store.search_items(10, text="crunchy", criteria=[("name", "eq", "green apple")])[0]] == [green["id"]]
+    page, _ = store.search_items(10, criteria=[("name", "gte", "c"), ("name", "lte", "h")])
+    assert [item["name"] for item in page] == ["green apple"]
+    page, cursor = store.search_items(1, text="fruit")
+    assert page == [red] and cursor
+    assert store.search_items(1, cursor, text="fruit")[0] == [green]
+
+    store.update_item(red["id"], {"description": "Bitter"})
+    store.delete_item(green["id"])
+    assert store.search_items(10, text="crunchy") == ([], None)
+    assert store.search_items(10, text="bitter", criteria=[("name", "prefix", "red")])[0][0]["id"] == red["id"]
+    assert store.search_items(10, criteria=[("name", "eq", "green apple")]) == ([], None)
+
+    with pytest.raises(ValueError):
+        store.search_items(10, criteria=[("price", "eq", "1")])
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.app import app
+from app.api.benchmarks.load import ASGIClient
+from app.api.config.cache import SingleFlight, response_cache
+from app.api.config.db import ItemStore, JSONBackend, get_backend, set_backend
+from app.api.config.env import API_NAME
+from app.api.config.idempotency import FileStore, MemoryStore, StoredResponse, get_store, set_store
+from app.api.config.limiter import limiter
+
+prefix = f"/api/v1/{API_NAME}"
+
+class CountingBackend(JSONBackend):
+    """JSON backend that counts the item reads and makes them slow enough to overlap."""
+
+    def __init__(self, item_store):
+        super().__init__(item_store)
+        self.reads = 0
+
+    async def find_item(self, item_id):
+        self.reads += 1
+        await asyncio.sleep(0.05)
+        return await super().find_item(item_id)
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(limiter, "enabled", False)
+    previous_backend, previous_store = get_backend(), get_store()
+    backend = CountingBackend(ItemStore(str(tmp_path / "data.json")))
+    set_backend(backend)
+    set_store(MemoryStore())
+    yield backend
+    set_backend(previous_backend)
+    set_store(previous_store)
+
+# Test that a retried POST replays the first response instead of creating another item
+def test_replayed_create(backend):
+    with TestClient(app) as client:
+        headers = {"Idempotency-Key": "create-1"}
+        first = client.post(f"{prefix}/items/", json={"name": "once", "description": "d"}, headers=headers)
+        second = client.post(f"{prefix}/items/", json={"name": "once", "description": "d"}, headers=headers)
+        assert first.status_code == second.status_code == 201
+        assert second.json() == first.json() and second.headers["idempotent-replayed"] == "true"
+        assert "idempotent-replayed" not in first.headers
+        assert len(backend.store.get_items()) == 1
+
+        response = client.post(f"{prefix}/items/", json={"name": "other", "description": "d"}, headers=headers)
+        assert response.status_code == 422
+        assert client.post(f"{prefix}/items/", json={"name": "x", "description": "d"}, headers={"Idempotency-Key": ""}).status_code == 400
+        assert client.post(f"{prefix}/items/", json={"name": "once", "description": "d"}).status_code == 201
+        assert len(backend.store.get_items()) == 2
+
+# Test that concurrent retries wait for the first request and share its response
+def test_concurrent_retries(backend):
+    async def scenario():
+        client = ASGIClient(app)
+        body = b'{"name": "concurrent", "description": "d"}'
+        headers = {"Idempotency-Key": "create-2", "Content-Type": "application/json"}
+        return await asyncio.gather(*[client.request("POST", f"{prefix}/items/", body, headers) for _ in range(5)])
+
+    with TestClient(app):
+        responses = asyncio.get_event_loop().run_until_complete(scenario())
+    assert len({body for _, body in responses}) == 1 and {status for status, _ in responses} == {201}
+    assert len(backend.store.get_items()) == 1
+
+# Test that identical reads in flight make a single storage call
+def test_coalesced_reads(backend):
+    async def scenario(item_id):
+        client = ASGIClient(app)
+        return await asyncio.gather(*[client.request("GET", f"{prefix}/items/{item_id}/") for _ in range(10)])
+
+    with TestClient(app) as client:
+        item_id = client.post(f"{prefix}/items/", json={"name": "hot", "description": "d"}).json()["id"]
+        response_cache.clear()
+        backend.reads = 0
+        responses = asyncio.get_event_loop().run_until_complete(scenario(item_id))
+    assert {status for status, _ in responses} == {200} and len({body for _, body in responses}) == 1
+    assert backend.reads == 1
+
+# Test that errors are shared by the waiting callers and keys are forgotten afterwards
+def test_single_flight_errors():
+    flight = SingleFlight()
+    calls = 0
+
+    async def failing():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def scenario():
+        return await asyncio.gather(*[flight.do("key", failing) for _ in range(3)], return_exceptions=True)
+
+    results = asyncio.get_event_loop().run_until_complete(scenario())
+    assert calls == 1 and all(isinstance(result, ValueError) for result in results)
+    assert len(flight) == 0
+
+# Test the file store shared by the workers: claims, stored responses and their expiry
+def test_file_store(tmp_path):
+    store = FileStore(str(tmp_path / "idempotency"), ttl=60, max_bytes=1024)
+    loop = asyncio.get_event_loop()
+    assert loop.run_until_complete(store.claim("k"))
+    assert not loop.run_until_complete(store.claim("k"))
+    assert not loop.run_until_complete(store.wait("k", 0.05))
+    response = StoredResponse(201, [(b"content-type", b"application/json")], b'{"id": "1"}', "f")
+    loop.run_until_complete(store.complete("k", response))
+    assert loop.run_until_complete(store.wait("k", 0.05))
+    stored = loop.run_until_complete(store.get("k"))
+    assert (stored.status, stored.headers, stored.body) == (response.status, response.headers, response.body)
+
+    (tmp_path / "idempotency" / "dead.lock").write_text("999999999")  # Claim of a worker that is gone
+    assert loop.run_until_complete(store.claim("dead"))
+    store.ttl = 0
+    assert loop.run_until_complete(store.get("k")) is None
@@ -0,0 +1,169 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.app import app
+from app.api.auth.auth import auth_handler
+from app.api.config.env import API_NAME
+from app.api.config.limiter import FileBackend, MemoryBackend, RedisBackend, gcra, limiter, parse_rate
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+class FakeWatchError(Exception):
+    pass
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.watched = {}
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def watch(self, key):
+        self.watched[key] = self.redis.versions.get(key, 0)
+
+    async def unwatch(self):
+        self.watched = {}
+
+    async def get(self, key):
+        await asyncio.sleep(0)  # Lets concurrent transactions interleave
+        value, expires_at = self.redis.values.get(key, (None, 0))
+        return value if expires_at > time.time() else None
+
+    def multi(self):
+        pass
+
+    def set(self, key, value, px):
+        self.commands.append((key, value, px))
+
+    async def execute(self):
+        if any(self.redis.versions.get(key, 0) != version for key, version in self.watched.items()):
+            raise FakeWatchError()
+        for key, value, px in self.commands:
+            self.redis.values[key] = (value.encode(), time.time() + px / 1000)
+            self.redis.versions[key] = self.redis.versions.get(key, 0) + 1
+
+class FakeRedis:
+    """In-process stand-in for the part of a redis.asyncio client used by RedisBackend."""
+
+    def __init__(self):
+        self.values = {}
+        self.versions = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def close(self):
+        pass
+
+def allowed_in_process(path):
+    backend = FileBackend(path, slots=64)
+    allowed = sum(run(backend.acquire("shared", 50, 60)) == 0 for _ in range(40))
+    run(backend.close())
+    return allowed
+
+# Test the limit parser and the GCRA burst and refill
+def test_gcra():
+    assert parse_rate("5/minute") == (5, 60) and parse_rate("100 per hour") == (100, 3600)
+    assert parse_rate("10/30 seconds") == (10, 30)
+    with pytest.raises(ValueError):
+        parse_rate("often")
+
+    tat = None
+    for _ in range(5):
+        tat, retry_after = gcra(tat, 1000.0, 5, 60)
+        assert retry_after == 0
+    assert gcra(tat, 1000.0, 5, 60) == (None, pytest.approx(12))
+    assert gcra(tat, 1012.0, 5, 60)[1] == 0
+
+# Test that every backend enforces the same limit
+@pytest.mark.parametrize("backend_name", ["memory", "file", "redis"])
+def test_backends(backend_name, tmp_path):
+    backend = {
+        "memory": lambda: MemoryBackend(),
+        "file": lambda: FileBackend(str(tmp_path / "ratelimit"), slots=64),
+        "redis": lambda: RedisBackend(client=FakeRedis(), watch_error=FakeWatchError),
+    }[backend_name]()
+
+    async def scenario():
+        results = await asyncio.gather(*(backend.acquire("client", 5, 60) for _ in range(8)))
+        assert sorted(result == 0 for result in results) == [False] * 3 + [True] * 5
+        assert await backend.acquire("other client", 5, 60) == 0
+        await backend.close()
+
+    run(scenario())
+
+# Test that worker processes share the limits of the file backend
+def test_file_backend_is_shared_across_processes(tmp_path):
+    path = str(tmp_path / "ratelimit")
+    with ProcessPoolExecutor(4) as pool:
+        allowed = list(pool.map(allowed_in_process, [path] * 4))
+    assert sum(allowed) == 50
+
+def hold_file_lock(path, ready, seconds):
+    with open(path, "r+b") as file:
+        fcntl.lockf(file.fileno(), fcntl.LOCK_EX)
+        ready.set()
+        time.sleep(seconds)
+
+# Test that waiting for a bucket locked by another worker does not block the event loop
+@pytest.mark.skipif(fcntl is None, reason="byte-range locks of fcntl")
+def test_file_backend_does_not_block_the_loop(tmp_path):
+    path = str(tmp_path / "ratelimit")
+    backend = FileBackend(path, slots=64)
+    ready = multiprocessing.Event()
+    holder = multiprocessing.Process(target=hold_file_lock, args=(path, ready, 0.3))
+    holder.start()
+    assert ready.wait(10)
+
+    async def scenario():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.ensure_future(tick())
+        assert await backend.acquire("client", 5, 60) == 0
+        ticker.cancel()
+        assert ticks >= 10
+        await backend.close()
+
+    try:
+        run(scenario())
+    finally:
+        holder.join()
+
+# Test the 429 response of a limited route and the per-user keys
+def test_route_limits(monkeypatch):
+    monkeypatch.setattr(limiter, "_backend", MemoryBackend())
+    monkeypatch.setattr(limiter, "enabled", True)
+    monkeypatch.setattr(auth_handler, "secret", "test-secret")
+    url = f"/api/v1/{API_NAME}/items/not-an-id/"
+    with TestClient(app) as client:
+        assert [client.get(url).status_code for _ in range(6)] == [400] * 5 + [429]
+        assert int(client.get(url).headers["retry-after"]) >= 1
+
+        headers = {"Authorization": f"Bearer {auth_handler.create_token({'id': 'user-1'})}"}
+        assert [client.get(url, headers=headers).status_code for _ in range(6)] == [400] * 5 + [429]
@@ -0,0 +1,33 @@
+import asyncio
+
+from app.app import app
+from app.api.benchmarks.load import ASGIClient, compare, drive, load_replay, percentile
+from app.api.config.env import API_NAME
+from app.api.config.limiter import limiter
+
+prefix = f"/api/v1/{API_NAME}"
+
+# Test the percentiles and the detection of regressions between two runs
+def test_compare():
+    assert percentile([1.0, 2.0, 3.0, 4.0], 0.5) == 2.0 and percentile([1.0, 2.0, 3.0, 4.0], 0.99) == 4.0
+    baseline = {"results": {"asgi": {"GET /items/": {"p95_ms": 1.0, "rps": 1000.0}}}}
+    assert compare(baseline, {"results": {"asgi": {"GET /items/": {"p95_ms": 1.05, "rps": 980.0}}}}, 10) == []
+    assert len(compare(baseline, {"results": {"asgi": {"GET /items/": {"p95_ms": 2.0, "rps": 500.0}}}}, 10)) == 2
+
+# Test replaying captured traffic in-process, grouped per endpoint
+def test_replay(tmp_path, monkeypatch, backend):
+    replay = tmp_path / "traffic.jsonl"
+    replay.write_text('{"method": "post", "path": "/items/", "body": {"name": "a", "description": "b"}}\n'
+                      'not json\n'
+                      f'{{"method": "GET", "path": "{prefix}/items/{"0" * 24}/"}}\n')
+    requests, skipped = load_replay(str(replay), prefix)
+    assert skipped == 1 and [request[:2] for request in requests] == [("POST", f"{prefix}/items/"), ("GET", f"{prefix}/items/{'0' * 24}/")]
+
+    monkeypatch.setattr(limiter, "enabled", False)
+    loop = asyncio.new_event_loop()
+    try:
+        results = loop.run_until_complete(drive(ASGIClient(app), requests * 3, 2, prefix))
+    finally:
+        loop.close()
+    assert {endpoint: stats["count"] for endpoint, stats in results.items()} == {"GET /items/{item_id}/": 3, "POST /items/": 3}
+    assert results["POST /items/"]["errors"] == 0
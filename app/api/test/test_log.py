@@ -0,0 +1,66 @@
+import json
+import logging
+import queue
+from logging.handlers import QueueListener, RotatingFileHandler
+
+from fastapi.testclient import TestClient
+
+from app.app import app
+from app.api.config.env import API_NAME
+from app.api.config.limiter import limiter
+from app.api.config.log import JSONFormatter, NonBlockingQueueHandler, SamplingFilter, request_id
+
+def make_record(level=logging.INFO, message="Fetching item with ID %s.", args=("abc",), **extra):
+    record = logging.LogRecord("app.api.routes.routes", level, __file__, 1, message, args, None)
+    record.__dict__.update(extra)
+    return record
+
+# Test that records go through the queue and come out as rotated JSON lines with the request ID
+def test_queue_pipeline_writes_json_lines(tmp_path):
+    path = tmp_path / "api.log"
+    file_handler = RotatingFileHandler(path, maxBytes=2000, backupCount=2)
+    file_handler.setFormatter(JSONFormatter())
+    log_queue = queue.Queue(100)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    listener = QueueListener(log_queue, file_handler)
+    listener.start()
+
+    token = request_id.set("req-1")
+    for _ in range(30):
+        queue_handler.handle(make_record(latency_ms=1.5))
+    request_id.reset(token)
+    listener.stop()
+    file_handler.close()
+
+    entries = [json.loads(line) for line in path.read_text().splitlines()]
+    assert entries[-1]["message"] == "Fetching item with ID abc."
+    assert entries[-1]["request_id"] == "req-1" and entries[-1]["latency_ms"] == 1.5
+    assert (tmp_path / "api.log.1").exists()
+
+# Test that a full queue drops records instead of blocking the caller
+def test_full_queue_drops_records():
+    queue_handler = NonBlockingQueueHandler(queue.Queue(1))
+    queue_handler.handle(make_record())
+    queue_handler.handle(make_record())
+    assert queue_handler.dropped == 1
+
+# Test that INFO lines are sampled per request while warnings always pass
+def test_sampling_filter():
+    sampling_filter = SamplingFilter(rate=0.5)
+    kept = 0
+    for index in range(1000):
+        token = request_id.set(f"request-{index}")
+        assert sampling_filter.filter(make_record()) == sampling_filter.filter(make_record())
+        kept += sampling_filter.filter(make_record())
+        assert sampling_filter.filter(make_record(level=logging.WARNING))
+        request_id.reset(token)
+    assert 350 < kept < 650
+
+# Test that responses carry the request ID, generated or taken from the client
+def test_request_id_header(monkeypatch):
+    monkeypatch.setattr(limiter, "enabled", False)
+    with TestClient(app) as client:
+        response = client.get(f"/api/v1/{API_NAME}/items/not-an-id/")
+        assert len(response.headers["x-request-id"]) == 32
+        response = client.get(f"/api/v1/{API_NAME}/items/not-an-id/", headers={"X-Request-ID": "abc"})
+        assert response.headers["x-request-id"] == "abc"
@@ -0,0 +1,60 @@
+import json
+import os
+import threading
+
+import pytest
+
+from app.api.config.env import API_NAME
+from app.api.config.metrics import MetricsRegistry, registry
+
+prefix = f"/api/v1/{API_NAME}"
+
+# The rejections are measured too
+@pytest.fixture
+def rate_limit():
+    return True
+
+# Series of the tests before, which would add up with those of the test
+@pytest.fixture(autouse=True)
+def clear_metrics():
+    registry.clear()
+
+# Test the Server-Timing header and the series exposed at /metrics
+def test_metrics_endpoint(client):
+    item_id = client.post(f"{prefix}/items/", json={"name": "timed", "description": "metrics"}).json()["id"]
+    response = client.get(f"{prefix}/items/{item_id}/")
+    assert "ratelimit;dur=" in response.headers["server-timing"] and "total;dur=" in response.headers["server-timing"]
+    assert "storage;dur=" in client.post(f"{prefix}/items/", json={"name": "b", "description": "c"}).headers["server-timing"]
+    for _ in range(5):
+        client.get(f"{prefix}/items/not-an-id/")
+
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert f'http_request_duration_seconds_count{{method="GET",route="{prefix}/items/{{item_id}}/",status="200"}} 1' in text
+    assert f'http_request_duration_seconds_count{{method="GET",route="{prefix}/items/{{item_id}}/",status="429"}} 1' in text
+    assert 'http_request_duration_seconds_bucket{method="POST",route="' + prefix + '/items/",status="201",le="+Inf"} 2' in text
+    assert 'rate_limit_rejections_total{route="get_item"} 1' in text
+    assert 'storage_operation_duration_seconds_count{operation="write"}' in text
+    assert 'storage_operation_duration_seconds_count{operation="fsync"}' in text
+    assert "http_requests_in_progress 1" in text  # The scrape itself
+
+# Test the aggregation of the per-thread shards and of the files of other workers
+def test_metrics_aggregation(tmp_path):
+    metrics = MetricsRegistry(str(tmp_path))
+    counter = metrics.counter("things_total", "Things.", ("kind",))
+    in_progress = metrics.gauge("in_progress", "In progress.")
+    threads = [threading.Thread(target=lambda: [counter.inc("a") for _ in range(1000)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    in_progress.inc()
+    assert 'things_total{kind="a"} 4000' in metrics.render()
+
+    # A running worker (our parent) and one that exited: counters add up, gauges only count running workers
+    for pid in (os.getppid(), 2 ** 22 + 1):
+        with open(tmp_path / f"metrics-{pid}.json", "w") as file:
+            json.dump({"things_total": [[["a"], [10.0]]], "in_progress": [[[], [3.0]]]}, file)
+    text = metrics.render()
+    assert 'things_total{kind="a"} 4020' in text and "in_progress 4" in text
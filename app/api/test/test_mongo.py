@@ -0,0 +1,171 @@
+import asyncio
+import re
+
+import pytest
+from bson import ObjectId
+from fastapi.testclient import TestClient
+from pymongo import ReturnDocument
+
+from app.app import app
+from app.api.config.db import get_backend, set_backend
+from app.api.config.env import API_NAME
+from app.api.config.limiter import limiter
+from app.api.config.mongo import MongoBackend
+
+class FakeInsertResult:
+    def __init__(self, inserted_id=None, inserted_ids=None):
+        self.inserted_id = inserted_id
+        self.inserted_ids = inserted_ids
+
+class FakeCursor:
+    def __init__(self, documents):
+        self._documents = iter(documents)
+
+    def sort(self, key, direction):
+        self._documents = iter(sorted(self._documents, key=lambda document: document[key], reverse=direction < 0))
+        return self
+
+    def limit(self, limit):
+        self._documents = iter(list(self._documents)[:limit])
+        return self
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._documents)
+        except StopIteration:
+            raise StopAsyncIteration
+
+class FakeCollection:
+    """In-process stand-in for the part of a motor collection used by MongoBackend."""
+
+    def __init__(self):
+        self.documents = {}
+        self.indexes = []
+
+    @staticmethod
+    def _matches(document, query):
+        for key, condition in query.items():
+            if not isinstance(condition, dict):
+                if document.get(key) != condition:
+                    return False
+            elif key == "$text":
+                words = set(re.findall(r"\w+", f"{document.get('name', '')} {document.get('description', '')}".lower()))
+                if not set(re.findall(r'"(\w+)"', condition["$search"])) <= words:
+                    return False
+            elif "$gt" in condition and not document[key] > condition["$gt"]:
+                return False
+            elif "$eq" in condition and document.get(key) != condition["$eq"]:
+                return False
+            elif "$gte" in condition and not document.get(key, "") >= condition["$gte"]:
+                return False
+            elif "$lte" in condition and not document.get(key, "") <= condition["$lte"]:
+                return False
+            elif "$in" in condition and document.get(key) not in condition["$in"]:
+                return False
+            elif "$regex" in condition and not re.match(condition["$regex"], document.get(key, "")):
+                return False
+        return True
+
+    async def create_index(self, keys):
+        self.indexes.append(keys)
+
+    async def insert_one(self, document):
+        document = dict(document)
+        document.setdefault("_id", ObjectId())
+        self.documents[document["_id"]] = document
+        return FakeInsertResult(document["_id"])
+
+    async def insert_many(self, documents):
+        return FakeInsertResult(inserted_ids=[(await self.insert_one(document)).inserted_id for document in documents])
+
+    async def bulk_write(self, requests):
+        for request in requests:
+            await self.find_one_and_update(request._filter, request._doc)
+
+    async def delete_many(self, query):
+        for document in [document for document in self.documents.values() if self._matches(document, query)]:
+            del self.documents[document["_id"]]
+
+    def find(self, query=None, projection=None, **kwargs):
+        documents = [document for document in self.documents.values() if self._matches(document, query or {})]
+        if projection is not None:
+            documents = [{key: value for key, value in document.items() if key == "_id" or key in projection}
+                         for document in documents]
+        return FakeCursor([dict(document) for document in documents])
+
+    async def find_one(self, query):
+        document = self.documents.get(query["_id"])
+        return dict(document) if document else None
+
+    async def find_one_and_update(self, query, update, return_document=ReturnDocument.BEFORE):
+        document = self.documents.get(query["_id"])
+        if document is None:
+            return None
+        self.documents[query["_id"]] = {**document, **update["$set"]}
+        return dict(self.documents[query["_id"]] if return_document == ReturnDocument.AFTER else document)
+
+    async def find_one_and_delete(self, query):
+        return self.documents.pop(query["_id"], None)
+
+@pytest.fixture
+def mongo_backend():
+    previous = get_backend()
+    backend = MongoBackend(collection=FakeCollection())
+    set_backend(backend)
+    yield backend
+    set_backend(previous)
+
+# Test the storage contract of the MongoDB backend
+def test_mongo_backend_contract(mongo_backend):
+    async def scenario():
+        item = await mongo_backend.add_item({"name": "Test Item", "description": "This is a test item."})
+        assert await mongo_backend.find_item(item["id"]) == item
+        assert (await mongo_backend.update_item(item["id"], {"name": "Renamed"}))["name"] == "Renamed"
+        assert await mongo_backend.get_items() == [{**item, "name": "Renamed"}]
+        assert (await mongo_backend.delete_item(item["id"]))["id"] == item["id"]
+        assert await mongo_backend.find_item(item["id"]) == {}
+        assert await mongo_backend.update_item("not-an-object-id", {"name": "x"}) == {}
+
+        for index in range(5):
+            await mongo_backend.add_item({"name": f"item {index}", "description": "paged"})
+        page, cursor = await mongo_backend.list_items(3, filters={"name": ("prefix", "item")}, fields=["name"])
+        assert [item["name"] for item in page] == ["item 0", "item 1", "item 2"] and "description" not in page[0]
+        page, cursor = await mongo_backend.list_items(3, cursor, filters={"name": ("prefix", "item")})
+        assert [item["name"] for item in page] == ["item 3", "item 4"] and cursor is None
+
+        added = await mongo_backend.add_items([{"name": "bulk", "description": str(index)} for index in range(3)])
+        updated = await mongo_backend.update_items([(added[0]["id"], {"name": "patched"}), (str(ObjectId()), {"name": "x"})])
+        assert updated[0]["name"] == "patched" and updated[1] == {}
+        deleted = await mongo_backend.delete_items([added[1]["id"], added[1]["id"]])
+        assert deleted[0]["id"] == added[1]["id"] and deleted[1] == {}
+
+        page, cursor = await mongo_backend.search_items(10, text="Bulk")
+        assert [item["description"] for item in page] == ["2"] and cursor is None
+        page, cursor = await mongo_backend.search_items(1, criteria=[("description", "lte", "9")])
+        assert [item["name"] for item in page] == ["patched"] and cursor
+        page, cursor = await mongo_backend.search_items(1, cursor, criteria=[("description", "lte", "9")])
+        assert [item["description"] for item in page] == ["2"] and cursor is None
+
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(scenario())
+    loop.close()
+
+# Test the async CRUD routes against the MongoDB backend
+def test_routes_with_mongo_backend(mongo_backend, monkeypatch):
+    monkeypatch.setattr(limiter, "enabled", False)
+    prefix = f"/api/v1/{API_NAME}"
+    with TestClient(app) as client:
+        response = client.post(f"{prefix}/items/", json={"name": "Test Item", "description": "This is a test item."})
+        assert response.status_code == 201
+        item_id = response.json()["id"]
+
+        response = client.patch(f"{prefix}/items/{item_id}/", json={"description": "Patched."})
+        assert response.status_code == 200
+        assert response.json()["description"] == "Patched."
+
+        assert client.get(f"{prefix}/items/{item_id}/").status_code == 200
+        assert client.delete(f"{prefix}/items/{item_id}/").status_code == 200
+        assert client.get(f"{prefix}/items/{item_id}/").status_code == 404
@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+from app.api.auth.auth import auth_handler
+from app.api.config.env import API_NAME
+from app.api.config.profiling import profiler
+
+prefix = f"/api/v1/{API_NAME}"
+
+@pytest.fixture
+def client(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(auth_handler, "secret", "test-secret")
+    monkeypatch.setattr(profiler, "directory", str(tmp_path / "profiles"))
+    yield client
+    profiler.stop()
+    profiler.clear()
+
+# Test switching the profiler at runtime and the collapsed stacks of the profiled routes
+def test_profiling(client):
+    admin = {"Authorization": f"Bearer {auth_handler.create_token({'id': 'admin-1', 'role': 'admin'})}"}
+    user = {"Authorization": f"Bearer {auth_handler.create_token({'id': 'user-1'})}"}
+    assert client.put(f"{prefix}/admin/profiling/", json={"enabled": True}, headers=user).status_code == 403
+    response = client.put(f"{prefix}/admin/profiling/", json={"enabled": True, "sample_rate": 1, "interval_ms": 1}, headers=admin)
+    assert response.status_code == 200 and response.json()["running"]
+
+    body = [{"name": f"item {index}", "description": f"profiled item {index}"} for index in range(20000)]
+    for _ in range(3):
+        assert client.post(f"{prefix}/items/bulk/", json=body).status_code == 200
+
+    route = f"POST {prefix}/items/bulk/"
+    assert client.get(f"{prefix}/admin/profiling/", headers=admin).json()["routes"][route] > 0
+    stacks = client.get(f"{prefix}/admin/profiling/stacks/", params={"route": route}, headers=admin).text
+    lines = stacks.splitlines()
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any(line.startswith("(thread);") and "app.api.config.db:add_items" in line for line in lines)
+    assert client.get(f"{prefix}/admin/profiling/stacks/", params={"route": "GET /nowhere"}, headers=admin).status_code == 404
+
+    response = client.put(f"{prefix}/admin/profiling/", json={"enabled": False}, headers=admin)
+    assert not response.json()["running"]
+    files = os.listdir(profiler.directory)
+    assert f"POST_api_v1_{API_NAME}_items_bulk.{os.getpid()}.collapsed" in files
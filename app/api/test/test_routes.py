@@ -0,0 +1,122 @@
+import json
+
+import pytest
+
+from app.api.config import serialization
+from app.api.config.cache import CachedResponse, ResponseCache
+from app.api.config.db import get_backend
+from app.api.config.env import API_NAME
+
+prefix = f"/api/v1/{API_NAME}"
+
+# Test paging through GET /items/ by following the Link header
+def test_list_items_pagination(client):
+    for index in range(7):
+        client.post(f"{prefix}/items/", json={"name": f"item {index}", "description": "paged"})
+
+    names = []
+    url = f"{prefix}/items/?limit=3&name_prefix=item&fields=name"
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        assert all(set(item) == {"id", "name"} for item in response.json())
+        names += [item["name"] for item in response.json()]
+        url = response.links.get("next", {}).get("url")
+    assert names == [f"item {index}" for index in range(7)]
+
+    assert client.get(f"{prefix}/items/?cursor=garbage").status_code == 400
+    assert client.get(f"{prefix}/items/?fields=price").status_code == 400
+    assert client.get(f"{prefix}/items/?name=missing").status_code == 404
+
+# Test the streamed exports in both formats
+def test_export_items(client):
+    for index in range(3):
+        client.post(f"{prefix}/items/", json={"name": f"item {index}", "description": "exported"})
+
+    response = client.get(f"{prefix}/items/export/")
+    assert response.status_code == 200
+    assert [item["name"] for item in response.json()] == ["item 0", "item 1", "item 2"]
+
+    response = client.get(f"{prefix}/items/export/?format=ndjson")
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line)["name"] for line in response.text.splitlines()] == ["item 0", "item 1", "item 2"]
+
+# Test the bulk endpoints with JSON and NDJSON bodies and per-item results
+def test_bulk_items(client):
+    response = client.post(f"{prefix}/items/bulk/", json=[{"name": "a", "description": "bulk"}, {"name": "b"}])
+    assert [result["status"] for result in response.json()] == [201, 422]
+    item_id = response.json()[0]["item"]["id"]
+
+    body = "\n".join(json.dumps({"name": f"item {index}", "description": "ndjson"}) for index in range(3))
+    response = client.post(f"{prefix}/items/bulk/", data=body, headers={"content-type": "application/x-ndjson"})
+    assert [result["status"] for result in response.json()] == [201, 201, 201]
+
+    response = client.patch(f"{prefix}/items/bulk/", json=[{"id": item_id, "name": "patched"}, {"id": "0" * 24}, {"name": "x"}])
+    assert [result["status"] for result in response.json()] == [200, 404, 400]
+    assert response.json()[0]["item"] == {"id": item_id, "name": "patched", "description": "bulk"}
+
+    response = client.delete(f"{prefix}/items/bulk/", json=[item_id, item_id])
+    assert [result["status"] for result in response.json()] == [200, 404]
+    assert client.post(f"{prefix}/items/bulk/", data="{not json").status_code == 400
+
+# Test the ETags of cached reads and their invalidation by writes
+def test_conditional_get(client):
+    item_id = client.post(f"{prefix}/items/", json={"name": "cached", "description": "etag"}).json()["id"]
+
+    response = client.get(f"{prefix}/items/{item_id}/")
+    etag = response.headers["etag"]
+    response = client.get(f"{prefix}/items/{item_id}/", headers={"If-None-Match": etag})
+    assert response.status_code == 304 and response.content == b""
+    list_etag = client.get(f"{prefix}/items/").headers["etag"]
+    assert client.get(f"{prefix}/items/", headers={"If-None-Match": list_etag}).status_code == 304
+
+    client.patch(f"{prefix}/items/{item_id}/", json={"name": "renamed"})
+    response = client.get(f"{prefix}/items/{item_id}/", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.json()["name"] == "renamed"
+    response = client.get(f"{prefix}/items/", headers={"If-None-Match": list_etag})
+    assert response.status_code == 200 and response.json()[0]["name"] == "renamed"
+
+# Test that the response cache stays within its memory cap
+def test_response_cache_eviction():
+    cache = ResponseCache(max_bytes=10)
+    cache.put(("item", "a"), CachedResponse(b"123456"), cache.version)
+    cache.put(("item", "b"), CachedResponse(b"123456"), cache.version)
+    assert cache.get(("item", "a")) is None and cache.get(("item", "b")) is not None and cache.size == 6
+
+    version = cache.version
+    cache.invalidate(["b"])
+    cache.put(("item", "b"), CachedResponse(b"123456"), version)
+    assert cache.get(("item", "b")) is None and cache.size == 0
+
+# Test GET /items/search/ with full-text, exact and range criteria
+def test_search_items(client):
+    client.post(f"{prefix}/items/bulk/", json=[{"name": f"item {index}", "description": f"colour {colour}"}
+                                               for index, colour in enumerate(["red", "blue", "red dark", "green"])])
+
+    response = client.get(f"{prefix}/items/search/?q=RED&fields=name")
+    assert [item["name"] for item in response.json()] == ["item 0", "item 2"] and "description" not in response.json()[0]
+    response = client.get(f"{prefix}/items/search/?q=colour&name_gte=item 1&name_lte=item 2&limit=1")
+    assert [item["name"] for item in response.json()] == ["item 1"]
+    assert [item["name"] for item in client.get(response.links["next"]["url"]).json()] == ["item 2"]
+    assert client.get(f"{prefix}/items/search/?name=item 3").json()[0]["description"] == "colour green"
+
+    assert client.get(f"{prefix}/items/search/").status_code == 400
+    assert client.get(f"{prefix}/items/search/?q=purple").status_code == 404
+
+# Test that the fast and the standard serialization paths give the same responses and files
+@pytest.mark.parametrize("fast, with_orjson", [(True, True), (True, False), (False, False)])
+def test_serialization_paths(client, monkeypatch, fast, with_orjson):
+    monkeypatch.setattr(serialization, "FAST_JSON", fast)
+    if not with_orjson:
+        monkeypatch.setattr(serialization, "orjson", None)
+    response = client.post(f"{prefix}/items/", json={"name": "ñandú", "description": "fast"})
+    assert response.status_code == 201
+    item = response.json()
+    assert client.get(f"{prefix}/items/{item['id']}/").json() == item == {"id": item["id"], "name": "ñandú", "description": "fast"}
+    assert client.get(f"{prefix}/items/?fields=name").json() == [{"id": item["id"], "name": "ñandú"}]
+    assert client.delete(f"{prefix}/items/{item['id']}/").json() == item
+
+    path = get_backend().store.path
+    with open(path, "rb") as file:
+        assert (b"\n" in file.read()) != fast
+    assert serialization.loads(serialization.dumps({"a": [1, "é"]})) == {"a": [1, "é"]}
@@ -0,0 +1,96 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import pytest
+import uvicorn
+from fastapi import FastAPI
+
+from app.api.config.db import ItemStore
+from app.server import WorkerServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+# Test that a store preloaded before forking keeps its items, and catches up with the writes made meanwhile
+def test_preload_resume(tmp_path):
+    path = str(tmp_path / "data.json")
+    store = ItemStore(path, persistence="wal")
+    store.load()
+    item = store.add_item({"name": "before", "description": "d"})
+    store.close()
+
+    store.preload()
+    assert store.preloaded and store.find_item(item["id"]) == item
+    other_worker = ItemStore(path, persistence="wal")
+    other_worker.load()
+    added = other_worker.add_item({"name": "meanwhile", "description": "d"})
+    other_worker.close()
+
+    store.resume()
+    assert not store.preloaded and store.find_item(added["id"]) == added
+    assert store.add_item({"name": "after", "description": "d"})["id"] > added["id"]
+    store.close()
+
+# Test that a worker stopped while it is starting up still runs the on_shutdown hook of the app
+def test_worker_stopped_during_startup():
+    test_app = FastAPI()
+    server = WorkerServer(uvicorn.Config(test_app, lifespan="on", log_config=None), graceful_timeout=1)
+    events = []
+
+    @test_app.on_event("startup")
+    async def startup():
+        server.should_exit = True  # What the SIGTERM handler of uvicorn does
+
+    @test_app.on_event("shutdown")
+    async def shutdown():
+        events.append("shutdown")
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        sock.listen()
+        server.run(sockets=[sock])
+    assert events == ["shutdown"]
+
+# Test the launcher: pre-forked workers serve requests, and SIGTERM, or a Ctrl-C in a terminal (SIGINT to
+# its whole process group), stops them all gracefully
+@pytest.mark.parametrize("terminal", [False, True])
+def test_server_graceful_stop(tmp_path, terminal):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    environment = dict(os.environ, API_NAME="test", LOG_FILE="", DATA_FILE=str(tmp_path / "data.json"),
+                       RATE_LIMIT_BACKEND="memory", IDEMPOTENCY_BACKEND="memory")
+    server = subprocess.Popen([sys.executable, "-m", "app.server", "--host", "127.0.0.1", "--port", str(port), "--workers", "2"],
+                              cwd=ROOT, env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, start_new_session=terminal)
+    # Collected as they come, so the test knows when both workers finished their startup
+    errors = []
+    reader = threading.Thread(target=lambda: errors.extend(server.stderr), daemon=True)
+    reader.start()
+    try:
+        deadline = time.monotonic() + 15
+        while True:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health/ready", timeout=1) as response:
+                    assert response.status == 200
+                if sum(b"API started" in line for line in list(errors)) == 2:
+                    break
+            except OSError:
+                pass
+            assert time.monotonic() < deadline and server.poll() is None
+            time.sleep(0.1)
+        if terminal:
+            os.killpg(server.pid, signal.SIGINT)
+        else:
+            server.send_signal(signal.SIGTERM)
+        server.wait(timeout=15)
+        reader.join(timeout=5)
+    finally:
+        if server.poll() is None:
+            server.kill()
+    assert server.returncode == 0
+    assert sum(b"API shut down" in line for line in errors) == 2
@@ -0,0 +1,98 @@
+import asyncio
+import os
+
+import pytest
+
+from app.api.config.db import ItemStore
+from app.api.config.shards import ShardedBackend, ShardedStore, rebalance, shard_path
+
+# Test that the sharded store spreads the items and returns the same pages and cursors as a single JSON store
+def test_sharded_store_contract(tmp_path):
+    store = ShardedStore(str(tmp_path / "shards"), shards=3)
+    store.load()
+    json_store = ItemStore(str(tmp_path / "data.json"))
+    json_store.load()
+
+    item = store.add_item({"name": "Test Item", "description": "This is a test item."})
+    assert item == json_store.add_item({"name": "Test Item", "description": "This is a test item."})
+    assert store.find_item(item["id"]) == item
+    assert store.update_item(item["id"], {"name": "Renamed"})["name"] == "Renamed"
+    assert store.delete_item(item["id"])["id"] == item["id"] and store.find_item(item["id"]) == {}
+    json_store.delete_item(item["id"])
+
+    items = [{"name": f"item {index % 4}", "description": f"paged {index} word{index % 3}"} for index in range(20)]
+    assert store.add_items(items) == json_store.add_items(items)
+    assert all(shard.get_items() for shard in store.shards)
+    for arguments in [{}, {"filters": {"name": ("prefix", "item 1")}, "fields": ["name"]}, {"filters": {"name": ("eq", "item 2")}}]:
+        cursor = json_cursor = None
+        while True:
+            page, cursor = store.list_items(3, cursor, **arguments)
+            json_page, json_cursor = json_store.list_items(3, json_cursor, **arguments)
+            assert (page, cursor) == (json_page, json_cursor)
+            if cursor is None:
+                break
+    for arguments in [{"text": "WORD2", "fields": ["description"]}, {"criteria": [("name", "eq", "item 2")]}, {"criteria": [("description", "lte", "paged 2")]}]:
+        cursor = json_cursor = None
+        while True:
+            page, cursor = store.search_items(2, cursor, **arguments)
+            json_page, json_cursor = json_store.search_items(2, json_cursor, **arguments)
+            assert (page, cursor) == (json_page, json_cursor)
+            if cursor is None:
+                break
+    with pytest.raises(ValueError):
+        store.list_items(3, "not-a-cursor")
+
+    ids = [added["id"] for added in json_store.get_items()]
+    assert store.update_items([(ids[0], {"name": "patched"}), ("missing", {"name": "x"}), (ids[1], {"name": "other"})]) == \
+        json_store.update_items([(ids[0], {"name": "patched"}), ("missing", {"name": "x"}), (ids[1], {"name": "other"})])
+    assert store.delete_items([ids[2], ids[3], ids[2]]) == json_store.delete_items([ids[2], ids[3], ids[2]])
+    assert sorted(store.get_items(), key=lambda item: item["id"]) == sorted(json_store.get_items(), key=lambda item: item["id"])
+    store.close()
+    json_store.close()
+
+# Test that workers sharing the shards never allocate the same id, and see each other's writes
+def test_sharded_workers(tmp_path):
+    directory = str(tmp_path / "shards")
+    worker, other_worker = ShardedStore(directory, shards=4, id_block_size=2), ShardedStore(directory, shards=4, id_block_size=2)
+    backend = ShardedBackend(worker)
+    other_worker.load()
+
+    async def scenario():
+        await backend.connect()
+        added = await backend.add_items([{"name": "a", "description": "d"}, {"name": "b", "description": "d"}])
+        other = other_worker.add_items([{"name": "c", "description": "d"}, {"name": "e", "description": "d"}])
+        added.append(await backend.add_item({"name": "f", "description": "d"}))
+        assert len({item["id"] for item in added + other}) == 5
+        worker.reload_if_changed()
+        page, _ = await backend.list_items(10)
+        assert sorted(item["name"] for item in page) == ["a", "b", "c", "e", "f"]
+        await backend.close()
+
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(scenario())
+    loop.close()
+    other_worker.close()
+
+# Test that rebalancing moves every item, including those still in the write-ahead logs, to the new shards
+def test_rebalance(tmp_path):
+    directory = str(tmp_path / "shards")
+    store = ShardedStore(directory, shards=3, persistence="wal")
+    store.load()
+    items = store.add_items([{"name": f"item {index}", "description": "d"} for index in range(30)])
+    store.delete_item(items[0]["id"])
+    store.close()
+    data_file = ItemStore(str(tmp_path / "data.json"), persistence="wal")
+    data_file.load()
+    imported = data_file.add_item({"id": "imported", "name": "imported", "description": "d"})
+    data_file.close()
+
+    assert rebalance(directory, 5, import_file=str(tmp_path / "data.json"), persistence="wal") == 30
+    assert not any(os.path.exists(shard_path(directory, index, 3)) for index in range(3))
+    with pytest.raises(ValueError):
+        ShardedStore(directory, shards=3).load()
+    store = ShardedStore(directory, shards=5)
+    store.load()
+    assert store.find_item(imported["id"]) == imported and store.find_item(items[0]["id"]) == {}
+    assert all(store.find_item(item["id"]) == item for item in items[1:])
+    assert store.add_item({"name": "new", "description": "d"})["id"] > items[-1]["id"]
+    store.close()
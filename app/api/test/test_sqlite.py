@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.app import app
+from app.api.config.db import ItemStore, get_backend, set_backend
+from app.api.config.env import API_NAME
+from app.api.config.limiter import limiter
+from app.api.config.sqlite import SQLiteBackend, SQLiteStore, migrate
+
+@pytest.fixture
+def sqlite_backend(tmp_path):
+    previous = get_backend()
+    backend = SQLiteBackend(SQLiteStore(str(tmp_path / "data.db")))
+    set_backend(backend)
+    yield backend
+    set_backend(previous)
+
+# Test the storage contract of the SQLite backend, with the same pages and cursors as the JSON store
+def test_sqlite_backend_contract(sqlite_backend, tmp_path):
+    json_store = ItemStore(str(tmp_path / "data.json"))
+    json_store.load()
+
+    async def scenario():
+        await sqlite_backend.connect()
+        item = await sqlite_backend.add_item({"name": "Test Item", "description": "This is a test item."})
+        assert await sqlite_backend.find_item(item["id"]) == item
+        assert (await sqlite_backend.update_item(item["id"], {"name": "Renamed"}))["name"] == "Renamed"
+        assert await sqlite_backend.get_items() == [{**item, "name": "Renamed"}]
+        assert (await sqlite_backend.delete_item(item["id"]))["id"] == item["id"]
+        assert await sqlite_backend.find_item(item["id"]) == {}
+        assert await sqlite_backend.update_item("missing", {"name": "x"}) == {}
+
+        items = [{"name": f"item {index % 4}", "description": f"paged {index} word{index % 3}"} for index in range(20)]
+        json_store.add_item({"name": "Test Item", "description": "This is a test item."})  # Keeps the ids in step
+        json_store.delete_item(item["id"])
+        assert await sqlite_backend.add_items(items) == json_store.add_items(items)
+        for arguments in [{}, {"filters": {"name": ("prefix", "item 1")}, "fields": ["name"]}, {"filters": {"description": ("eq", "paged 3 word0")}}]:
+            cursor = json_cursor = None
+            while True:
+                page, cursor = await sqlite_backend.list_items(3, cursor, **arguments)
+                json_page, json_cursor = json_store.list_items(3, json_cursor, **arguments)
+                assert (page, cursor) == (json_page, json_cursor)
+                if cursor is None:
+                    break
+        for arguments in [{"text": "WORD2"}, {"criteria": [("name", "eq", "item 2")]}, {"criteria": [("description", "lte", "paged 2")]}]:
+            cursor = json_cursor = None
+            while True:
+                page, cursor = await sqlite_backend.search_items(2, cursor, **arguments)
+                json_page, json_cursor = json_store.search_items(2, json_cursor, **arguments)
+                assert (page, cursor) == (json_page, json_cursor)
+                if cursor is None:
+                    break
+        with pytest.raises(ValueError):
+            await sqlite_backend.list_items(3, "not-a-cursor")
+
+        added = await sqlite_backend.add_items([{"name": "bulk", "description": str(index)} for index in range(3)])
+        updated = await sqlite_backend.update_items([(added[0]["id"], {"name": "patched"}), ("missing", {"name": "x"})])
+        assert updated[0]["name"] == "patched" and updated[1] == {}
+        deleted = await sqlite_backend.delete_items([added[1]["id"], added[1]["id"]])
+        assert deleted[0]["id"] == added[1]["id"] and deleted[1] == {}
+        await sqlite_backend.close()
+
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(scenario())
+    loop.close()
+    json_store.close()
+
+# Test that a write made by another process is noticed and invalidates the cached responses
+def test_sqlite_external_writes(sqlite_backend, tmp_path, monkeypatch):
+    monkeypatch.setattr(limiter, "enabled", False)
+    sqlite_backend.store.reload_interval = 0
+    prefix = f"/api/v1/{API_NAME}"
+    with TestClient(app) as client:
+        item_id = client.post(f"{prefix}/items/", json={"name": "Test Item", "description": "Original."}).json()["id"]
+        assert client.get(f"{prefix}/items/{item_id}/").json()["description"] == "Original."
+
+        other_worker = SQLiteStore(sqlite_backend.store.path)
+        other_worker.update_item(item_id, {"description": "Changed elsewhere."})
+        other_worker.close()
+        assert client.get(f"{prefix}/items/{item_id}/").json()["description"] == "Changed elsewhere."
+
+        assert client.delete(f"{prefix}/items/{item_id}/").status_code == 200
+        assert client.get(f"{prefix}/items/{item_id}/").status_code == 404
+
+# Test the import of a JSON data file, which keeps the ids and the id counter
+def test_migrate(tmp_path):
+    json_store = ItemStore(str(tmp_path / "data.json"))
+    json_store.load()
+    items = json_store.add_items([{"name": f"item {index}", "description": "migrated"} for index in range(5)])
+    json_store.delete_item(items[-1]["id"])
+    json_store.close()
+
+    assert migrate(str(tmp_path / "data.json"), str(tmp_path / "data.db")) == 4
+    sqlite_store = SQLiteStore(str(tmp_path / "data.db"))
+    sqlite_store.load()
+    assert sqlite_store.get_items() == items[:-1]
+    assert sqlite_store.add_item({"name": "new", "description": "after"})["id"] > items[-1]["id"]
+    sqlite_store.close()
@@ -0,0 +1,59 @@
+import asyncio
+import importlib
+import os
+import subprocess
+import sys
+import threading
+
+from fastapi.testclient import TestClient
+
+from app.app import app
+from app.api.config.db import StorageBackend, get_backend, set_backend
+
+# Cold import budget of app.app in seconds; raise it with IMPORT_TIME_BUDGET on slow machines
+IMPORT_TIME_BUDGET = float(os.getenv("IMPORT_TIME_BUDGET", "1.5"))
+# Optional subsystems that must only be imported on first use
+LAZY_MODULES = ("bson", "pymongo", "motor", "redis", "passlib", "jwt", "bcrypt", "sqlite3")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+class SlowBackend(StorageBackend):
+    def __init__(self):
+        super().__init__()
+        self.loaded = threading.Event()
+
+    async def connect(self):
+        while not self.loaded.is_set():
+            await asyncio.sleep(0.01)
+
+# Test that importing the app stays within its budget and leaves the optional subsystems unloaded
+def test_import_time():
+    script = ("import sys, time; start = time.perf_counter(); import app.app; print(time.perf_counter() - start); "
+              f"print(','.join(name for name in {LAZY_MODULES!r} if name in sys.modules))")
+    environment = dict(os.environ, LOG_FILE="")
+    timings = []
+    for _ in range(3):
+        output = subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=environment, capture_output=True, text=True, check=True).stdout
+        elapsed, loaded = output.split("\n")[:2]
+        timings.append(float(elapsed))
+        assert loaded == ""
+    assert min(timings) < IMPORT_TIME_BUDGET
+
+# Test that /health/ready answers 503 until the storage is loaded in the background
+def test_readiness(monkeypatch):
+    monkeypatch.setattr(importlib.import_module("app.app"), "STARTUP_BACKGROUND_LOAD", True)
+    previous = get_backend()
+    backend = SlowBackend()
+    set_backend(backend)
+    try:
+        with TestClient(app) as client:
+            assert client.get("/health/live").status_code == 200
+            assert client.get("/health/ready").status_code == 503
+            backend.loaded.set()
+            for _ in range(100):
+                response = client.get("/health/ready")
+                if response.status_code == 200:
+                    break
+            assert response.json() == {"status": "ready"}
+    finally:
+        set_backend(previous)
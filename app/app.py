@@ -1,18 +1,39 @@
+import asyncio
+import logging
+import math
+import signal
+
 from fastapi import FastAPI
 from fastapi import Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 # Routes and config modules import
 from app.api.config.env import API_NAME, PRODUCTION_SERVER_URL, DEVELOPMENT_SERVER_URL, LOCALHOST_SERVER_URL
-from app.api.config.limiter import limiter
+from app.api.config.env import PROFILE_ENABLED, PROFILE_SIGNAL, STARTUP_BACKGROUND_LOAD
+from app.api.config.limiter import limiter, RateLimitExceeded
+from app.api.config.db import get_backend
+from app.api.auth.auth import auth_handler
+from app.api.config.cache import response_cache
+from app.api.config.changes import change_feed
+from app.api.config.log import setup_logging, shutdown_logging
+from app.api.config.metrics import registry as metrics_registry
+from app.api.config.profiling import profiler
+from app.api.config.serialization import FastJSONResponse
+from app.api.middleware.access_log import AccessLogMiddleware
+from app.api.middleware.compression import CompressionMiddleware
+from app.api.middleware.concurrency import ConcurrencyLimitMiddleware
+from app.api.middleware.idempotency import IdempotencyMiddleware
+from app.api.middleware.metrics import MetricsMiddleware
+from app.api.middleware.profiling import ProfilingMiddleware
 from app.api.routes.routes import router
-from slowapi.middleware import SlowAPIMiddleware
-from slowapi.errors import RateLimitExceeded
+from app.api.routes.admin import router as admin_router
 
 
 from fastapi.openapi.utils import get_openapi
 
+logger = logging.getLogger(__name__)
+
 title=f'{API_NAME} API'
 description=f'{API_NAME} API description.'
 version='0.0.1'
@@ -42,6 +63,7 @@ app = FastAPI(
     version=version,
     contact=contact,
     license_info=license_info,
+    default_response_class=FastJSONResponse,
 )
 
 def custom_openapi():
@@ -74,26 +96,104 @@ app.openapi = custom_openapi
 async def _rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
     return JSONResponse(
         status_code=429,
-        content={"detail": "Rate limit exceeded. Try again later."}
+        content={"detail": "Rate limit exceeded. Try again later."},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))}
     )
 
-app.state.limiter = limiter
-app.add_middleware(SlowAPIMiddleware)
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+@app.get('/metrics', include_in_schema=False)
+async def metrics():
+    # Prometheus scrape endpoint, see app/api/config/metrics.py
+    return Response(metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get('/health/live', include_in_schema=False)
+async def health_live():
+    # The process is up and serving requests
+    return {"status": "ok"}
+
+@app.get('/health/ready', include_in_schema=False)
+async def health_ready():
+    # Ready once the storage backend is connected and the items are loaded, see on_startup
+    if not app.state.ready:
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    return {"status": "ready"}
+
+# Inside compression, so stored responses are uncompressed and replays are compressed for each client
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(ProfilingMiddleware)
+# Outside the other middlewares, so shed requests cost nothing more; inside metrics and the access log, which record them
+app.add_middleware(ConcurrencyLimitMiddleware)
+app.add_middleware(MetricsMiddleware)
+# Added last so it wraps every other middleware and times the whole request
+app.add_middleware(AccessLogMiddleware)
+
+# Set once the storage backend is connected, reported by /health/ready
+app.state.ready = False
+app.state.storage_task = None
+
+async def connect_storage():
+    try:
+        await get_backend().connect()
+    except Exception as e:
+        logger.critical("Error connecting the storage backend: %s", e)
+        raise
+    app.state.ready = True
+    logger.info("Storage backend: %s", type(get_backend()).__name__)
 
 @app.on_event('startup')
 async def on_startup():
     # Actions to be executed when the API starts.
-    print('API started')
+    setup_logging()
+    metrics_registry.start()
+    logger.info('API started')
+
+    # Subscribed before connecting, so the load itself invalidates anything cached meanwhile
+    get_backend().subscribe(response_cache.invalidate)
+    get_backend().subscribe_changes(change_feed.publish)
+    response_cache.clear()
+    change_feed.start()
+    if STARTUP_BACKGROUND_LOAD:
+        # Accept requests right away: the store loads on first access, and /health/ready says when it is warm
+        app.state.storage_task = asyncio.ensure_future(connect_storage())
+    else:
+        await connect_storage()
+
+    # The profiler can be switched on with PROFILE_ENABLED, the admin routes or PROFILE_SIGNAL
+    if PROFILE_ENABLED:
+        profiler.start()
+    if PROFILE_SIGNAL:
+        loop = asyncio.get_event_loop()
+        try:
+            # Toggled in the threadpool, since stopping writes the stack files
+            loop.add_signal_handler(getattr(signal, PROFILE_SIGNAL), lambda: loop.run_in_executor(None, profiler.toggle))
+        except (AttributeError, NotImplementedError, RuntimeError, ValueError) as e:
+            logger.warning("Cannot switch the profiler with %s: %s", PROFILE_SIGNAL, e)
 
-    print(f"Localhost Server URL: {LOCALHOST_SERVER_URL}")
-    print(f"Development Server URL: {DEVELOPMENT_SERVER_URL}")
-    print(f"Production Server URL: {PRODUCTION_SERVER_URL}")
+    logger.info("Localhost Server URL: %s", LOCALHOST_SERVER_URL)
+    logger.info("Development Server URL: %s", DEVELOPMENT_SERVER_URL)
+    logger.info("Production Server URL: %s", PRODUCTION_SERVER_URL)
 
 @app.on_event('shutdown')
 async def on_shutdown():
     # Actions to be executed when the API shuts down.
-    print('API shut down')
+    app.state.ready = False
+    change_feed.stop()
+    if app.state.storage_task is not None:
+        try:
+            await app.state.storage_task
+        except Exception:
+            pass  # Already logged by connect_storage
+        app.state.storage_task = None
+    await get_backend().close()
+    auth_handler.close()
+    await limiter.close()
+    metrics_registry.stop()
+    if PROFILE_SIGNAL and hasattr(signal, PROFILE_SIGNAL):
+        asyncio.get_event_loop().remove_signal_handler(getattr(signal, PROFILE_SIGNAL))
+    profiler.stop()
+    logger.info('API shut down')
+    shutdown_logging()
 
 # Include the routes
 app.include_router(router, prefix=f'/api/v1/{API_NAME}')
+app.include_router(admin_router, prefix=f'/api/v1/{API_NAME}')
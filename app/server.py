@@ -0,0 +1,242 @@
+"""Production server: the API in pre-forked uvicorn workers sharing one listening socket.
+
+Run it from the repository root (this is the CMD of the Dockerfile):
+
+    python -m app.server [--workers 4] [--port 8000]
+
+The parent process binds the socket, imports the app and loads the items (`SERVER_PRELOAD`),
+then forks the workers, so they share the loaded items copy-on-write instead of each one
+parsing the data file. Workers run uvloop and httptools when they are installed. The parent
+restarts workers that die, and on SIGTERM or SIGINT passes the signal on to every worker
+(which run in their own process group, so a Ctrl-C in a terminal reaches the parent only):
+each one stops accepting connections, ends the change streams, lets the requests in flight
+finish for up to `SERVER_GRACEFUL_TIMEOUT` seconds, then runs the `on_shutdown` hook of the
+app. Workers still running after that are killed.
+"""
+import argparse
+import asyncio
+import gc
+import importlib.util
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, List, Optional
+
+import uvicorn
+
+from app.api.config.env import (SERVER_HOST, SERVER_PORT, SERVER_WORKERS, SERVER_BACKLOG, SERVER_KEEPALIVE,
+                                SERVER_GRACEFUL_TIMEOUT, SERVER_PRELOAD)
+from app.api.config.log import JSONFormatter, setup_logging
+
+logger = logging.getLogger("app.server")
+
+# Extra seconds a worker gets after the graceful timeout, for its on_shutdown hook, before it is killed
+SHUTDOWN_MARGIN = 10
+
+def cpu_count() -> int:
+    """Returns the number of CPUs this process may run on (its affinity mask, e.g. a container cpuset)."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+class WorkerServer(uvicorn.Server):
+    """uvicorn server whose shutdown is bounded by `graceful_timeout`, and also runs when the
+    worker is stopped while it is still starting up.
+
+    The change streams of `GET /items/changes/` never end on their own, so they are ended
+    first; connections still busy when the timeout expires are closed, so the `on_shutdown`
+    hook of the app always runs.
+    """
+
+    def __init__(self, config: uvicorn.Config, graceful_timeout: float = SERVER_GRACEFUL_TIMEOUT):
+        super().__init__(config)
+        self.graceful_timeout = graceful_timeout
+
+    async def startup(self, sockets=None):
+        await super().startup(sockets)
+        if self.should_exit and not self.lifespan.should_exit:
+            # Signalled while starting up: uvicorn would return without shutting down, skipping `on_shutdown`
+            await self.shutdown(sockets)
+
+    async def shutdown(self, sockets=None):
+        from app.api.config.changes import change_feed
+        change_feed.stop()
+        timer = asyncio.get_event_loop().call_later(self.graceful_timeout, self._close_connections)
+        try:
+            await super().shutdown(sockets)
+        finally:
+            timer.cancel()
+
+    def _close_connections(self) -> None:
+        logger.warning("Closing %d connections still open after %s seconds.", len(self.server_state.connections), self.graceful_timeout)
+        for connection in list(self.server_state.connections):
+            connection.transport.close()
+
+def create_config(app, keepalive: float, backlog: int) -> uvicorn.Config:
+    return uvicorn.Config(
+        app,
+        # 'auto' picks uvloop and httptools when they are installed, asyncio and h11 otherwise
+        loop="auto",
+        http="auto",
+        lifespan="on",
+        backlog=backlog,
+        timeout_keep_alive=keepalive,
+        # Requests are logged by AccessLogMiddleware, and uvicorn logs through the JSON handlers of the app
+        access_log=False,
+        log_config=None,
+    )
+
+def run_worker(config: uvicorn.Config, sock: socket.socket, graceful_timeout: float) -> int:
+    # In a forked worker: the signal handlers of the parent are replaced by those of uvicorn
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, signal.SIG_DFL)
+    setup_logging(force=True)
+    try:
+        WorkerServer(config, graceful_timeout).run(sockets=[sock])
+    except Exception as e:
+        logger.critical("Worker %d failed: %s", os.getpid(), e)
+        return 1
+    return 0
+
+class Supervisor:
+    """Forks the workers, restarts the ones that die and stops them all on SIGTERM or SIGINT."""
+
+    def __init__(self, config: uvicorn.Config, sock: socket.socket, workers: int, graceful_timeout: float):
+        self.config = config
+        self.sock = sock
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        self.children: Dict[int, float] = {}  # PID -> start time
+        self.stopping = False
+
+    def spawn(self) -> None:
+        pid = os.fork()
+        if pid == 0:
+            # Out of the process group of the terminal, which would signal the workers along with the parent: a second
+            # SIGINT, the one passed on by the parent, makes uvicorn exit without draining or running `on_shutdown`
+            os.setpgid(0, 0)
+            self.children.clear()  # The other workers are not this process' to signal
+            code = 1
+            try:
+                code = run_worker(self.config, self.sock, self.graceful_timeout)
+            finally:
+                logging.shutdown()
+                os._exit(code)
+        try:
+            os.setpgid(pid, pid)  # Also done here, so no signal reaches the worker before it did it itself
+        except OSError:
+            pass  # The worker already did it, or already exited
+        self.children[pid] = time.monotonic()
+
+    def handle_stop(self, signum: int, frame) -> None:
+        if not self.stopping:
+            logger.info("Received %s, stopping %d workers.", signal.Signals(signum).name, len(self.children))
+            self.stopping = True
+        for pid in self.children:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def reap(self) -> List[int]:
+        """Collects the workers that exited and returns their PIDs."""
+        exited = []
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            started = self.children.pop(pid, None)
+            if started is None:
+                continue
+            exited.append(pid)
+            if not self.stopping:
+                logger.error("Worker %d exited with status %d after %.0f seconds.", pid, os.waitstatus_to_exitcode(status),
+                             time.monotonic() - started)
+        return exited
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.handle_stop)
+        signal.signal(signal.SIGINT, self.handle_stop)
+        for _ in range(self.workers):
+            self.spawn()
+        logger.info("Started %d workers on %s.", self.workers, self.sock.getsockname())
+
+        last_respawn = 0.0
+        while not self.stopping:
+            if self.reap() and not self.stopping:
+                # Throttled, so a worker that crashes on startup does not fork in a tight loop
+                time.sleep(max(0.0, 1.0 - (time.monotonic() - last_respawn)))
+                while len(self.children) < self.workers and not self.stopping:
+                    self.spawn()
+                last_respawn = time.monotonic()
+            time.sleep(0.2)
+
+        deadline = time.monotonic() + self.graceful_timeout + SHUTDOWN_MARGIN
+        while self.children and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in self.children:
+            logger.warning("Killing worker %d, still running after %s seconds.", pid, self.graceful_timeout + SHUTDOWN_MARGIN)
+            os.kill(pid, signal.SIGKILL)
+        while self.children:
+            self.reap()
+            time.sleep(0.05)
+        logger.info("Server stopped.")
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=SERVER_HOST, help="Address to listen on.")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="Port to listen on.")
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help="Worker processes (0: one per available CPU).")
+    parser.add_argument("--backlog", type=int, default=SERVER_BACKLOG, help="Pending connections queued by the kernel.")
+    parser.add_argument("--keepalive", type=float, default=SERVER_KEEPALIVE, help="Seconds idle keep-alive connections stay open.")
+    parser.add_argument("--graceful-timeout", type=float, default=SERVER_GRACEFUL_TIMEOUT,
+                        help="Seconds the workers have to finish their requests on shutdown.")
+    parser.add_argument("--no-preload", dest="preload", action="store_false", default=SERVER_PRELOAD,
+                        help="Let each worker load the items instead of sharing those loaded before forking.")
+    args = parser.parse_args(argv)
+
+    # The parent only logs to stderr: each worker sets up the logging of the app after the fork
+    handler = logging.StreamHandler()
+    handler.setFormatter(JSONFormatter())
+    logging.basicConfig(level=logging.INFO, handlers=[handler])
+
+    workers = args.workers or cpu_count()
+    if not hasattr(os, "fork"):
+        workers = 1
+    logger.info("Event loop: %s, HTTP parser: %s.", "uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+                "httptools" if importlib.util.find_spec("httptools") else "h11")
+
+    sock = bind_socket(args.host, args.port, args.backlog)
+    from app.app import app
+    if args.preload:
+        from app.api.config.db import get_backend
+        start = time.perf_counter()
+        get_backend().preload()
+        logger.info("Preloaded the storage in %.2f seconds.", time.perf_counter() - start)
+    # Objects created so far are never collected, so the garbage collector does not write to (and copy) their pages
+    gc.freeze()
+    config = create_config(app, args.keepalive, args.backlog)
+
+    if workers == 1:
+        code = run_worker(config, sock, args.graceful_timeout)
+        sys.exit(code)
+    Supervisor(config, sock, workers, args.graceful_timeout).run()
+
+if __name__ == "__main__":
+    main()